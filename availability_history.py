@@ -0,0 +1,388 @@
+"""
+Append-only history of availability observations.
+
+results.json only ever holds the latest run, so every earlier observation is lost. After each
+run the results are fed into a local SQLite store that keeps only what changed:
+
+- events: one row per (facility, site, date) entry appearing or disappearing, with when it was
+  observed and when it was last observed before that (the change happened in between):
+    listed   first seen because the date entered the searched range (or the first run)
+    opened   became available on a date that was searched before (a cancellation, usually)
+    closed   no longer available (booked)
+    expired  the date passed
+- runs: one row per observation, with the searched range and how much changed. Streaks of runs
+  that changed nothing are compacted into a single row covering first to last observation, so
+  storage grows with churn, not with the number of runs.
+- current: the availability as of the latest run, used to diff the next one.
+
+Events are indexed by (facility, date) and by observation time, for questions like
+"when do cancellations for Upper Pines weekends typically appear":
+
+    python availability_history.py cancellations "Upper Pines" --weekends
+"""
+
+import argparse
+import datetime
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from collections import Counter
+from dateutil import tz
+from results_delta import searched_filter
+
+DEFAULT_HISTORY_PATH = os.path.join('.cache', 'availability_history.sqlite')
+PACIFIC = tz.gettz('US/Pacific')
+
+# Event kinds that start and end an availability episode
+OPEN_KINDS = ('listed', 'opened')
+CLOSE_KINDS = ('closed', 'expired')
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+# Friday and Saturday check-ins
+WEEKEND_DAYS = (4, 5)
+# (max days between an opening and the booking date, label) for the lead time breakdown
+LEAD_TIME_BUCKETS = [(1, '0-1 days'), (3, '2-3 days'), (7, '4-7 days'), (14, '1-2 weeks'),
+                     (30, '2-4 weeks'), (60, '1-2 months'), (None, '2+ months')]
+
+def _pacific(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, PACIFIC)
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime.date) else value
+
+def lead_time_bucket(days):
+    for max_days, label in LEAD_TIME_BUCKETS:
+        if max_days is None or days <= max_days:
+            return label
+
+class AvailabilityHistory:
+    """SQLite-backed availability history, safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                source TEXT,
+                first_observed_at REAL,
+                last_observed_at REAL,
+                run_count INTEGER,
+                start_date TEXT,
+                end_date TEXT,
+                rows INTEGER,
+                opened INTEGER,
+                closed INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                run_id INTEGER,
+                observed_at REAL,
+                previous_observed_at REAL,
+                facility_id TEXT,
+                site TEXT,
+                booking_date TEXT,
+                kind TEXT
+            );
+            CREATE INDEX IF NOT EXISTS events_facility_date ON events (facility_id, booking_date, observed_at);
+            CREATE INDEX IF NOT EXISTS events_observed ON events (observed_at);
+            CREATE TABLE IF NOT EXISTS current (
+                facility_id TEXT,
+                site TEXT,
+                booking_date TEXT,
+                PRIMARY KEY (facility_id, site, booking_date)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS facilities (
+                facility_id TEXT PRIMARY KEY,
+                name TEXT,
+                area TEXT,
+                url TEXT
+            );
+        """)
+        self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def record_run(self, rows, start_date, end_date, source='main', observed_at=None, unsearched=None):
+        """
+        Add one run's result rows, covering booking dates from start_date to end_date (exclusive).
+        Only entries within that range are compared: a run searching fewer months says nothing
+        about the dates it didn't search. Likewise for a partial run's unsearched check-in
+        ranges (see results_delta.unsearched_checkins). Returns the number of events per kind.
+        """
+        observed_at = observed_at or time.time()
+        start_date, end_date = _isoformat(start_date), _isoformat(end_date)
+        today = _pacific(observed_at).date().isoformat()
+        searched = searched_filter(unsearched)
+
+        entries = set()
+        facilities = {}
+        for row in rows:
+            entries.add((row['facility_id'], row['campsite_site_name'], row['booking_date']))
+            if row['facility_id'] not in facilities:
+                facilities[row['facility_id']] = (row['facility_name'], row['recreation_area'], row['booking_url'])
+
+        with self.lock:
+            previous = self.conn.execute(
+                "SELECT last_observed_at, start_date, end_date FROM runs ORDER BY id DESC LIMIT 1").fetchone()
+            current = set(self.conn.execute("SELECT facility_id, site, booking_date FROM current"))
+
+            events = []
+            for facility_id, site, booking_date in entries - current:
+                # A date searched last time that had no availability has just opened up
+                searched_before = previous is not None and previous[1] <= booking_date < previous[2]
+                events.append((facility_id, site, booking_date, 'opened' if searched_before else 'listed'))
+            for facility_id, site, booking_date in current - entries:
+                if booking_date < today or booking_date < start_date:
+                    events.append((facility_id, site, booking_date, 'expired'))
+                elif booking_date < end_date and searched(facility_id, booking_date):
+                    events.append((facility_id, site, booking_date, 'closed'))
+                # Later (or unsearched) dates weren't searched this run: still open as far as we know
+
+            opened = sum(1 for event in events if event[3] in OPEN_KINDS)
+            cursor = self.conn.execute(
+                "INSERT INTO runs (source, first_observed_at, last_observed_at, run_count, start_date, end_date, rows, opened, closed) "
+                "VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)",
+                (source, observed_at, observed_at, start_date, end_date, len(entries), opened, len(events) - opened))
+            run_id = cursor.lastrowid
+            previous_observed_at = previous[0] if previous is not None else None
+            self.conn.executemany(
+                "INSERT INTO events (run_id, observed_at, previous_observed_at, facility_id, site, booking_date, kind) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, observed_at, previous_observed_at) + event for event in events])
+            self.conn.executemany("DELETE FROM current WHERE facility_id = ? AND site = ? AND booking_date = ?",
+                                  [event[:3] for event in events if event[3] in CLOSE_KINDS])
+            self.conn.executemany("INSERT OR IGNORE INTO current VALUES (?, ?, ?)",
+                                  [event[:3] for event in events if event[3] in OPEN_KINDS])
+            self.conn.executemany("INSERT OR REPLACE INTO facilities VALUES (?, ?, ?, ?)",
+                                  [(facility_id,) + details for facility_id, details in facilities.items()])
+            self.conn.commit()
+
+        self.compact()
+        counts = Counter(event[3] for event in events)
+        print(f"🗃️ History: {sum(counts.values())} changes recorded "
+              f"({', '.join(f'{count} {kind}' for kind, count in sorted(counts.items())) or 'unchanged'}) in {self.path}")
+        return dict(counts)
+
+    def compact(self, vacuum=False):
+        """
+        Fold every run that changed nothing into the run before it (extending its last
+        observation), so a streak of identical runs is stored once. Returns the runs removed.
+        """
+        with self.lock:
+            runs = self.conn.execute(
+                "SELECT id, last_observed_at, run_count, start_date, end_date, opened, closed FROM runs ORDER BY id").fetchall()
+            folded = []
+            keep = None  # [id, last_observed_at, run_count, start_date, end_date]
+            updates = {}
+            for run_id, last_observed_at, run_count, start_date, end_date, opened, closed in runs:
+                if keep is not None and opened == 0 and closed == 0:
+                    keep[1:] = [last_observed_at, keep[2] + run_count, start_date, end_date]
+                    updates[keep[0]] = tuple(keep[1:])
+                    folded.append(run_id)
+                else:
+                    keep = [run_id, last_observed_at, run_count, start_date, end_date]
+            if folded:
+                self.conn.executemany(
+                    "UPDATE runs SET last_observed_at = ?, run_count = ?, start_date = ?, end_date = ? WHERE id = ?",
+                    [values + (run_id,) for run_id, values in updates.items()])
+                self.conn.executemany("DELETE FROM runs WHERE id = ?", [(run_id,) for run_id in folded])
+                self.conn.commit()
+            if vacuum:
+                self.conn.execute("VACUUM")
+        return len(folded)
+
+    def find_facilities(self, query):
+        """Facility ids whose id equals `query` or whose name or area contains it (case-insensitive)."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT facility_id FROM facilities WHERE facility_id = ? OR name LIKE ? OR area LIKE ? ORDER BY name",
+                (query, f"%{query}%", f"%{query}%")).fetchall()
+        return [row[0] for row in rows]
+
+    def episodes(self, facility_ids=None, date_from=None, date_to=None, weekdays=None):
+        """
+        Availability episodes, one per time an entry opened: dicts with the facility, site,
+        booking date, how it opened, when (opened_at, and seen_after, the observation before),
+        and when and how it ended (None while still open). Dates are inclusive ISO strings or dates.
+        """
+        clauses, params = [], []
+        if facility_ids:
+            clauses.append(f"facility_id IN ({','.join('?' * len(facility_ids))})")
+            params.extend(facility_ids)
+        if date_from:
+            clauses.append("booking_date >= ?")
+            params.append(_isoformat(date_from))
+        if date_to:
+            clauses.append("booking_date <= ?")
+            params.append(_isoformat(date_to))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self.lock:
+            events = self.conn.execute(
+                f"SELECT facility_id, site, booking_date, kind, observed_at, previous_observed_at FROM events {where} "
+                "ORDER BY facility_id, booking_date, site, observed_at, id", params).fetchall()
+
+        episodes = []
+        open_episodes = {}
+        for facility_id, site, booking_date, kind, observed_at, previous_observed_at in events:
+            if weekdays is not None and datetime.date.fromisoformat(booking_date).weekday() not in weekdays:
+                continue
+            key = (facility_id, site, booking_date)
+            if kind in OPEN_KINDS:
+                episode = open_episodes[key] = {
+                    'facility_id': facility_id, 'site': site, 'booking_date': booking_date,
+                    'kind': kind, 'opened_at': observed_at, 'seen_after': previous_observed_at,
+                    'closed_at': None, 'closed_kind': None
+                }
+                episodes.append(episode)
+            else:
+                episode = open_episodes.pop(key, None)
+                if episode is not None:
+                    episode['closed_at'] = observed_at
+                    episode['closed_kind'] = kind
+        return episodes
+
+    def cancellation_patterns(self, facility_ids=None, date_from=None, date_to=None, weekdays=None):
+        """
+        When availability opens up on dates that were already searched (cancellations): counts by
+        lead time before the booking date, by Pacific hour and weekday of the observation, and
+        how long openings last before being booked.
+        """
+        cancellations = [episode for episode in self.episodes(facility_ids, date_from, date_to, weekdays)
+                         if episode['kind'] == 'opened']
+        by_lead_time = Counter()
+        by_hour = Counter()
+        by_weekday = Counter()
+        minutes_open = []
+        for episode in cancellations:
+            opened = _pacific(episode['opened_at'])
+            by_lead_time[lead_time_bucket((datetime.date.fromisoformat(episode['booking_date']) - opened.date()).days)] += 1
+            by_hour[opened.hour] += 1
+            by_weekday[WEEKDAY_NAMES[opened.weekday()]] += 1
+            if episode['closed_kind'] == 'closed':
+                minutes_open.append((episode['closed_at'] - episode['opened_at']) / 60)
+        return {
+            'cancellations': len(cancellations),
+            'still_open': sum(1 for episode in cancellations if episode['closed_at'] is None),
+            'by_lead_time': {label: by_lead_time[label] for _, label in LEAD_TIME_BUCKETS if by_lead_time[label]},
+            'by_hour': dict(sorted(by_hour.items())),
+            'by_weekday': {name: by_weekday[name] for name in WEEKDAY_NAMES if by_weekday[name]},
+            'median_minutes_open': round(statistics.median(minutes_open)) if minutes_open else None
+        }
+
+    def availability_at(self, when, facility_ids=None):
+        """Entries (facility_id, site, booking_date) available as of a past time (unix timestamp)."""
+        clauses, params = ["observed_at <= ?"], [when]
+        if facility_ids:
+            clauses.append(f"facility_id IN ({','.join('?' * len(facility_ids))})")
+            params.extend(facility_ids)
+        with self.lock:
+            # SQLite returns the other columns from the row holding MAX(id): each entry's latest event
+            rows = self.conn.execute(
+                f"SELECT facility_id, site, booking_date, kind, MAX(id) FROM events WHERE {' AND '.join(clauses)} "
+                "GROUP BY facility_id, booking_date, site", params).fetchall()
+        return sorted((facility_id, site, booking_date) for facility_id, site, booking_date, kind, _ in rows
+                      if kind in OPEN_KINDS)
+
+    def stats(self):
+        with self.lock:
+            runs, observations, first, last = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(run_count), 0), MIN(first_observed_at), MAX(last_observed_at) FROM runs").fetchone()
+            kinds = dict(self.conn.execute("SELECT kind, COUNT(*) FROM events GROUP BY kind").fetchall())
+            current = self.conn.execute("SELECT COUNT(*) FROM current").fetchone()[0]
+        return {
+            'runs_stored': runs,
+            'observations': observations,
+            'first_observed': _pacific(first).isoformat(timespec='minutes') if first else None,
+            'last_observed': _pacific(last).isoformat(timespec='minutes') if last else None,
+            'events': kinds,
+            'currently_available': current,
+            'file_bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+def record_history(rows, start_date, end_date, source='main', path=DEFAULT_HISTORY_PATH, unsearched=None):
+    """
+    Feed one run's results into the history at `path` (a falsy path disables it).
+    unsearched: the check-in ranges a partial run did not search.
+    """
+    if not path:
+        return None
+    history = AvailabilityHistory(path)
+    try:
+        return history.record_run(rows, start_date, end_date, source, unsearched=unsearched)
+    finally:
+        history.close()
+
+def parse_weekdays(value):
+    """'Fri,Sat' -> (4, 5)"""
+    names = [name.strip()[:3].title() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in WEEKDAY_NAMES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown weekday(s): {', '.join(unknown)}")
+    return tuple(WEEKDAY_NAMES.index(name) for name in names)
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the local availability history')
+    parser.add_argument('--path', type=str, default=DEFAULT_HISTORY_PATH, help='SQLite history file')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help='Summarize what the history holds')
+    compact = commands.add_parser('compact', help='Fold unchanged runs together and reclaim space')
+    compact.add_argument('--no-vacuum', action='store_true', help='Skip rewriting the file to reclaim space')
+    cancellations = commands.add_parser('cancellations', help='When availability opens up on already-searched dates')
+    cancellations.add_argument('facility', nargs='?', help='Facility id, or part of a facility or area name')
+    cancellations.add_argument('--weekends', action='store_true', help='Only Friday and Saturday check-ins')
+    cancellations.add_argument('--weekdays', type=parse_weekdays, help='Only these check-in weekdays, e.g. Fri,Sat')
+    cancellations.add_argument('--from', dest='date_from', type=str, help='First booking date (YYYY-MM-DD)')
+    cancellations.add_argument('--to', dest='date_to', type=str, help='Last booking date (YYYY-MM-DD)')
+    at = commands.add_parser('at', help='What was available at a past time')
+    at.add_argument('when', type=str, help='ISO date/time (Pacific unless it has an offset)')
+    at.add_argument('facility', nargs='?', help='Facility id, or part of a facility or area name')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        parser.error(f"No history at {args.path} (it is written by main.py/run_batches.py runs)")
+    history = AvailabilityHistory(args.path)
+
+    facility_ids = None
+    if getattr(args, 'facility', None):
+        facility_ids = history.find_facilities(args.facility)
+        if not facility_ids:
+            parser.error(f"No facility matching {args.facility!r} in the history")
+
+    if args.command == 'stats':
+        for key, value in history.stats().items():
+            print(f"{key}: {value}")
+    elif args.command == 'compact':
+        before = os.path.getsize(args.path)
+        folded = history.compact(vacuum=not args.no_vacuum)
+        print(f"Folded {folded} unchanged runs; {before} -> {os.path.getsize(args.path)} bytes")
+    elif args.command == 'cancellations':
+        weekdays = WEEKEND_DAYS if args.weekends else args.weekdays
+        patterns = history.cancellation_patterns(facility_ids, args.date_from, args.date_to, weekdays)
+        print(f"{patterns['cancellations']} cancellations ({patterns['still_open']} still open), "
+              f"median {patterns['median_minutes_open']} minutes before booked again")
+        for title, key in (('Lead time before the booking date', 'by_lead_time'),
+                           ('Hour observed (Pacific)', 'by_hour'), ('Weekday observed', 'by_weekday')):
+            print(f"\n{title}:")
+            total = patterns['cancellations'] or 1
+            for label, count in patterns[key].items():
+                print(f"  {str(label):>12}  {count:5}  {'#' * round(40 * count / total)}")
+    elif args.command == 'at':
+        when = datetime.datetime.fromisoformat(args.when)
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=PACIFIC)
+        entries = history.availability_at(when.timestamp(), facility_ids)
+        for facility_id, site, booking_date in entries:
+            print(f"{facility_id}  {booking_date}  {site}")
+        print(f"{len(entries)} entries available at {when.isoformat(timespec='minutes')}")
+    history.close()
+
+if __name__ == "__main__":
+    main()
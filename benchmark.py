@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the search pipeline, with a stand-in for the provider APIs.
+
+The provider is replaced by a generated availability matrix (campgrounds x sites x nights):
+either synthetic (a catalog of N campgrounds over M months) or replayed from night bitmaps
+saved by real runs (.cache/night_bitmap_<provider>_<batch>.npz). Searches go through the
+real search engine, planner, site filter, result store, file writers, merger and server;
+only the camply searcher is swapped out, so nothing touches the network.
+
+    python benchmark.py                                   # 10 and 100 campgrounds x 1 and 6 months
+    python benchmark.py --campgrounds 10,1000,5000 --months 1,12 --output bench.json
+    python benchmark.py --replay .cache/night_bitmap_reserve_california_default.npz
+    python benchmark.py --compare bench.json --fail-on-regression
+
+Results are written as JSON (schema "yayarea.benchmark") with, per scenario and stage, the
+median seconds of --repeat runs and the items processed, so runs can be compared.
+"""
+
+import argparse
+import contextlib
+import datetime
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dateutil.relativedelta import relativedelta
+import numpy as np
+import main as search_main
+import run_batches
+import search_engine
+import serve_local
+from campsites_map import Campsite, CampgroundCatalog, load_catalog
+from search_engine import SearchJob, run_search_jobs
+from site_filters import SiteFilter, load_site_rules
+from stay_profiles import NightBitmap, StayRecord, get_profiles
+from window_planner import candidate_stays, plan_search_jobs, plan_stay_jobs
+
+BENCHMARK_SCHEMA = "yayarea.benchmark"
+BENCHMARK_VERSION = 1
+
+PROVIDERS = ['reserve_california', 'recreation_gov']
+PROVIDER_KEYS = {'reserve_california': 'rc', 'recreation_gov': 'rg'}
+
+DEFAULT_CAMPGROUNDS = '10,100'
+DEFAULT_MONTHS = '1,6'
+DEFAULT_SITES = 10
+# Share of site-nights that are free
+DEFAULT_DENSITY = 0.15
+# Stages faster than this are too noisy to call a regression
+MIN_COMPARED_SECONDS = 0.001
+DEFAULT_REGRESSION_THRESHOLD = 0.25
+# Requests timed per serving stage
+SERVE_REQUESTS = 20
+
+# Site names the default site_filters.json rules drop, mixed into synthetic campgrounds
+FILTERED_SITE_NAMES = ['Hike-in {}', 'Walk-In {}', 'Day Use {}', 'ADA Site {}']
+
+class ProviderStandIn:
+    """
+    Availability for every campground, site and night, served in place of the provider APIs.
+    availability[provider][campground_id] is a (site names, bool matrix sites x nights) pair
+    for nights from start_date.
+    """
+
+    def __init__(self, catalog, start_date, availability, latency=0.0):
+        self.catalog = catalog
+        self.start_date = start_date
+        self.availability = availability
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def synthetic(cls, campgrounds, months, sites=DEFAULT_SITES, density=DEFAULT_DENSITY, seed=0, latency=0.0):
+        """A generated catalog of `campgrounds` campgrounds (alternating providers) over `months` months."""
+        rng = np.random.default_rng(seed)
+        names = random.Random(seed)
+        start_date = datetime.date.today() + datetime.timedelta(days=1)
+        nights = (start_date + relativedelta(months=months) - start_date).days + 7
+        entries = []
+        availability = {provider: {} for provider in PROVIDERS}
+        for number in range(campgrounds):
+            provider = PROVIDERS[number % len(PROVIDERS)]
+            campground_id = str(100000 + number)
+            entries.append((provider, Campsite(
+                park_name=f"Park {number}", time_to='', miles=int(rng.integers(5, 300)),
+                campground_name=f"Campground {number}",
+                url=f"https://example.com/{PROVIDER_KEYS[provider]}/{campground_id}",
+                rec=f"Area {number % 50}", campground_id=campground_id)))
+            site_names = [names.choice(FILTERED_SITE_NAMES).format(site + 1) if site % 5 == 4 else f"Site {site + 1}"
+                          for site in range(sites)]
+            availability[provider][campground_id] = (site_names, rng.random((sites, nights)) < density)
+        return cls(CampgroundCatalog(entries), start_date, availability, latency)
+
+    @classmethod
+    def replay(cls, paths, latency=0.0):
+        """Availability recorded in night bitmaps saved by real runs."""
+        try:
+            real_catalog = load_catalog()
+        except OSError:
+            real_catalog = None
+        bitmaps = []
+        for path in paths:
+            bitmap = NightBitmap.load(path)
+            named = next((provider for provider in PROVIDERS if provider in os.path.basename(path)), None)
+            bitmaps.append((named, bitmap))
+        start_date = min(bitmap.start_date for _, bitmap in bitmaps)
+
+        entries = {}
+        rows = {}  # (provider, campground_id) -> [(site name, night availability from start_date)]
+        for named, bitmap in bitmaps:
+            offset = (bitmap.start_date - start_date).days
+            for site, row in zip(bitmap.sites, bitmap.matrix):
+                campground_id = site['facility_id']
+                provider = named or (real_catalog.provider_of.get(campground_id) if real_catalog else None) or PROVIDERS[0]
+                if campground_id not in entries:
+                    known = real_catalog.by_id.get(campground_id) if real_catalog else None
+                    entries[campground_id] = (provider, known or Campsite(
+                        park_name=site['recreation_area'], time_to='', miles=999,
+                        campground_name=site['facility_name'], url=site['booking_url'],
+                        rec=site['recreation_area'], campground_id=campground_id))
+                rows.setdefault((provider, campground_id), []).append((site['campsite_site_name'], offset, row))
+
+        nights = max((offset + len(row) for sites in rows.values() for _, offset, row in sites), default=0)
+        availability = {provider: {} for provider in PROVIDERS}
+        for (provider, campground_id), sites in rows.items():
+            matrix = np.zeros((len(sites), nights), dtype=bool)
+            for index, (_, offset, row) in enumerate(sites):
+                matrix[index, offset:offset + len(row)] = row
+            availability.setdefault(provider, {})[campground_id] = ([name for name, _, _ in sites], matrix)
+        return cls(CampgroundCatalog(list(entries.values())), start_date, availability, latency)
+
+    @property
+    def campgrounds(self):
+        return len(self.catalog)
+
+    @property
+    def end_date(self):
+        nights = max((matrix.shape[1] for campgrounds in self.availability.values()
+                      for _, matrix in campgrounds.values()), default=0)
+        return self.start_date + datetime.timedelta(days=nights)
+
+    def search(self, provider, windows, campground_ids):
+        """Single available nights in the windows (end exclusive), like a camply search with nights=1."""
+        months = {(start + datetime.timedelta(days=offset)).replace(day=1)
+                  for start, end in windows for offset in range((end - start).days)}
+        with self.lock:
+            self.calls += len(months) * len(campground_ids)
+        if self.latency:
+            time.sleep(self.latency * len(months))
+
+        found = []
+        one_night = datetime.timedelta(days=1)
+        for campground_id in campground_ids:
+            campground = self.availability.get(provider, {}).get(campground_id)
+            if campground is None:
+                continue
+            site_names, matrix = campground
+            info = self.catalog.by_id[campground_id]
+            for start, end in windows:
+                first = max(0, (start - self.start_date).days)
+                last = min(matrix.shape[1], (end - self.start_date).days)
+                if first >= last:
+                    continue
+                rows, cols = np.nonzero(matrix[:, first:last])
+                for row, col in zip(rows.tolist(), cols.tolist()):
+                    booking_date = datetime.datetime.combine(self.start_date, datetime.time()) + datetime.timedelta(days=first + col)
+                    found.append(StayRecord(
+                        facility_id=campground_id, facility_name=info.campground_name, recreation_area=info.rec,
+                        campsite_id=f"{campground_id}-{row}", campsite_site_name=site_names[row],
+                        booking_url=f"{info.url}/{row}", booking_date=booking_date,
+                        booking_end_date=booking_date + one_night, booking_nights=1))
+        return found
+
+class StandInSearcher:
+    """Takes the place of a camply searcher for one SearchJob."""
+
+    def __init__(self, stand_in, provider, windows, campground_ids):
+        self.stand_in = stand_in
+        self.provider = provider
+        self.windows = windows
+        self.campground_ids = campground_ids
+
+    def get_matching_campsites(self, **kwargs):
+        return self.stand_in.search(self.provider, self.windows, self.campground_ids)
+
+@contextlib.contextmanager
+def provider_stand_in(stand_in):
+    """Route searches (and main.py's catalog) to the stand-in while the block runs."""
+    original_searcher = search_engine.build_searcher
+    original_catalog = search_main.load_catalog
+    search_engine.build_searcher = lambda provider, windows, campground_ids, nights, weekends_only: \
+        StandInSearcher(stand_in, provider, windows, campground_ids)
+    search_main.load_catalog = lambda: stand_in.catalog
+    try:
+        yield stand_in
+    finally:
+        search_engine.build_searcher = original_searcher
+        search_main.load_catalog = original_catalog
+
+def time_stage(function, repeat, quiet=True):
+    """Run function() `repeat` times; returns (timings, last return value)."""
+    timings = []
+    value = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            started = time.perf_counter()
+            value = function()
+            timings.append(time.perf_counter() - started)
+    return timings, value
+
+def stage_result(timings, items=None, calls_per_run=1):
+    """Summary of a stage's timings: median seconds per call (and items per second)."""
+    per_call = [seconds / calls_per_run for seconds in timings]
+    result = {
+        'seconds': statistics.median(per_call),
+        'min_seconds': min(per_call),
+        'max_seconds': max(per_call),
+        'runs': len(per_call)
+    }
+    if items is not None:
+        result['items'] = items
+        result['items_per_second'] = items / result['seconds'] if result['seconds'] else None
+    return result
+
+def serve_benchmark(directory, repeat):
+    """Time results.json downloads, 304 revalidations and query API calls against serve_local."""
+    class Handler(serve_local.ResultsRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=directory, **kwargs)
+
+    server = serve_local.ResultsServer(('127.0.0.1', 0), Handler)
+    server.quiet = True
+    server.results_index = serve_local.ResultsIndexStore(os.path.join(directory, 'results.json'))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+
+    def fetch(path, headers=None):
+        connection.request('GET', path, headers=headers or {})
+        response = connection.getresponse()
+        body = response.read()
+        return response, body
+
+    try:
+        stages = {}
+        response, body = fetch('/results.json', {'Accept-Encoding': 'gzip'})
+        etag = response.getheader('ETag')
+        requests = SERVE_REQUESTS * repeat
+        for name, path, headers in [
+            ('serve_results_json', '/results.json', {}),
+            ('serve_results_json_gzip', '/results.json', {'Accept-Encoding': 'gzip'}),
+            ('serve_not_modified', '/results.json', {'Accept-Encoding': 'gzip', 'If-None-Match': etag}),
+            ('serve_query', '/api/results?max_miles=100&limit=20', {'Accept-Encoding': 'gzip'})
+        ]:
+            sizes = []
+            timings, _ = time_stage(lambda: sizes.append(len(fetch(path, headers)[1])), requests)
+            stages[name] = stage_result(timings)
+            stages[name]['bytes'] = sizes[-1]
+        return stages
+    finally:
+        connection.close()
+        server.shutdown()
+        server.server_close()
+
+def run_scenario(stand_in, months, repeat, workdir, max_in_flight=3):
+    """Time every pipeline stage against one stand-in; returns {stage: summary}."""
+    stages = {}
+    start_date = stand_in.start_date
+    end_date = start_date + relativedelta(months=months) if months else stand_in.end_date - datetime.timedelta(days=1)
+    catalog = stand_in.catalog
+    weekend = get_profiles(['weekend'])[0]
+
+    # Window planning is fast; time many calls per run
+    loops = 200
+    timings, _ = time_stage(lambda: [search_main.generate_monthly_search_windows(start_date, end_date, True)
+                                           for _ in range(loops)], repeat)
+    stages['generate_monthly_search_windows'] = stage_result(timings, calls_per_run=loops)
+    timings, _ = time_stage(lambda: [plan_search_jobs(start_date, end_date, PROVIDERS[0], weekend.nights, weekend.checkin_weekdays)
+                                     for _ in range(loops)], repeat)
+    stages['plan_search_jobs'] = stage_result(timings, calls_per_run=loops)
+
+    # The concurrent search loop, as run_search plans it (single nights for the weekend stays)
+    stays = candidate_stays(start_date, end_date, weekend.nights, weekend.checkin_weekdays)
+    jobs = []
+    for provider in PROVIDERS:
+        campground_ids = catalog.campground_ids(provider)
+        if campground_ids:
+            jobs.extend(SearchJob(provider, job.start, job.end, campground_ids, index=index, windows=job.windows)
+                        for index, job in enumerate(plan_stay_jobs(stays, provider), 1))
+
+    def search_loop():
+        found = {provider: [] for provider in PROVIDERS}
+        for window in run_search_jobs(jobs, 1, False, max_in_flight=max_in_flight):
+            if window.error is not None:
+                raise window.error
+            found[window.job.provider].extend(window.results)
+        return found
+
+    with provider_stand_in(stand_in):
+        stand_in.calls = 0
+        timings, nights = time_stage(search_loop, repeat)
+        stages['search_loop'] = stage_result(timings, sum(len(found) for found in nights.values()))
+        stages['search_loop']['provider_calls'] = stand_in.calls // repeat
+
+        def filter_all():
+            site_filter = SiteFilter(load_site_rules())
+            return sum(len(site_filter.filter(found, provider)) for provider, found in nights.items())
+        timings, kept = time_stage(filter_all, repeat)
+        stages['filter_campsites'] = stage_result(timings, sum(len(found) for found in nights.values()))
+        stages['filter_campsites']['kept'] = kept
+
+        # End to end for each provider, as main.py runs it (plan, search, filter, bitmap, derive)
+        outcomes = {}
+        for provider in PROVIDERS:
+            if not catalog.campground_ids(provider):
+                continue
+            timings, outcome = time_stage(lambda: search_main.run_search(provider, start_date, end_date, 'benchmark',
+                                                                  max_in_flight=max_in_flight, checkpoint_dir=None), repeat)
+            outcomes[provider] = outcome
+            stages[f'run_search_{PROVIDER_KEYS[provider]}'] = stage_result(timings, len(outcome.results))
+
+    derived = [stay for outcome in outcomes.values() for stay in outcome.night_bitmap.derive(weekend)]
+    miles_lookup, url_lookup = catalog.miles_lookup, catalog.url_lookup
+    timings, rows = time_stage(lambda: search_main.results_to_json(derived, miles_lookup, url_lookup), repeat)
+    stages['results_to_json'] = stage_result(timings, len(rows))
+
+    search_criteria = {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+                       'consecutive_nights': weekend.nights, 'weekends_only': True, 'stay_profile': weekend.name}
+    timings, _ = time_stage(lambda: search_main.save_results_to_json(derived, miles_lookup, url_lookup, search_criteria,
+                                                              write_variants=False), repeat)
+    stages['save_results_to_json'] = stage_result(timings, len(derived))
+    timings, _ = time_stage(lambda: search_main.save_results_to_json(derived, miles_lookup, url_lookup, search_criteria), repeat)
+    stages['save_results_to_json_with_variants'] = stage_result(timings, len(derived))
+    stages['save_results_to_json_with_variants']['bytes'] = os.path.getsize(os.path.join(workdir, 'results.json'))
+
+    # Two batches per provider, split mid-range, merged from files and in process
+    split_ordinal = (start_date + (end_date - start_date) / 2).toordinal()
+    batches = {}
+    for provider, outcome in outcomes.items():
+        stays_by_batch = {'batch1': [], 'batch2': []}
+        for stay in outcome.night_bitmap.derive(weekend):
+            stays_by_batch['batch1' if stay.booking_date.toordinal() < split_ordinal else 'batch2'].append(stay)
+        for batch, batch_stays in stays_by_batch.items():
+            key = f"{PROVIDER_KEYS[provider]}_{batch}"
+            batches[key] = search_main.build_results_data(batch_stays, miles_lookup, url_lookup, search_criteria, key)
+            search_main.write_results_data(batches[key], f"results_{key}.json")
+    merged_rows = sum(len(data['results']) for data in batches.values())
+    timings, _ = time_stage(lambda: run_batches.merge_results(), repeat)
+    stages['merge_results'] = stage_result(timings, merged_rows)
+    timings, _ = time_stage(lambda: run_batches.merge_results(batches), repeat)
+    stages['merge_results_in_process'] = stage_result(timings, merged_rows)
+
+    stages.update(serve_benchmark(workdir, repeat))
+    return stages
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_reports(previous, current, threshold=DEFAULT_REGRESSION_THRESHOLD):
+    """Print per-stage changes between two reports; returns the regressions found."""
+    old_scenarios = {scenario['name']: scenario for scenario in previous.get('scenarios', [])}
+    regressions = []
+    for scenario in current['scenarios']:
+        old = old_scenarios.get(scenario['name'])
+        if old is None:
+            print(f"{scenario['name']}: not in the previous report")
+            continue
+        print(f"\n{scenario['name']} (vs {previous.get('git_commit') or 'previous run'}):")
+        for stage, result in scenario['stages'].items():
+            old_result = old['stages'].get(stage)
+            if old_result is None:
+                print(f"  {stage:40s} {result['seconds'] * 1000:10.2f} ms   (new)")
+                continue
+            ratio = result['seconds'] / old_result['seconds'] if old_result['seconds'] else float('inf')
+            flag = ''
+            if ratio > 1 + threshold and max(result['seconds'], old_result['seconds']) >= MIN_COMPARED_SECONDS:
+                flag = '  ⚠️ slower'
+                regressions.append((scenario['name'], stage, ratio))
+            elif ratio < 1 - threshold:
+                flag = '  faster'
+            print(f"  {stage:40s} {result['seconds'] * 1000:10.2f} ms   x{ratio:5.2f}{flag}")
+    return regressions
+
+def parse_counts(text):
+    return [int(value) for value in text.split(',') if value.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the search pipeline offline against a provider stand-in')
+    parser.add_argument('--campgrounds', type=str, default=DEFAULT_CAMPGROUNDS,
+                        help=f'Comma-separated synthetic catalog sizes (default: {DEFAULT_CAMPGROUNDS})')
+    parser.add_argument('--months', type=str, default=DEFAULT_MONTHS,
+                        help=f'Comma-separated search ranges in months (default: {DEFAULT_MONTHS})')
+    parser.add_argument('--sites', type=int, default=DEFAULT_SITES, help='Sites per synthetic campground')
+    parser.add_argument('--density', type=float, default=DEFAULT_DENSITY, help='Share of site-nights that are free')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Simulated seconds per provider call (default: 0, measure CPU cost only)')
+    parser.add_argument('--replay', action='append',
+                        help='Night bitmap (.npz) from a real run to replay instead of synthetic data (repeatable)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage; the median is reported')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for synthetic availability')
+    parser.add_argument('--output', type=str, help='Write the JSON report here (default: stdout)')
+    parser.add_argument('--compare', type=str, help='Earlier JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                        help='Slowdown ratio above which a stage counts as a regression (default: 0.25 = 25%%)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='Exit with status 1 if any stage regressed')
+    args = parser.parse_args()
+
+    if args.replay:
+        scenarios = [('replay', None, lambda: ProviderStandIn.replay(args.replay, args.latency))]
+    else:
+        scenarios = [(f"{campgrounds}x{months}m", months,
+                      lambda campgrounds=campgrounds, months=months: ProviderStandIn.synthetic(
+                          campgrounds, months, args.sites, args.density, args.seed, args.latency))
+                     for campgrounds in parse_counts(args.campgrounds) for months in parse_counts(args.months)]
+
+    report = {
+        'schema': BENCHMARK_SCHEMA,
+        'version': BENCHMARK_VERSION,
+        'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {key: value for key, value in vars(args).items()
+                   if key not in ('output', 'compare', 'fail_on_regression', 'threshold')},
+        'scenarios': []
+    }
+
+    original_directory = os.getcwd()
+    for name, months, make_stand_in in scenarios:
+        print(f"⏱️ Benchmarking {name}...", file=sys.stderr)
+        stand_in = make_stand_in()
+        # Output files (results.json, .cache, ...) go to a scratch directory
+        with tempfile.TemporaryDirectory(prefix='yayarea-bench-') as workdir:
+            os.chdir(workdir)
+            try:
+                stages = run_scenario(stand_in, months, args.repeat, workdir)
+            finally:
+                os.chdir(original_directory)
+        report['scenarios'].append({'name': name, 'campgrounds': stand_in.campgrounds,
+                                    'months': months, 'stages': stages})
+        for stage, result in stages.items():
+            print(f"  {stage:40s} {result['seconds'] * 1000:10.2f} ms", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Benchmark report saved to {args.output}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            previous = json.load(f)
+        with contextlib.redirect_stdout(sys.stderr):
+            regressions = compare_reports(previous, report, args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"❌ {len(regressions)} stage(s) regressed", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,16 @@
+import csv
+import os
 from dataclasses import dataclass
-from typing import List
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
-@dataclass
+# Campground catalog; one row per campground
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'BayAreaCampsites.csv')
+
+# Upper bounds (in miles) of the distance bands watches are indexed by (see watch_alerts.py)
+DISTANCE_BANDS = (50, 100, 200)
+
+@dataclass(slots=True)
 class Campsite:
     """Data structure representing a campsite with all its properties."""
     park_name: str
@@ -11,99 +20,85 @@ class Campsite:
     url: str
     rec: str
     campground_id: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+def distance_band(miles):
+    """
+    The distance band a distance falls in: the first DISTANCE_BANDS bound it doesn't exceed,
+    or None if it is further than all of them.
+    """
+    for bound in DISTANCE_BANDS:
+        if miles <= bound:
+            return bound
+    return None
+
+class CampgroundCatalog:
+    """
+    All campgrounds, with indexes built in a single pass:
+    by campground_id, by provider, and the per-campground lookups main.py uses.
+    """
+    __slots__ = ('campsites', 'by_id', 'by_provider', 'provider_of', 'miles_lookup', 'url_lookup')
+
+    def __init__(self, entries: List[Tuple[str, Campsite]]):
+        self.campsites: Tuple[Campsite, ...] = tuple(campsite for _, campsite in entries)
+        self.by_id: Dict[str, Campsite] = {}
+        self.by_provider: Dict[str, List[Campsite]] = {}
+        self.provider_of: Dict[str, str] = {}
+        self.miles_lookup: Dict[str, int] = {}
+        self.url_lookup: Dict[str, str] = {}
+        for provider, campsite in entries:
+            self.by_id[campsite.campground_id] = campsite
+            self.by_provider.setdefault(provider, []).append(campsite)
+            self.provider_of[campsite.campground_id] = provider
+            self.miles_lookup[campsite.campground_id] = campsite.miles
+            self.url_lookup[campsite.campground_id] = campsite.url
+
+    def __len__(self):
+        return len(self.campsites)
+
+    def campground_ids(self, provider):
+        """Campground IDs for a provider, in catalog order."""
+        return [campsite.campground_id for campsite in self.by_provider.get(provider, [])]
+
+@lru_cache(maxsize=None)
+def load_catalog(path=CATALOG_PATH):
+    """
+    Load the campground catalog from its CSV file (cached per path).
+    Columns: provider, rec, campground_id, park_name, campground_name, miles, time_to, url,
+    latitude, longitude (miles and time_to are by road from San Francisco; distances.py estimates
+    the miles from other origins)
+    """
+    entries = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            entries.append((row['provider'], Campsite(
+                park_name=row['park_name'],
+                time_to=row['time_to'],
+                miles=int(row['miles']),
+                campground_name=row['campground_name'],
+                url=row['url'],
+                rec=row['rec'],
+                campground_id=row['campground_id'],
+                latitude=float(row['latitude']) if row.get('latitude') else None,
+                longitude=float(row['longitude']) if row.get('longitude') else None
+            )))
+    return CampgroundCatalog(entries)
 
 def get_rec_to_campsites_map():
     """
     Returns a map where the key is Rec and the value is a list of Campsite objects.
     Data parsed from BayAreaCampsites.csv
     """
-    return {
-        "703": [
-            Campsite("Salt Point SP", "2h12m", 100, "Woodside Lower Loop (sites 31-70)", "https://www.reservecalifornia.com/park/703/649", "703", "649"),
-            Campsite("Salt Point SP", "2h12m", 100, "Woodside Upper Loop (sites 71-109)", "https://www.reservecalifornia.com/park/703/614", "703", "614")
-        ],
-        "718": [
-            Campsite("Sonoma Coast State Park", "1h22m", 70, "Bodega Dunes", "https://www.reservecalifornia.com/park/718/2061", "718", "2061"),
-            Campsite("Sonoma Coast State Park", "1h22m", 70, "Wright's Beach (sites 1-27)", "https://www.reservecalifornia.com/park/718/706", "718", "706")
-        ],
-        "705": [
-            Campsite("Samuel P. Taylor SP", "49m", 30, "Creekside Loop (sites 1-25)", "https://www.reservecalifornia.com/park/705/653", "705", "653"),
-            Campsite("Samuel P. Taylor SP", "49m", 30, "Orchard Hill Loop (sites 26-59)", "https://www.reservecalifornia.com/park/705/657", "705", "657")
-        ],
-        "652": [
-            Campsite("Half Moon Bay SP", "33m", 23, "Francis Beach Campground", "https://www.reservecalifornia.com/park/652/498", "652", "498")
-        ],
-        "695": [
-            Campsite("Portola Redwoods SP", "1h11m", 50, "Portola Campground (sites 1-4, 20-45)", "https://www.reservecalifornia.com/park/695/628", "695", "628"),
-            Campsite("Portola Redwoods SP", "1h11m", 50, "Portola Campground (sites 5-19, 46-53)", "https://www.reservecalifornia.com/park/695/629", "695", "629")
-        ],
-        "3": [
-            Campsite("Big Basin Campgrounds", "1h15m", 56, "Lower Blooms Creek (sites 103-138)", "https://www.reservecalifornia.com/park/3/332", "3", "332"),
-            Campsite("Big Basin Campgrounds", "1h15m", 56, "Sempervirens Campground (sites 157-188)", "https://www.reservecalifornia.com/park/3/335", "3", "335"),
-            Campsite("Big Basin Campgrounds", "1h15m", 56, "Huckleberry Campground (sites 42-75)", "https://www.reservecalifornia.com/park/3/336", "3", "336"),
-            Campsite("Big Basin Campgrounds", "1h15m", 56, "Wastahi Campground (sites 76-102)", "https://www.reservecalifornia.com/park/3/337", "3", "337"),
-            Campsite("Big Basin Campgrounds", "1h15m", 56, "Upper Blooms Creek (sites 139-156)", "https://www.reservecalifornia.com/park/3/339", "3", "339")
-        ],
-        "672": [
-            Campsite("Manresa SB", "1h30m", 86, "Willow Camps (sites 1-26) - Walk In From Parking Lot", "https://www.reservecalifornia.com/park/672/564", "672", "564"),
-            Campsite("Manresa SB", "1h30m", 86, "Bay & Lupine Camps (sites 27-65) - Walk In From Parking Lot", "https://www.reservecalifornia.com/park/672/565", "672", "565")
-        ],
-        "690": [
-            Campsite("Pfeiffer Big Sur SP", "2h30m", 140, "South Camp (sites 1-78)", "https://www.reservecalifornia.com/park/690/611", "690", "611"),
-            Campsite("Pfeiffer Big Sur SP", "2h30m", 140, "Weyland Camp (sites 79-130)", "https://www.reservecalifornia.com/park/690/612", "690", "612"),
-            Campsite("Pfeiffer Big Sur SP", "2h30m", 140, "Main Camp (sites 131-188)", "https://www.reservecalifornia.com/park/690/767", "690", "767")
-        ]
-    }
+    catalog = load_catalog()
+    rec_map = {}
+    for campsite in catalog.by_provider.get('reserve_california', []):
+        rec_map.setdefault(campsite.rec, []).append(campsite)
+    return rec_map
 
 def get_recreation_gov_campsites():
     """
     Returns a list of Recreation.gov campsite objects.
     Includes Yosemite and Bay Area campgrounds.
     """
-    return [
-        Campsite(
-            park_name="Golden Gate NRA",
-            time_to="30m",
-            miles=15,
-            campground_name="Kirby Cove",
-            url="https://www.recreation.gov/camping/campgrounds/232491",
-            rec="recreation_gov",
-            campground_id="232491"
-        ),
-        Campsite(
-            park_name="Presidio of San Francisco",
-            time_to="20m",
-            miles=8,
-            campground_name="Rob Hill Group Campground",
-            url="https://www.recreation.gov/camping/campgrounds/10172170",
-            rec="recreation_gov",
-            campground_id="10172170"
-        ),
-        Campsite(
-            park_name="Yosemite National Park",
-            time_to="3h30m",
-            miles=180,
-            campground_name="Upper Pines",
-            url="https://www.recreation.gov/camping/campgrounds/232447",
-            rec="recreation_gov",
-            campground_id="232447"
-        ),
-        Campsite(
-            park_name="Yosemite National Park",
-            time_to="3h30m",
-            miles=180,
-            campground_name="Lower Pines",
-            url="https://www.recreation.gov/camping/campgrounds/232450",
-            rec="recreation_gov",
-            campground_id="232450"
-        ),
-        Campsite(
-            park_name="Yosemite National Park",
-            time_to="3h15m",
-            miles=170,
-            campground_name="Wawona",
-            url="https://www.recreation.gov/camping/campgrounds/232446",
-            rec="recreation_gov",
-            campground_id="232446"
-        )
-    ]
+    return list(load_catalog().by_provider.get('recreation_gov', []))
@@ -0,0 +1,116 @@
+"""
+Per-window search checkpoints, so a failed or interrupted run can be resumed.
+
+Each finished (provider, window) search is written to .cache/checkpoints/<key>.json with the
+site-nights it found (or the error it failed with). The key is a digest of everything that
+determines the window's results: provider, date windows, campgrounds and fetch settings, so a
+later run whose plan shifted still reuses the windows that are unchanged.
+With resume, windows with a recent successful checkpoint are loaded instead of searched again;
+failed and missing windows are searched. Checkpoints are cleared once a whole run has completed,
+so resuming only ever picks up what an unfinished run left behind.
+"""
+
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import time
+from results_delta import write_json_atomic
+from stay_profiles import StayRecord, SITE_FIELDS
+
+DEFAULT_CHECKPOINT_DIR = os.path.join('.cache', 'checkpoints')
+# Checkpoints older than this are not resumed from (and are deleted)
+CHECKPOINT_MAX_AGE = 2 * 60 * 60  # 2 hours
+
+def checkpoint_key(job, context=None):
+    """Digest identifying a search job's results: provider, windows, campgrounds and fetch context."""
+    identity = {
+        'provider': job.provider,
+        'windows': [[start.isoformat(), end.isoformat()] for start, end in job.search_windows],
+        'campgrounds': sorted(str(campground_id) for campground_id in job.campground_ids),
+        'context': context or {}
+    }
+    return hashlib.sha1(json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()[:20]
+
+def file_digest(path):
+    """Short digest of a file's contents (e.g. a rule config that shapes the results)."""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+class CheckpointStore:
+    """One JSON file per window checkpoint in `directory`."""
+
+    def __init__(self, directory=DEFAULT_CHECKPOINT_DIR, max_age=CHECKPOINT_MAX_AGE):
+        self.directory = directory
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def save(self, key, job, results=None, error=None, attempts=1):
+        """Record a window's outcome: its site-nights when it succeeded, the error when it failed."""
+        site_index = {}
+        sites = []
+        nights = []
+        for result in results or []:
+            site_key = (str(result.facility_id), str(result.campsite_id))
+            index = site_index.get(site_key)
+            if index is None:
+                index = site_index[site_key] = len(sites)
+                sites.append({field: str(getattr(result, field)) for field in SITE_FIELDS})
+            nights.append([index, result.booking_date.date().isoformat(), result.booking_nights])
+
+        write_json_atomic({
+            'provider': job.provider,
+            'label': job.label,
+            'status': 'failed' if error is not None else 'ok',
+            'error': f"{type(error).__name__}: {error}" if error is not None else None,
+            'attempts': attempts,
+            'saved_at': time.time(),
+            'sites': sites,
+            'nights': nights
+        }, self.path(key), separators=(',', ':'))
+
+    def load(self, key):
+        """
+        The site-nights (as StayRecords) of a recent successful checkpoint,
+        or None if the window has no usable checkpoint.
+        """
+        try:
+            with open(self.path(key), 'r') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if checkpoint.get('status') != 'ok' or time.time() - checkpoint.get('saved_at', 0) > self.max_age:
+            return None
+
+        records = []
+        for site_index, booking_date, booking_nights in checkpoint['nights']:
+            start = datetime.datetime.combine(datetime.date.fromisoformat(booking_date), datetime.time())
+            records.append(StayRecord(booking_date=start,
+                                      booking_end_date=start + datetime.timedelta(days=booking_nights),
+                                      booking_nights=booking_nights,
+                                      **checkpoint['sites'][site_index]))
+        return records
+
+    def prune(self):
+        """
+        Delete checkpoints older than max_age. Concurrent searches (run_batches threads) prune the
+        same directory, so a checkpoint another one already deleted is skipped.
+        """
+        cutoff = time.time() - self.max_age
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.json'):
+                with contextlib.suppress(FileNotFoundError):
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+
+    def clear(self):
+        """Delete all checkpoints (after a run completed and its results were published)."""
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,105 @@
+"""
+Deadline and time budget helpers for campsite searches.
+A whole-run RunBudget is split into per-window Deadlines, and each HTTP request
+gets a timeout capped by the deadline of the window it belongs to.
+Deadlines are tracked with contextvars, so they work from worker threads and coroutines
+(unlike SIGALRM, which only works in the main thread).
+"""
+
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+
+# Default cap for a single HTTP request, in seconds
+DEFAULT_REQUEST_TIMEOUT = 30
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when work is attempted after its deadline has passed."""
+    pass
+
+class Deadline:
+    """A point in monotonic time after which work should stop."""
+
+    def __init__(self, seconds=None, parent=None):
+        self.expires_at = math.inf if seconds is None else time.monotonic() + seconds
+        if parent is not None:
+            self.expires_at = min(self.expires_at, parent.expires_at)
+
+    def remaining(self):
+        """Seconds left before the deadline (never negative, inf if unbounded)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def check(self, what="operation"):
+        """Raise DeadlineExceeded if the deadline has passed."""
+        if self.expired:
+            raise DeadlineExceeded(f"{what} exceeded its deadline")
+
+    def child(self, seconds=None):
+        """Create a deadline that expires after `seconds` but never later than this one."""
+        return Deadline(seconds, parent=self)
+
+    def request_timeout(self, requested=None, cap=DEFAULT_REQUEST_TIMEOUT):
+        """
+        Timeout for a single HTTP request: the requested timeout (number or (connect, read) tuple),
+        capped by `cap` and by the time remaining on this deadline.
+        """
+        self.check("HTTP request")
+        limit = min(self.remaining(), cap if cap is not None else math.inf)
+        if isinstance(requested, tuple):
+            return tuple(limit if part is None else min(part, limit) for part in requested)
+        if requested is None:
+            return None if math.isinf(limit) else limit
+        return min(requested, limit)
+
+class RunBudget:
+    """
+    Time budget for a whole run, split into per-window deadlines.
+    Each window gets a fair share of what's left (given how many windows run at once),
+    capped by window_seconds.
+    """
+
+    def __init__(self, total_seconds=None, window_seconds=None):
+        self.deadline = Deadline(total_seconds)
+        self.window_seconds = window_seconds
+
+    def remaining(self):
+        return self.deadline.remaining()
+
+    @property
+    def expired(self):
+        return self.deadline.expired
+
+    def window_deadline(self, windows_remaining=1, concurrency=1):
+        """
+        Deadline for the next window, given the number of windows not yet started (including this one).
+        """
+        remaining = self.deadline.remaining()
+        seconds = self.window_seconds
+        if not math.isinf(remaining):
+            windows_remaining = max(1, windows_remaining)
+            share = remaining * min(concurrency, windows_remaining) / windows_remaining
+            seconds = share if seconds is None else min(seconds, share)
+        return self.deadline.child(seconds)
+
+_current_deadline = contextvars.ContextVar('current_deadline', default=None)
+
+# Deadline used when no scope is active: unbounded
+NO_DEADLINE = Deadline()
+
+def current_deadline():
+    """Deadline of the active scope in this thread/task, or an unbounded one."""
+    return _current_deadline.get() or NO_DEADLINE
+
+@contextmanager
+def deadline_scope(deadline):
+    """Make `deadline` the current deadline for code running inside the with block."""
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
@@ -0,0 +1,100 @@
+"""
+Road distances to every campground from several named origins.
+
+The catalog's miles column is the road distance from San Francisco. With each campground's
+coordinates, straight-line (haversine) distances from every origin are computed in one
+vectorized pass, and turned into road estimates with a per-campground circuity factor
+(road miles / straight-line miles from San Francisco) calibrated against the catalog, so the
+San Francisco figures reproduce the catalog exactly, and roads that wind (the coast, the
+Sierra) are accounted for from other origins too. Campgrounds without coordinates keep their
+catalog miles for every origin.
+
+One crawl serves every origin: the results are the same, only their distances and order change.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+from campsites_map import load_catalog, CATALOG_PATH
+
+EARTH_RADIUS_MILES = 3958.8
+# Campgrounds closer than this to San Francisco don't calibrate their own factors: city streets
+# and bridges over a few miles say little about the roads from another origin
+CALIBRATION_MIN_MILES = 20
+# Plausible road miles per straight-line mile
+CIRCUITY_RANGE = (1.0, 2.0)
+
+@dataclass(frozen=True)
+class Origin:
+    """A named starting point."""
+    name: str
+    latitude: float
+    longitude: float
+
+ORIGINS = {
+    'san_francisco': Origin('San Francisco', 37.7749, -122.4194),
+    'oakland': Origin('Oakland', 37.8044, -122.2712),
+    'san_jose': Origin('San Jose', 37.3382, -121.8863)
+}
+# The origin the catalog's miles were measured from
+DEFAULT_ORIGIN = 'san_francisco'
+
+def haversine_miles(latitude, longitude, latitudes, longitudes):
+    """Great-circle miles from one point (or an array of points) to arrays of points, in degrees."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (latitude, longitude, latitudes, longitudes))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+class DistanceEngine:
+    """Road distance estimates from every origin to every campground."""
+
+    def __init__(self, catalog, origins=None):
+        self.origins = dict(origins or ORIGINS)
+        campsites = catalog.campsites
+        self.campground_ids = [campsite.campground_id for campsite in campsites]
+        catalog_miles = np.array([campsite.miles for campsite in campsites], dtype=float)
+        has_coordinates = np.array([campsite.latitude is not None and campsite.longitude is not None for campsite in campsites])
+        latitudes = np.array([campsite.latitude if campsite.latitude is not None else np.nan for campsite in campsites])
+        longitudes = np.array([campsite.longitude if campsite.longitude is not None else np.nan for campsite in campsites])
+
+        names = list(self.origins)
+        origin_latitudes = np.array([self.origins[name].latitude for name in names])[:, None]
+        origin_longitudes = np.array([self.origins[name].longitude for name in names])[:, None]
+        # origins x campgrounds, straight-line miles
+        straight = haversine_miles(origin_latitudes, origin_longitudes, latitudes[None, :], longitudes[None, :])
+
+        calibration = ORIGINS[DEFAULT_ORIGIN]
+        from_calibration = haversine_miles(calibration.latitude, calibration.longitude, latitudes, longitudes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            circuity = catalog_miles / from_calibration
+        # Campgrounds near the calibration origin get the typical factor
+        usable = has_coordinates & (from_calibration >= CALIBRATION_MIN_MILES) & np.isfinite(circuity)
+        typical_circuity = float(np.median(circuity[usable])) if usable.any() else 1.3
+        circuity = np.clip(np.where(usable, circuity, typical_circuity), *CIRCUITY_RANGE)
+
+        road = straight * circuity[None, :]
+        self.miles = np.where(has_coordinates[None, :], road, catalog_miles[None, :])
+        # The calibration origin reproduces the catalog exactly (no rounding drift)
+        if DEFAULT_ORIGIN in self.origins:
+            self.miles[names.index(DEFAULT_ORIGIN)] = catalog_miles
+        self.row = {name: i for i, name in enumerate(names)}
+        self._lookups = {}
+
+    def origin(self, name):
+        if name not in self.row:
+            raise ValueError(f"Unknown origin {name!r} (known: {', '.join(self.row)})")
+        return self.origins[name]
+
+    def miles_lookup(self, origin=DEFAULT_ORIGIN):
+        """{campground_id: whole road miles} from an origin, cached per origin."""
+        lookup = self._lookups.get(origin)
+        if lookup is None:
+            self.origin(origin)
+            lookup = dict(zip(self.campground_ids, np.rint(self.miles[self.row[origin]]).astype(int).tolist()))
+            self._lookups[origin] = lookup
+        return lookup
+
+@lru_cache(maxsize=None)
+def get_distance_engine(path=CATALOG_PATH):
+    """The distance engine for the catalog at `path` (built once per path)."""
+    return DistanceEngine(load_catalog(path))
@@ -0,0 +1,231 @@
+"""
+Server-Sent Events push of availability changes.
+
+serve_local.py hands each /api/events connection to an EventHub once the response headers
+are sent. The hub owns every connection on one thread with a selector, so hundreds of idle
+clients cost a socket and a small queue each, not a thread. When a new results.json is indexed,
+the changed (facility, site, date) entries are broadcast as one event:
+
+    event: changes
+    id: <results version>
+    data: {"version": "...", "last_updated_pst": "...", "added_count": 3, "removed_count": 1,
+           "added": {facility_id: {site: [dates]}}, "removed": {...},
+           "facilities": {facility_id: {"name": ..., "area": ..., "url": ..., "miles": ...}}}
+
+Each client has a bounded queue. A client that falls too far behind (or a change too large to
+push) gets a "reload" event instead, telling it to fetch the results again, and so does a
+client reconnecting with a Last-Event-ID from an older version.
+"""
+
+import json
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from results_index import diff_indexes
+
+MAX_CLIENTS = 1000
+# Events queued per client before it is considered too slow and told to reload
+CLIENT_QUEUE_EVENTS = 32
+# Changes larger than this are announced with a reload event rather than pushed
+MAX_PUSHED_ENTRIES = 5000
+# Comment lines sent to idle connections so proxies don't time them out
+HEARTBEAT_SECONDS = 25
+# Client reconnect delay suggested to browsers
+RETRY_MILLISECONDS = 5000
+
+def format_event(event, data, event_id=None):
+    """Encode one SSE event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    payload = json.dumps(data, separators=(',', ':'))
+    lines.extend(f"data: {line}" for line in payload.splitlines())
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+def version_id(version):
+    """SSE event id for a results version ((mtime_ns, size) of results.json)."""
+    return f"{version[0]:x}-{version[1]:x}" if version else None
+
+def change_event(previous, current):
+    """
+    The event for a results change, from the store's previous and new (version, index) states:
+    the changed entries, or a reload event when there's no previous index or too much changed.
+    """
+    version, index = current
+    event_id = version_id(version)
+    header = {'version': event_id, 'last_updated_pst': index.header.get('last_updated_pst')}
+    if previous is None:
+        return format_event('reload', header, event_id)
+    added, removed = diff_indexes(previous[1], index)
+    added_count = sum(len(dates) for sites in added.values() for dates in sites.values())
+    removed_count = sum(len(dates) for sites in removed.values() for dates in sites.values())
+    if added_count + removed_count > MAX_PUSHED_ENTRIES:
+        return format_event('reload', dict(header, added_count=added_count, removed_count=removed_count), event_id)
+    facilities = {facility_id: index.by_id[facility_id].details() for facility_id in added}
+    return format_event('changes', dict(header, added_count=added_count, removed_count=removed_count,
+                                        added=added, removed=removed, facilities=facilities), event_id)
+
+class EventClient:
+    """One connected client: its socket, the event being written and the events queued behind it."""
+    __slots__ = ('sock', 'buffer', 'queue', 'overflowed', 'last_write')
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+        self.queue = deque()
+        self.overflowed = False
+        self.last_write = time.monotonic()
+
+class EventHub:
+    """All SSE connections, served from a single selector thread."""
+
+    def __init__(self, max_clients=MAX_CLIENTS, queue_size=CLIENT_QUEUE_EVENTS, heartbeat=HEARTBEAT_SECONDS):
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.selector = selectors.DefaultSelector()
+        self.clients = {}  # socket -> EventClient, only touched by the hub thread
+        self.client_count = 0
+        self.pending = deque()  # (action, argument) handed over by other threads
+        self.lock = threading.Lock()
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+        self.selector.register(self.wake_reader, selectors.EVENT_READ)
+        self.thread = threading.Thread(target=self.run, name='events', daemon=True)
+        self.thread.start()
+
+    def _wake(self):
+        try:
+            self.wake_writer.send(b'\0')
+        except BlockingIOError:
+            pass  # Already woken
+
+    def reserve(self):
+        """Claim a client slot; False when the hub is full."""
+        with self.lock:
+            if self.client_count >= self.max_clients:
+                return False
+            self.client_count += 1
+            return True
+
+    def release(self):
+        """Give back a reserved slot that never got a connection (the response failed before add)."""
+        with self.lock:
+            self.client_count -= 1
+
+    def add(self, sock, initial=b''):
+        """Take over a connection (whose slot was reserved) after its response headers were sent."""
+        with self.lock:
+            self.pending.append(('add', (sock, initial)))
+        self._wake()
+
+    def broadcast(self, event):
+        """Queue an encoded event for every connected client (thread-safe)."""
+        with self.lock:
+            self.pending.append(('event', event))
+        self._wake()
+
+    def run(self):
+        while True:
+            for key, mask in self.selector.select(timeout=self.heartbeat / 5):
+                if key.fileobj is self.wake_reader:
+                    try:
+                        while self.wake_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                client = self.clients.get(key.fileobj)
+                if client is None:
+                    continue
+                if mask & selectors.EVENT_READ and not self._read(client):
+                    continue
+                if mask & selectors.EVENT_WRITE:
+                    self._flush(client)
+            self._take_pending()
+            self._send_heartbeats()
+
+    def _take_pending(self):
+        with self.lock:
+            pending, self.pending = self.pending, deque()
+        for action, argument in pending:
+            if action == 'add':
+                sock, initial = argument
+                sock.setblocking(False)
+                client = self.clients[sock] = EventClient(sock)
+                self.selector.register(sock, selectors.EVENT_READ)
+                if initial:
+                    self._enqueue(client, initial)
+            else:
+                for client in list(self.clients.values()):
+                    self._enqueue(client, argument)
+
+    def _enqueue(self, client, event):
+        if client.overflowed:
+            return  # Already told to reload; nothing queued after that matters
+        if len(client.queue) >= self.queue_size:
+            # Too slow to keep up: drop its backlog and have it fetch the results again
+            client.queue.clear()
+            client.queue.append(format_event('reload', {'reason': 'client fell behind'}))
+            client.overflowed = True
+        else:
+            client.queue.append(event)
+        self._flush(client)
+
+    def _read(self, client):
+        """Clients never send anything after the request; readable means closed. False if dropped."""
+        try:
+            if client.sock.recv(4096):
+                return True
+        except BlockingIOError:
+            return True
+        except OSError:
+            pass
+        self._drop(client)
+        return False
+
+    def _flush(self, client):
+        try:
+            while client.buffer or client.queue:
+                if not client.buffer:
+                    client.buffer = bytearray(client.queue.popleft())
+                sent = client.sock.send(client.buffer)
+                del client.buffer[:sent]
+                client.last_write = time.monotonic()
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._drop(client)
+            return
+        if client.overflowed and not client.buffer and not client.queue:
+            # The reload event is out; the client reconnects after reloading
+            self._drop(client)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.buffer or client.queue else 0)
+        if self.selector.get_key(client.sock).events != events:
+            self.selector.modify(client.sock, events)
+
+    def _send_heartbeats(self):
+        cutoff = time.monotonic() - self.heartbeat
+        for client in list(self.clients.values()):
+            if client.last_write < cutoff and not client.buffer and not client.queue:
+                client.queue.append(b': ping\n\n')
+                self._flush(client)
+
+    def _drop(self, client):
+        if self.clients.pop(client.sock, None) is None:
+            return
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            client.sock.close()
+        except OSError:
+            pass
+        with self.lock:
+            self.client_count -= 1
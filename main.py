@@ -1,20 +1,30 @@
 import datetime
-import signal
 import json
 import sys
 import os
 import argparse
+from dataclasses import dataclass, field
+from typing import Optional
 from dateutil.relativedelta import relativedelta
 from dateutil import tz
-from camply.search import SearchReserveCalifornia, SearchRecreationDotGov
-from camply.containers import SearchWindow
-from campsites_map import get_rec_to_campsites_map, get_recreation_gov_campsites
-
-class TimeoutError(Exception):
-    pass
-
-def timeout_handler(signum, frame):
-    raise TimeoutError("Search operation timed out")
+from campsites_map import load_catalog
+from search_engine import SearchJob, run_search_jobs
+from window_planner import candidate_stays, plan_stay_jobs, count_provider_calls, count_monthly_calls
+from stay_profiles import NightBitmap, NightBitmapBuilder, get_profiles, DEFAULT_PROFILES, STAY_PROFILES
+from deadlines import RunBudget
+from results_delta import unsearched_checkins
+from run_changes import record_run_changes
+from results_format import write_result_variants, write_results_stream, iter_result_rows
+from result_records import ResultSet, UNKNOWN_MILES
+from distances import get_distance_engine, ORIGINS, DEFAULT_ORIGIN
+from site_filters import SiteFilter, load_site_rules, SITE_FILTERS_PATH
+from checkpoints import CheckpointStore, checkpoint_key, file_digest, DEFAULT_CHECKPOINT_DIR
+from rate_limit import configure_rate_limit
+from response_cache import configure_response_cache, get_response_cache, DEFAULT_CACHE_PATH
+from metrics import get_metrics, record_response_cache_stats, DEFAULT_METRICS_DIR
+from profiling import ProfileSession, write_profile_summary, DEFAULT_PROFILE_DIR
+from availability_history import DEFAULT_HISTORY_PATH
+from watch_alerts import DEFAULT_WATCHES_PATH, DEFAULT_OUTBOX_DIR
 
 def generate_monthly_search_windows(start_date, end_date, weekends_only=False):
     """
@@ -60,53 +70,19 @@ def generate_monthly_search_windows(start_date, end_date, weekends_only=False):
     
     return search_windows
 
-def search_with_timeout(searcher, timeout_seconds=60):
+def filter_campsites(results, provider=None):
     """
-    Run the search with a timeout to prevent hanging.
+    Filter out hike-in sites, accessible sites, day use sites, walk-in sites, and Kirby Cove day use site
+    (the rules in site_filters.json).
     """
-    # Set up timeout handler
-    old_handler = signal.signal(signal.SIGALRM, timeout_handler)
-    signal.alarm(timeout_seconds)
-    
-    try:
-        results = searcher.get_matching_campsites()
-        signal.alarm(0)  # Cancel the alarm
-        return results
-    except TimeoutError:
-        print(f"Search timed out after {timeout_seconds} seconds")
-        return []
-    except Exception as e:
-        signal.alarm(0)  # Cancel the alarm
-        raise e
-    finally:
-        signal.signal(signal.SIGALRM, old_handler)
-
-def build_campground_miles_lookup(camp_data):
-    """
-    Build a lookup dictionary for campground_id -> miles mapping.
-    """
-    lookup = {}
-    for rec_area_id in camp_data.keys():
-        for campground in camp_data.get(rec_area_id):
-            lookup[campground.campground_id] = campground.miles
-    return lookup
-
-def build_campground_url_lookup(camp_data):
-    """
-    Build a lookup dictionary for campground_id -> url mapping.
-    """
-    lookup = {}
-    for rec_area_id in camp_data.keys():
-        for campground in camp_data.get(rec_area_id):
-            lookup[campground.campground_id] = campground.url
-    return lookup
+    return SiteFilter(load_site_rules()).filter(results, provider)
 
 def get_campsite_miles(site, miles_lookup):
     """
     Get the miles from the lookup dictionary for a given site.
     """
     facility_id_str = str(site.facility_id)
-    return miles_lookup.get(facility_id_str, 999)
+    return miles_lookup.get(facility_id_str, UNKNOWN_MILES)
 
 def get_campsite_url(site, url_lookup):
     """
@@ -116,6 +92,14 @@ def get_campsite_url(site, url_lookup):
     facility_id_str = str(site.facility_id)
     return url_lookup.get(facility_id_str, site.booking_url)
 
+def as_result_set(results, miles_lookup, url_lookup):
+    """
+    The results as a ResultSet (converting a list of camply results if needed).
+    """
+    if isinstance(results, ResultSet):
+        return results
+    return ResultSet(miles_lookup, url_lookup, results or [])
+
 def results_to_json(results, miles_lookup, url_lookup):
     """
     Convert search results to JSON format.
@@ -123,26 +107,11 @@ def results_to_json(results, miles_lookup, url_lookup):
     if not results:
         return []
     
-    # Sort results by miles (distance) first
-    results.sort(key=lambda site: get_campsite_miles(site, miles_lookup))
-    
-    json_results = []
-    for site in results:
-        miles = get_campsite_miles(site, miles_lookup)
-        booking_url = get_campsite_url(site, url_lookup)
-        json_results.append({
-            'facility_id': str(site.facility_id),
-            'facility_name': site.facility_name,
-            'recreation_area': site.recreation_area,
-            'campsite_site_name': site.campsite_site_name,
-            'booking_date': site.booking_date.strftime('%Y-%m-%d'),
-            'booking_url': booking_url,
-            'miles': miles
-        })
-    
-    return json_results
+    # Sorted by miles (distance) first, then date, facility and site so batches
+    # can be merged in a single streaming pass (see results_format.merge_key)
+    return list(as_result_set(results, miles_lookup, url_lookup).iter_rows())
 
-def display_results(results, miles_lookup):
+def display_results(results, miles_lookup, url_lookup=None):
     """
     Display the search results in a formatted way.
     """
@@ -150,114 +119,129 @@ def display_results(results, miles_lookup):
         print("No results to display.")
         return
 
-    # Sort results by miles (distance) first
-    results.sort(key=lambda site: get_campsite_miles(site, miles_lookup))
-    
-    # Group results by facility_id to show all available dates
-    facility_groups = {}
-    for site in results:
-        facility_id = str(site.facility_id)
-        if facility_id not in facility_groups:
-            facility_groups[facility_id] = {
-                'site_info': site,
-                'dates': []
-            }
-        facility_groups[facility_id]['dates'].append(site.booking_date)
-    
-    print(f"\n=== FOUND {len(results)} AVAILABLE CAMPSITES (sorted by miles) ===")
-    for facility_id, group in facility_groups.items():
-        site = group['site_info']
-        dates = group['dates']
-        miles = get_campsite_miles(site, miles_lookup)
-        
+    # Results grouped by facility (nearest first) with all available dates
+    result_set = as_result_set(results, miles_lookup, url_lookup or {})
+    print(f"\n=== FOUND {len(result_set)} AVAILABLE CAMPSITES (sorted by miles) ===")
+    for _, facility_name, recreation_area, booking_url, miles, dates in result_set.facility_dates():
         # Format dates as a list
-        date_list = [date.strftime('%Y-%m-%d') for date in sorted(set(dates))]
-        dates_str = ', '.join(date_list)
+        dates_str = ', '.join(date.strftime('%Y-%m-%d') for date in dates)
         
-        print(f"{site.recreation_area}, {site.facility_name} URL: {site.booking_url} (Miles: {miles}) (Dates: {dates_str})")
+        print(f"{recreation_area}, {facility_name} URL: {booking_url} (Miles: {miles}) (Dates: {dates_str})")
 
-def save_results_to_json(results, miles_lookup, url_lookup, search_criteria, batch_name="default", append=False, search_status="success", error_message=None):
+def build_results_data(results, miles_lookup, url_lookup, search_criteria, batch_name="default", search_status="success", error_message=None, existing_results=None,
+                       unsearched=None):
     """
-    Save search results to results.json in the root folder.
-    search_status: "success" (search completed normally), "partial" (some errors but got results), "error" (failed)
+    Build the results.json payload for a batch of search results.
+    The 'results' entry is a sized, re-iterable view producing rows on demand
+    (a list when existing_results, already-converted rows from an earlier batch, are prepended).
+    unsearched (partial searches only) lists the check-in ranges that were not searched.
     """
-    json_results = results_to_json(results, miles_lookup, url_lookup)
-    
+    json_results = as_result_set(results, miles_lookup, url_lookup).rows()
+    if existing_results:
+        json_results = existing_results + list(json_results)
+
     # Get current time in Pacific Time
     pacific_tz = tz.gettz('US/Pacific')
     pacific_time = datetime.datetime.now(pacific_tz)
-    
+
+    data = {
+        "last_updated": pacific_time.isoformat(),
+        "last_updated_pst": pacific_time.strftime('%Y-%m-%d %I:%M %p %Z'),
+        "total_results": len(json_results),
+        "search_criteria": search_criteria,
+        "batch_name": batch_name,
+        "batch_results": len(results),
+        "search_status": search_status,
+        "error_message": error_message,
+        "results": json_results
+    }
+    if unsearched:
+        data["unsearched"] = unsearched
+    return data
+
+def write_results_data(data, path='results.json', trailer=None):
+    """
+    Stream a results payload (see build_results_data) to `path`, one row per line.
+    trailer() returns fields written after the rows (see write_results_stream).
+    """
+    header = {key: value for key, value in data.items() if key != 'results'}
+    with get_metrics().timer('write_results', file=os.path.basename(path)):
+        return write_results_stream(path, header, data['results'], trailer)
+
+def metrics_trailer():
+    """Trailer fields with the run's metrics, taken once all rows are written."""
+    return {'metrics': get_metrics().snapshot()}
+
+def save_results_to_json(results, miles_lookup, url_lookup, search_criteria, batch_name="default", append=False, search_status="success", error_message=None, write_variants=True,
+                         unsearched=None):
+    """
+    Save search results to results.json in the root folder.
+    search_status: "success" (search completed normally), "partial" (some errors but got results), "error" (failed)
+    write_variants: also write results_compact.json and .gz/.br precompressed copies
+    unsearched: the check-in ranges a partial search did not cover (see results_delta.unsearched_checkins)
+    """
+    existing_results = None
     if append and os.path.exists('results.json'):
         # Load existing results and append
-        with open('results.json', 'r') as f:
-            existing_data = json.load(f)
-
-        # Combine results
-        combined_results = existing_data.get('results', []) + json_results
-        total_results = len(combined_results)
-
-        # Update with latest batch info
-        output_data = {
-            "last_updated": pacific_time.isoformat(),
-            "last_updated_pst": pacific_time.strftime('%Y-%m-%d %I:%M %p %Z'),
-            "total_results": total_results,
-            "search_criteria": search_criteria,
-            "batch_name": batch_name,
-            "batch_results": len(results),
-            "search_status": search_status,
-            "error_message": error_message,
-            "results": combined_results
-        }
-    else:
-        # Create new results file
-        output_data = {
-            "last_updated": pacific_time.isoformat(),
-            "last_updated_pst": pacific_time.strftime('%Y-%m-%d %I:%M %p %Z'),
-            "total_results": len(results),
-            "search_criteria": search_criteria,
-            "batch_name": batch_name,
-            "batch_results": len(results),
-            "search_status": search_status,
-            "error_message": error_message,
-            "results": json_results
-        }
+        existing_results = list(iter_result_rows('results.json'))
+
+    output_data = build_results_data(results, miles_lookup, url_lookup, search_criteria, batch_name,
+                                     search_status, error_message, existing_results, unsearched)
     
-    with open('results.json', 'w') as f:
-        json.dump(output_data, f, indent=2)
+    write_results_data(output_data, trailer=metrics_trailer)
     
-    print(f"Results saved to results.json ({len(results)} campsites from {batch_name}) - {pacific_time.strftime('%Y-%m-%d %I:%M %p %Z')}")
+    print(f"Results saved to results.json ({len(results)} campsites from {batch_name}) - {output_data['last_updated_pst']}")
 
-def main():
+    if write_variants:
+        with get_metrics().timer('write_variants'):
+            write_result_variants(output_data)
+    return output_data
+
+@dataclass
+class SearchOutcome:
+    """Everything a finished search produced, for saving or for in-process callers like run_batches."""
+    provider: str
+    batch_name: str
+    results: object  # ResultSet
+    miles_lookup: dict
+    url_lookup: dict
+    search_criteria: dict
+    search_status: str = "success"
+    error_message: Optional[str] = None
+    profile_results: dict = field(default_factory=dict)  # Stay profile name -> ResultSet of derived stays
+    night_bitmap: Optional[NightBitmap] = None
+    unsearched: Optional[list] = None  # Check-in ranges a partial search did not cover
+
+    def to_results_data(self):
+        """The results.json payload for this search."""
+        return build_results_data(self.results, self.miles_lookup, self.url_lookup, self.search_criteria,
+                                  self.batch_name, self.search_status, self.error_message, unsearched=self.unsearched)
+
+def run_search(provider='reserve_california', start_date=None, end_date=None, batch_name='default',
+               max_in_flight=3, time_budget=1500, window_timeout=60, planner='stays', profiles=None,
+               site_filters_path=SITE_FILTERS_PATH, resume=False, checkpoint_dir=DEFAULT_CHECKPOINT_DIR,
+               origin=DEFAULT_ORIGIN):
     """
-    Main function to run the campsite search and save results.
+    Run the campsite search for one provider and date range and return a SearchOutcome.
+    Never raises for search failures: errors are reported through search_status/error_message
+    with whatever results were found before the failure.
+    planner='stays' searches only the nights of candidate stays (see window_planner);
+    planner='monthly' searches whole calendar months.
+    Single available nights are fetched once into a NightBitmap and every stay profile in
+    `profiles` (names from stay_profiles.STAY_PROFILES) is derived from it; the first one
+    is the search's main results.
+    Fetched sites are filtered with the rules in site_filters_path.
+    Every finished window is checkpointed to checkpoint_dir (None disables checkpoints); with
+    resume=True, windows with a recent successful checkpoint are loaded instead of searched.
+    Distances, and so the order of the results, are from `origin` (see distances.ORIGINS).
     """
-    # Parse command line arguments
-    parser = argparse.ArgumentParser(description='Search for campsite availability')
-    parser.add_argument('--start-date', type=str, help='Start date in YYYY-MM-DD format')
-    parser.add_argument('--end-date', type=str, help='End date in YYYY-MM-DD format')
-    parser.add_argument('--batch-name', type=str, default='default', help='Name for this batch (for logging)')
-    parser.add_argument('--provider', type=str, default='reserve_california', 
-                       choices=['reserve_california', 'recreation_gov'],
-                       help='Reservation system provider')
-    
-    args = parser.parse_args()
-    
-    print(f"Starting campsite search (Batch: {args.batch_name}, Provider: {args.provider})...")
-    
-    # Load campground data based on provider
-    if args.provider == 'reserve_california':
-        camp_data = get_rec_to_campsites_map()
-    else:  # recreation_gov
-        camp_data = {'recreation_gov': get_recreation_gov_campsites()}
-    
-    # Build efficient lookup dictionaries once
-    miles_lookup = build_campground_miles_lookup(camp_data)
-    url_lookup = build_campground_url_lookup(camp_data)
+    # Load the campground catalog (cached, with prebuilt lookup indexes)
+    catalog = load_catalog()
+    miles_lookup = get_distance_engine().miles_lookup(origin)
+    url_lookup = catalog.url_lookup
 
-    # Search parameters - use command line args or defaults
-    if args.start_date and args.end_date:
-        start_date = datetime.datetime.strptime(args.start_date, '%Y-%m-%d').date()
-        end_date = datetime.datetime.strptime(args.end_date, '%Y-%m-%d').date()
+    # Search parameters - use provided dates or defaults
+    if start_date and end_date:
         print(f"Using provided dates: {start_date} to {end_date}")
     else:
         # Default behavior for backward compatibility
@@ -265,136 +249,332 @@ def main():
         end_date = start_date + relativedelta(months=6)
         print(f"Using default dates: {start_date} to {end_date}")
     
-    consecutive_nights = 2  # Look for 2 consecutive nights
-    weekends_only = True    # Only search for weekend availability (Friday-Saturday)
+    # Stay profiles to derive; the first one is the main result (default: 2 nights, Friday-Saturday)
+    stay_profiles = get_profiles(profiles or DEFAULT_PROFILES)
+    primary_profile = stay_profiles[0]
+    consecutive_nights = primary_profile.nights
+    weekends_only = primary_profile.name == 'weekend'
 
     search_criteria = {
         "start_date": start_date.isoformat(),
         "end_date": end_date.isoformat(),
         "consecutive_nights": consecutive_nights,
-        "weekends_only": weekends_only
+        "weekends_only": weekends_only,
+        "stay_profile": primary_profile.name,
+        "origin": origin
     }
 
     print(f"Searching for {consecutive_nights} consecutive nights from {start_date} to {end_date}")
     if weekends_only:
         print("Weekends only: Friday-Saturday")
 
-    # Collect all campground IDs
-    campground_ids = []
-    for rec_area_id in camp_data.keys():
-        for campground in camp_data.get(rec_area_id):
-            campground_ids.append(campground.campground_id)
+    # Campground IDs for this provider
+    campground_ids = catalog.campground_ids(provider)
 
-    # Generate monthly search windows - pass weekends_only parameter
+    # Plan the search windows
     monthly_windows = generate_monthly_search_windows(start_date, end_date, weekends_only)
-    print(f"Searching {len(monthly_windows)} monthly windows...")
+    if planner == 'monthly':
+        jobs = [SearchJob(provider, window_start, window_end, campground_ids, index=i)
+                for i, (window_start, window_end) in enumerate(monthly_windows, 1)
+                if window_start != window_end]
+        print(f"Searching {len(jobs)} monthly windows...")
+    else:
+        # Every night any requested profile could use, fetched once
+        stays = [stay for profile in stay_profiles
+                 for stay in candidate_stays(start_date, end_date, profile.nights, profile.checkin_weekdays)]
+        planned = plan_stay_jobs(stays, provider)
+        jobs = [SearchJob(provider, job.start, job.end, campground_ids, index=i, windows=job.windows)
+                for i, job in enumerate(planned, 1)]
+        planned_calls = count_provider_calls(planned) * len(campground_ids)
+        # Searching whole months used to take one crawl per stay profile
+        monthly_calls = sum(count_monthly_calls(generate_monthly_search_windows(start_date, end_date, profile.name == 'weekend'),
+                                                profile.name == 'weekend')
+                            for profile in stay_profiles) * len(campground_ids)
+        print(f"Searching {len(jobs)} windows covering {sum(len(job.windows) for job in planned)} stay spans...")
+        print(f"Planned provider calls: {planned_calls} (monthly windows: {monthly_calls}, "
+              f"saved {monthly_calls - planned_calls})")
+    search_criteria["planner"] = planner
 
-    all_results = []
+    outcome = SearchOutcome(provider, batch_name, ResultSet(miles_lookup, url_lookup), miles_lookup, url_lookup, search_criteria)
+    nights_found = 0  # Available site-nights fetched so far
     errors_encountered = []  # Track any errors during search
+    searched_jobs = set()  # Indexes of the jobs whose windows were fetched (or resumed) without errors
+    # Fetched nights are folded into the bitmap builder as each window finishes
+    nights = NightBitmapBuilder(start_date, end_date)
+
+    def derive_profiles():
+        """Build the night bitmap from the windows fetched so far and derive every stay profile."""
+        with get_metrics().timer('derive_profiles', provider=provider, batch=batch_name):
+            outcome.night_bitmap = nights.build()
+            for profile in stay_profiles:
+                outcome.profile_results[profile.name] = ResultSet(miles_lookup, url_lookup, outcome.night_bitmap.iter_stays(profile))
+                print(f"Stay profile {profile.name}: {len(outcome.profile_results[profile.name])} available stays")
+        outcome.results = outcome.profile_results[primary_profile.name]
+        get_metrics().set('results', len(outcome.results), provider=provider, batch=batch_name)
+
+    # Site exclusion rules, with per-rule hit counts for this search
+    site_filter = SiteFilter(load_site_rules(site_filters_path))
+    metrics = get_metrics()
+
+    def filter_results(results):
+        metrics.inc('site_nights_fetched', len(results), provider=provider, batch=batch_name)
+        with metrics.timer('filter', provider=provider, batch=batch_name):
+            return site_filter.filter(results, provider)
+
+    # Per-window checkpoints; the key covers everything that shapes a window's (filtered) results
+    checkpoints = CheckpointStore(checkpoint_dir) if checkpoint_dir else None
+    checkpoint_context = {'nights': 1, 'weekends_only': False, 'site_filters': file_digest(site_filters_path)}
+    checkpoint_keys = {job.index: checkpoint_key(job, checkpoint_context) for job in jobs}
+    jobs_to_run = jobs
+    if checkpoints is not None:
+        checkpoints.prune()
+        if resume:
+            jobs_to_run = []
+            for job in jobs:
+                restored = checkpoints.load(checkpoint_keys[job.index])
+                if restored is None:
+                    jobs_to_run.append(job)
+                    continue
+                nights.add(restored)
+                nights_found += len(restored)
+                searched_jobs.add(job.index)
+                print(f"Resumed window {job.index}/{len(jobs)} ({job.label}) from checkpoint: {len(restored)} site-nights")
+            print(f"Resuming: {len(jobs) - len(jobs_to_run)} windows from checkpoints, {len(jobs_to_run)} to search")
+
+    # Whole-run time budget, split into per-window deadlines
+    budget = RunBudget(total_seconds=time_budget, window_seconds=window_timeout)
 
     try:
-        for i, (window_start, window_end) in enumerate(monthly_windows, 1):
-            if window_start == window_end:
-                continue
+        # Search all windows concurrently for single available nights
+        with metrics.timer('search', provider=provider, batch=batch_name):
+            for window in run_search_jobs(jobs_to_run, 1, False,
+                                          result_filter=filter_results,
+                                          max_in_flight=max_in_flight,
+                                          budget=budget):
+                job = window.job
+                metrics.record_window(provider, batch_name, job.label, window.seconds, window.attempts,
+                                      len(window.results), window.error)
+                print(f"Finished window {job.index}/{len(jobs)}: {job.window_start.strftime('%Y-%m-%d')} -> {job.window_end.strftime('%Y-%m-%d')}")
 
-            print(f"Searching month {i}/{len(monthly_windows)}: {window_start.strftime('%Y-%m-%d')} -> {window_end.strftime('%Y-%m-%d')}")
-            
-            # Create search window for this month
-            search_window = SearchWindow(start_date=window_start, end_date=window_end)
-            
-            # Create searcher based on provider
-            if args.provider == 'reserve_california':
-                searcher = SearchReserveCalifornia(
-                    search_window=search_window,
-                    recreation_area=[],  # We're using specific campgrounds instead
-                    campgrounds=campground_ids,
-                    nights=consecutive_nights,  # Number of consecutive nights
-                    weekends_only=weekends_only  # Only search weekends
-                )
-            else:  # recreation_gov
-                searcher = SearchRecreationDotGov(
-                    search_window=search_window,
-                    campgrounds=campground_ids,
-                    nights=consecutive_nights,  # Number of consecutive nights
-                    weekends_only=weekends_only  # Only search weekends
-                )
-            
-            # Use timeout wrapper to prevent hanging (1 minute per month)
-            try:
-                month_results = search_with_timeout(searcher, timeout_seconds=60)
-                # Filter out hike-in sites, accessible sites, day use sites, walk-in sites, and Kirby Cove day use site
-                month_results = [result for result in month_results 
-                               if "Hike" not in result.campsite_site_name 
-                               and "Accessible" not in result.campsite_site_name
-                               and "ADA" not in result.campsite_site_name
-                               and "day" not in result.campsite_site_name.lower()
-                               and "walk" not in result.campsite_site_name.lower()
-                               and ("4241" not in result.booking_url or str(result.facility_id) != "232491")]  # Exclude Kirby Cove day use site but keep other Kirby Cove sites
-            except Exception as e:
-                print(f"  Error during search for {window_start.strftime('%Y-%m')}: {e}")
-                print(f"  Error type: {type(e).__name__}")
-                errors_encountered.append(f"{window_start.strftime('%Y-%m')}: {type(e).__name__} - {str(e)}")
-                month_results = []
-            
-            if month_results:
-                all_results.extend(month_results)
-                print(f"  Found {len(month_results)} sites for {window_start.strftime('%Y-%m')}")
-                print(f"  Total results so far: {len(all_results)}")
-            else:
-                print(f"  No sites found for {window_start.strftime('%Y-%m')}")
+                if window.error is not None:
+                    e = window.error
+                    print(f"  Error during search for {job.label}: {e}")
+                    print(f"  Error type: {type(e).__name__}")
+                    errors_encountered.append(f"{job.label}: {type(e).__name__} - {str(e)}")
+                else:
+                    searched_jobs.add(job.index)
+                    if window.attempts > 1:
+                        print(f"  Succeeded after {window.attempts} attempts")
+                if checkpoints is not None:
+                    checkpoints.save(checkpoint_keys[job.index], job, window.results, window.error, window.attempts)
+
+                month_results = window.results
+                if month_results:
+                    nights.add(month_results)
+                    nights_found += len(month_results)
+                    print(f"  Found {len(month_results)} available site-nights for {job.label}")
+                    print(f"  Total results so far: {nights_found}")
+                else:
+                    print(f"  No sites found for {job.label}")
+
+        print(site_filter.summary())
+        for rule_name, count in site_filter.hits.items():
+            metrics.set('site_filter_hits', count, provider=provider, batch=batch_name, rule=rule_name)
+
+        # Derive every stay profile from the fetched nights
+        derive_profiles()
         
         # Determine search status
         if errors_encountered:
-            if all_results:
-                search_status = "partial"
-                error_msg = f"Some searches failed: {'; '.join(errors_encountered)}"
+            if outcome.results:
+                outcome.search_status = "partial"
+                outcome.error_message = f"Some searches failed: {'; '.join(errors_encountered)}"
             else:
-                search_status = "error"
-                error_msg = f"All searches failed: {'; '.join(errors_encountered)}"
+                outcome.search_status = "error"
+                outcome.error_message = f"All searches failed: {'; '.join(errors_encountered)}"
         else:
-            search_status = "success"
-            error_msg = None
-
-        # Save results to JSON
-        save_results_to_json(all_results, miles_lookup, url_lookup, search_criteria, args.batch_name, append=False, search_status=search_status, error_message=error_msg)
-
-        # Display results in console
-        if all_results:
-            display_results(all_results, miles_lookup)
-        else:
-            print("No campsites found matching criteria.")
+            outcome.search_status = "success"
+            outcome.error_message = None
             
     except TimeoutError as e:
         print(f"Search timed out: {e}")
-        error_msg = f"Search timed out: {e}"
-        if all_results:
-            print(f"\nPartial results found before timeout ({len(all_results)} sites):")
-            save_results_to_json(all_results, miles_lookup, url_lookup, search_criteria, args.batch_name, append=False, search_status="partial", error_message=error_msg)
-            display_results(all_results, miles_lookup)
-        else:
-            save_results_to_json([], miles_lookup, url_lookup, search_criteria, args.batch_name, append=False, search_status="error", error_message=error_msg)
+        outcome.error_message = f"Search timed out: {e}"
+        derive_profiles()
+        outcome.search_status = "partial" if outcome.results else "error"
     except ConnectionError as e:
         print(f"Network connection error: {e}")
-        error_msg = f"Network connection error: {e}"
-        if all_results:
-            print(f"\nPartial results found before connection error ({len(all_results)} sites):")
-            save_results_to_json(all_results, miles_lookup, url_lookup, search_criteria, args.batch_name, append=False, search_status="partial", error_message=error_msg)
-            display_results(all_results, miles_lookup)
-        else:
-            save_results_to_json([], miles_lookup, url_lookup, search_criteria, args.batch_name, append=False, search_status="error", error_message=error_msg)
+        outcome.error_message = f"Network connection error: {e}"
+        derive_profiles()
+        outcome.search_status = "partial" if outcome.results else "error"
     except Exception as e:
         print(f"Unexpected error during search: {e}")
         print(f"Error type: {type(e).__name__}")
-        error_msg = f"{type(e).__name__}: {e}"
+        outcome.error_message = f"{type(e).__name__}: {e}"
+        derive_profiles()
+        outcome.search_status = "partial" if outcome.results else "error"
 
-        if all_results:
-            print(f"\nPartial results found before error ({len(all_results)} sites):")
-            save_results_to_json(all_results, miles_lookup, url_lookup, search_criteria, args.batch_name, append=False, search_status="partial", error_message=error_msg)
-            display_results(all_results, miles_lookup)
-        else:
-            # No results at all - create empty results file with error status
-            print("No results found, creating empty results file with error status...")
-            save_results_to_json([], miles_lookup, url_lookup, search_criteria, args.batch_name, append=False, search_status="error", error_message=error_msg)
+    # What a partial search missed, so its delta and history leave those dates alone
+    if outcome.search_status == "partial":
+        outcome.unsearched = unsearched_checkins([(job.campground_ids, start, end) for job in jobs if job.index not in searched_jobs
+                                                  for start, end in job.search_windows], primary_profile.nights)
+    return outcome
+
+def main():
+    """
+    Main function to run the campsite search and save results.
+    """
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Search for campsite availability')
+    parser.add_argument('--start-date', type=str, help='Start date in YYYY-MM-DD format')
+    parser.add_argument('--end-date', type=str, help='End date in YYYY-MM-DD format')
+    parser.add_argument('--batch-name', type=str, default='default', help='Name for this batch (for logging)')
+    parser.add_argument('--provider', type=str, default='reserve_california', 
+                       choices=['reserve_california', 'recreation_gov'],
+                       help='Reservation system provider')
+    parser.add_argument('--max-in-flight', type=int, default=3,
+                       help='Maximum number of search windows searched concurrently')
+    parser.add_argument('--time-budget', type=float, default=1500,
+                       help='Time budget in seconds for the whole search; unfinished windows are abandoned')
+    parser.add_argument('--window-timeout', type=float, default=60,
+                       help='Maximum time in seconds for a single search window')
+    parser.add_argument('--planner', type=str, default='stays', choices=['stays', 'monthly'],
+                       help='Search only the nights of candidate stays, or whole calendar months')
+    parser.add_argument('--requests-per-second', type=float,
+                       help='Starting request rate for the provider (adapts to 429/5xx responses)')
+    parser.add_argument('--cache-path', type=str, default=DEFAULT_CACHE_PATH,
+                       help='SQLite file for the provider response cache')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the provider response cache')
+    parser.add_argument('--profiles', type=str, default=','.join(DEFAULT_PROFILES),
+                       help=f"Comma-separated stay profiles to derive from one fetch ({', '.join(STAY_PROFILES)}); "
+                            "the first is saved to results.json, the others to results_<profile>.json")
+    parser.add_argument('--origins', type=str, default=DEFAULT_ORIGIN,
+                       help=f"Comma-separated origins to measure distances from ({', '.join(ORIGINS)}); "
+                            "the first orders results.json, the others get results_from_<origin>.json")
+    parser.add_argument('--site-filters', type=str, default=SITE_FILTERS_PATH,
+                       help='JSON file with the site include/exclude rules')
+    parser.add_argument('--resume', action='store_true',
+                       help='Reuse recent checkpoints and only search windows that failed or are missing')
+    parser.add_argument('--checkpoint-dir', type=str, default=DEFAULT_CHECKPOINT_DIR,
+                       help='Directory for per-window search checkpoints')
+    parser.add_argument('--bitmap-path', type=str,
+                       help='Where to save the night availability bitmap '
+                            '(default: .cache/night_bitmap_<provider>_<batch>.npz)')
+    parser.add_argument('--metrics-dir', type=str, default=DEFAULT_METRICS_DIR,
+                       help='Directory for the run metrics (Prometheus textfile and runs.jsonl history); '
+                            'empty to disable')
+    parser.add_argument('--history-path', type=str, default=DEFAULT_HISTORY_PATH,
+                       help='SQLite availability history fed after standalone runs (see availability_history.py); '
+                            'empty to disable')
+    parser.add_argument('--watches-path', type=str, default=DEFAULT_WATCHES_PATH,
+                       help='Watch store matched against new availability after standalone runs (see watch_alerts.py); '
+                            'empty to disable')
+    parser.add_argument('--outbox', type=str, default=DEFAULT_OUTBOX_DIR,
+                       help='Spool directory for watch matches')
+    parser.add_argument('--profile', action='store_true',
+                       help='Profile the run (cProfile, tracemalloc and a window timeline) into --profile-dir')
+    parser.add_argument('--profile-dir', type=str, default=DEFAULT_PROFILE_DIR,
+                       help='Directory for --profile output')
+    
+    args = parser.parse_args()
+    
+    print(f"Starting campsite search (Batch: {args.batch_name}, Provider: {args.provider})...")
+    # Name of this run's metrics and profile; run_batches subprocesses are <provider>_<batch>
+    run_name = 'main' if args.batch_name == 'default' else f"{args.provider}_{args.batch_name}"
+    profile = ProfileSession(run_name).start() if args.profile else None
+
+    if args.requests_per_second:
+        configure_rate_limit(args.provider, rate=args.requests_per_second)
+    configure_response_cache(None if args.no_cache else args.cache_path)
+
+    origins = [name.strip() for name in args.origins.split(',') if name.strip()] or [DEFAULT_ORIGIN]
+    unknown_origins = [name for name in origins if name not in ORIGINS]
+    if unknown_origins:
+        parser.error(f"Unknown origin(s): {', '.join(unknown_origins)} (known: {', '.join(ORIGINS)})")
+
+    start_date = end_date = None
+    if args.start_date and args.end_date:
+        start_date = datetime.datetime.strptime(args.start_date, '%Y-%m-%d').date()
+        end_date = datetime.datetime.strptime(args.end_date, '%Y-%m-%d').date()
+
+    outcome = run_search(args.provider, start_date, end_date, args.batch_name,
+                         max_in_flight=args.max_in_flight,
+                         time_budget=args.time_budget,
+                         window_timeout=args.window_timeout,
+                         planner=args.planner,
+                         profiles=[name.strip() for name in args.profiles.split(',') if name.strip()],
+                         site_filters_path=args.site_filters,
+                         resume=args.resume,
+                         checkpoint_dir=args.checkpoint_dir,
+                         origin=origins[0])
+
+    # Save results to JSON
+    if outcome.search_status == "error" and not outcome.results:
+        print("No results found, creating empty results file with error status...")
+    output_data = save_results_to_json(outcome.results, outcome.miles_lookup, outcome.url_lookup, outcome.search_criteria,
+                                       outcome.batch_name, append=False, search_status=outcome.search_status,
+                                       error_message=outcome.error_message,
+                                       write_variants=args.batch_name == 'default', unsearched=outcome.unsearched)
+
+    # Standalone runs produce the final results.json, so record what changed since the last run
+    # (batch runs leave this to run_batches after merging)
+    if args.batch_name == 'default':
+        record_run_changes(lambda: output_data['results'], outcome.search_status, outcome.search_criteria['start_date'],
+                           outcome.search_criteria['end_date'], 'main', outcome.unsearched, args.watches_path, args.outbox,
+                           args.history_path)
+
+    # A complete standalone run leaves nothing to resume
+    if args.batch_name == 'default' and outcome.search_status == 'success' and args.checkpoint_dir:
+        CheckpointStore(args.checkpoint_dir).clear()
+
+    # Other stay profiles derived from the same fetch
+    for profile_name, stays in outcome.profile_results.items():
+        if profile_name == outcome.search_criteria['stay_profile']:
+            continue
+        profile_path = f"results_{profile_name}.json" if args.batch_name == 'default' else f"results_{profile_name}_{args.batch_name}.json"
+        profile_criteria = dict(outcome.search_criteria, stay_profile=profile_name,
+                                consecutive_nights=STAY_PROFILES[profile_name].nights)
+        write_results_data(build_results_data(stays, outcome.miles_lookup, outcome.url_lookup, profile_criteria,
+                                              outcome.batch_name, outcome.search_status, outcome.error_message),
+                           profile_path)
+        print(f"Stay profile {profile_name} saved to {profile_path} ({len(stays)} stays)")
+
+    # The same results measured from other origins: no extra fetching, just other distances and order
+    if args.batch_name == 'default':
+        for origin in origins[1:]:
+            miles_lookup = get_distance_engine().miles_lookup(origin)
+            origin_path = f"results_from_{origin}.json"
+            write_results_data(build_results_data(outcome.results.with_distances(miles_lookup), miles_lookup, outcome.url_lookup,
+                                                  dict(outcome.search_criteria, origin=origin), outcome.batch_name,
+                                                  outcome.search_status, outcome.error_message),
+                               origin_path)
+            print(f"Results from {ORIGINS[origin].name} saved to {origin_path}")
+
+    # Keep the fetched nights so more profiles can be derived later without searching again
+    if outcome.night_bitmap is not None:
+        bitmap_path = args.bitmap_path or os.path.join('.cache', f"night_bitmap_{args.provider}_{args.batch_name}.npz")
+        os.makedirs(os.path.dirname(bitmap_path) or '.', exist_ok=True)
+        outcome.night_bitmap.save(bitmap_path)
+        print(f"Night availability bitmap saved to {bitmap_path}")
+
+    # Display results in console
+    if outcome.results:
+        print(f"Distances from {ORIGINS[origins[0]].name}")
+        display_results(outcome.results, outcome.miles_lookup, outcome.url_lookup)
+    else:
+        print("No campsites found matching criteria.")
+
+    if get_response_cache() is not None:
+        print(get_response_cache().summary())
+
+    if profile is not None:
+        profile.finish(args.profile_dir)
+        # Batch subprocesses leave the run summary to run_batches
+        if args.batch_name == 'default':
+            write_profile_summary(args.profile_dir, [run_name])
+
+    if args.metrics_dir:
+        record_response_cache_stats()
+        get_metrics().export(args.metrics_dir, run_name, search_status=outcome.search_status)
 
 if __name__ == "__main__":
     main()
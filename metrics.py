@@ -0,0 +1,224 @@
+"""
+Run metrics: per-stage timers and counters, exported with every run.
+
+Code anywhere in a run records into the process-wide RunMetrics (get_metrics()):
+
+    metrics = get_metrics()
+    with metrics.timer('search', provider='recreation_gov', batch='batch1'):
+        ...
+    metrics.inc('http_bytes', len(response.content), provider='recreation_gov')
+
+A run's metrics are exported three ways:
+- a "metrics" section at the end of results.json (snapshot()),
+- a Prometheus textfile (for node_exporter's textfile collector), rewritten every run,
+- one line per run appended to a JSON-lines history file.
+"""
+
+import contextlib
+import datetime
+import json
+import os
+import threading
+import time
+
+DEFAULT_METRICS_DIR = os.path.join('.cache', 'metrics')
+METRICS_HISTORY_FILE = 'runs.jsonl'
+PROMETHEUS_PREFIX = 'yayarea'
+
+# What each metric measures, for the Prometheus HELP lines
+METRIC_HELP = {
+    'search': 'Time spent searching a provider for one batch',
+    'window': 'Time spent on one search window, including retries',
+    'filter': 'Time spent applying the site filter rules',
+    'derive_profiles': 'Time spent building the night bitmap and deriving stay profiles',
+    'http_request': 'Time spent on provider HTTP requests sent over the network',
+    'write_results': 'Time spent serializing a results file',
+    'write_variants': 'Time spent writing the compact and precompressed results files',
+    'merge': 'Time spent merging batch results',
+    'delta': 'Time spent computing results_delta.json',
+    'history': 'Time spent recording the run in the availability history',
+    'watches': 'Time spent matching new availability against watches',
+    'reduce': 'Time spent folding sharded crawl results into stay profiles',
+    'http_requests': 'Provider HTTP requests sent over the network, by status code',
+    'http_bytes': 'Response body bytes received from providers',
+    'http_throttle_retries': 'Provider requests retried after a throttling response',
+    'window_retries': 'Search windows retried after a transient error',
+    'window_errors': 'Search windows that failed',
+    'site_nights_fetched': 'Available site-nights returned by searches, before filtering',
+    'site_filter_hits': 'Results matched by each site filter rule',
+    'results': 'Available stays found',
+    'response_cache': 'Provider response cache lookups and stores, by outcome',
+    'work_items': 'Sharded crawl work items handled by a worker, by outcome'
+}
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+class RunMetrics:
+    """Thread-safe counters and timers for one run, plus a record per search window."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {}  # (name, labels) -> value
+        self.timers = {}    # (name, labels) -> [count, total seconds, max seconds]
+        self.windows = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set a counter to a total kept elsewhere (e.g. the response cache's own stats)."""
+        with self.lock:
+            self.counters[(name, _label_key(labels))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            timer = self.timers.get(key)
+            if timer is None:
+                self.timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Time the block (also when it raises) into the named timer."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def record_window(self, provider, batch, label, seconds, attempts=1, results=0, error=None):
+        """A finished search window: its timer, retries, errors and an entry in the window list."""
+        self.observe('window', seconds, provider=provider, batch=batch)
+        if attempts > 1:
+            self.inc('window_retries', attempts - 1, provider=provider, batch=batch)
+        if error is not None:
+            self.inc('window_errors', provider=provider, batch=batch)
+        with self.lock:
+            self.windows.append({
+                'provider': provider,
+                'batch': batch,
+                'window': label,
+                'seconds': round(seconds, 3),
+                'attempts': attempts,
+                'results': results,
+                'error': f"{type(error).__name__}: {error}" if error is not None else None
+            })
+
+    def snapshot(self):
+        """Everything recorded so far, as JSON-ready data."""
+        with self.lock:
+            counters = [dict(name=name, labels=dict(labels), value=value)
+                        for (name, labels), value in sorted(self.counters.items())]
+            timers = [dict(name=name, labels=dict(labels), count=count, seconds=round(total, 4), max_seconds=round(longest, 4))
+                      for (name, labels), (count, total, longest) in sorted(self.timers.items())]
+            windows = list(self.windows)
+        return {
+            'started_at': datetime.datetime.fromtimestamp(self.started_at, datetime.timezone.utc).isoformat(timespec='seconds'),
+            'elapsed_seconds': round(time.time() - self.started_at, 3),
+            'timers': timers,
+            'counters': counters,
+            'windows': windows
+        }
+
+    def to_prometheus(self, run_labels=None):
+        """Prometheus text exposition format; run_labels (e.g. the run name) are added to every sample."""
+        run_labels = run_labels or {}
+
+        def series(name, labels):
+            merged = dict(run_labels, **dict(labels))
+            if not merged:
+                return name
+            rendered = ','.join(f'{key}="{_escape(value)}"' for key, value in sorted(merged.items()))
+            return f"{name}{{{rendered}}}"
+
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+
+        described = set()
+        for (name, labels), value in counters:
+            metric = f"{PROMETHEUS_PREFIX}_{name}_total"
+            if metric not in described:
+                described.add(metric)
+                lines.append(f"# HELP {metric} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{series(metric, labels)} {value}")
+
+        for (name, labels), (count, total, longest) in timers:
+            metric = f"{PROMETHEUS_PREFIX}_{name}_seconds"
+            if metric not in described:
+                described.add(metric)
+                lines.append(f"# HELP {metric} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} summary")
+            lines.append(f"{series(metric + '_sum', labels)} {total:.6f}")
+            lines.append(f"{series(metric + '_count', labels)} {count}")
+        for (name, labels), (count, total, longest) in timers:
+            metric = f"{PROMETHEUS_PREFIX}_{name}_seconds_max"
+            if metric not in described:
+                described.add(metric)
+                lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{series(metric, labels)} {longest:.6f}")
+
+        metric = f"{PROMETHEUS_PREFIX}_run_duration_seconds"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{series(metric, ())} {time.time() - self.started_at:.3f}")
+        metric = f"{PROMETHEUS_PREFIX}_run_finished_timestamp_seconds"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{series(metric, ())} {time.time():.0f}")
+        return '\n'.join(lines) + '\n'
+
+    def export(self, directory=DEFAULT_METRICS_DIR, run_name='run', **fields):
+        """
+        Write <directory>/yayarea_<run_name>.prom (atomically, for the textfile collector) and
+        append this run to <directory>/runs.jsonl with any extra fields (e.g. search status).
+        Returns the two paths.
+        """
+        os.makedirs(directory, exist_ok=True)
+        prom_path = os.path.join(directory, f"{PROMETHEUS_PREFIX}_{run_name}.prom")
+        tmp_path = f"{prom_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus({'run': run_name}))
+        os.replace(tmp_path, prom_path)
+
+        history_path = os.path.join(directory, METRICS_HISTORY_FILE)
+        record = dict(run=run_name, **fields)
+        record.update(self.snapshot())
+        with open(history_path, 'a') as f:
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+        print(f"📈 Metrics saved to {prom_path} and {history_path}")
+        return prom_path, history_path
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+_metrics = RunMetrics()
+
+def get_metrics():
+    """The process-wide metrics for the current run."""
+    return _metrics
+
+def reset_metrics():
+    """Start a new run's metrics (e.g. between runs of a long-lived process)."""
+    global _metrics
+    _metrics = RunMetrics()
+    return _metrics
+
+def record_response_cache_stats(metrics=None):
+    """Copy the provider response cache's lookup/store counts into the run metrics."""
+    from response_cache import get_response_cache
+    cache = get_response_cache()
+    if cache is None:
+        return
+    metrics = metrics or get_metrics()
+    for outcome, count in cache.stats.items():
+        if count:
+            metrics.set('response_cache', count, outcome=outcome)
@@ -0,0 +1,228 @@
+"""
+Profiling mode (--profile) for main.py and run_batches.py.
+
+Each provider batch (or other run stage) is profiled as a ProfileSession:
+- cProfile of the stage's own thread and of every search window it runs on worker threads
+  (run_search_jobs runs windows in the submitting context, so they find the active session),
+- a wall-clock timeline of the windows: when each started and finished, on which thread,
+- tracemalloc's peak and the top allocation sites when the stage ends.
+
+A session saves to the profile directory:
+    <name>.pstats          merged cProfile stats (python -m pstats, snakeviz, ...)
+    <name>_timeline.json   the window timeline
+    <name>_summary.txt     wall time, timeline, top functions and top allocations
+and write_profile_summary() collects the sessions of a run into summary.txt.
+"""
+
+import contextlib
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+DEFAULT_PROFILE_DIR = os.path.join('.cache', 'profile')
+PROFILE_SUMMARY_FILE = 'summary.txt'
+# Functions listed in the summary, by cumulative and by own time
+TOP_FUNCTIONS = 25
+TOP_OWN_TIME = 15
+TOP_ALLOCATIONS = 10
+# Stack depth kept per allocation (deeper is slower and uses more memory)
+TRACEMALLOC_FRAMES = 5
+
+_current_session = contextvars.ContextVar('profile_session', default=None)
+
+# Sessions using tracemalloc; tracing stops when the last one (that started it) finishes
+_tracing_lock = threading.Lock()
+_tracing_sessions = 0
+_tracing_started_here = False
+
+def _start_tracing():
+    global _tracing_sessions, _tracing_started_here
+    with _tracing_lock:
+        if _tracing_sessions == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _tracing_started_here = True
+        _tracing_sessions += 1
+
+def _stop_tracing():
+    global _tracing_sessions, _tracing_started_here
+    with _tracing_lock:
+        _tracing_sessions -= 1
+        if _tracing_sessions == 0 and _tracing_started_here:
+            tracemalloc.stop()
+            _tracing_started_here = False
+
+def _enabled_profile():
+    """
+    A cProfile.Profile enabled for the calling thread, or None if another profiler is active
+    (e.g. a debugger, or Python 3.12+, where only one profiler can run per process).
+    """
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return None
+    return profile
+
+def _format_bytes(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+class ProfileSession:
+    """Profile of one stage of a run (e.g. rc_batch1), across the threads it uses."""
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.profiles = []
+        self.timeline = []
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.memory = None
+        self.profile = None
+        self.token = None
+
+    def start(self):
+        """Begin profiling the calling thread and make this the session for windows it runs."""
+        _start_tracing()
+        self.token = _current_session.set(self)
+        self.profile = _enabled_profile()
+        return self
+
+    @contextlib.contextmanager
+    def window(self, label):
+        """Profile a search window on the current (worker) thread and add it to the timeline."""
+        profile = _enabled_profile()
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            finished = time.perf_counter()
+            if profile is not None:
+                profile.disable()
+            with self.lock:
+                if profile is not None:
+                    self.profiles.append(profile)
+                self.timeline.append({
+                    'window': label,
+                    'thread': threading.current_thread().name,
+                    'start': round(started - self.started, 3),
+                    'end': round(finished - self.started, 3),
+                    'failed': failed
+                })
+
+    def finish(self, directory=DEFAULT_PROFILE_DIR):
+        """Stop profiling, record memory use and save the session; returns the summary path."""
+        if self.profile is not None:
+            self.profile.disable()
+            self.profiles.insert(0, self.profile)
+        self.seconds = time.perf_counter() - self.started
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')
+            ])
+            self.memory = {
+                'current': current,
+                'peak': peak,
+                'top': [str(stat) for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]]
+            }
+        _current_session.reset(self.token)
+        _stop_tracing()
+        return self.save(directory)
+
+    def stats(self):
+        """Merged pstats.Stats of every profiled thread, or None if nothing could be profiled."""
+        with self.lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return None
+        return pstats.Stats(*profiles, stream=io.StringIO())
+
+    def summary(self, stats=None):
+        lines = [f"=== {self.name} ===",
+                 f"Wall time: {self.seconds:.2f}s, {len(self.timeline)} windows on "
+                 f"{len({entry['thread'] for entry in self.timeline})} threads"]
+
+        if self.timeline:
+            lines.append("")
+            lines.append("Window timeline (seconds from start):")
+            for entry in sorted(self.timeline, key=lambda entry: entry['start']):
+                lines.append(f"  {entry['start']:8.2f} -> {entry['end']:8.2f}  ({entry['end'] - entry['start']:6.2f}s)  "
+                             f"{entry['thread']:<12} {entry['window']}{'  FAILED' if entry['failed'] else ''}")
+
+        if stats is not None:
+            for sort, title, limit in (('cumulative', 'cumulative', TOP_FUNCTIONS), ('tottime', 'own', TOP_OWN_TIME)):
+                stream = io.StringIO()
+                stats.stream = stream
+                stats.sort_stats(sort).print_stats(limit)
+                lines.append("")
+                lines.append(f"Top functions by {title} time:")
+                lines.extend(line for line in stream.getvalue().splitlines() if line.strip())
+        else:
+            lines.append("")
+            lines.append("No cProfile data (another profiler was active)")
+
+        if self.memory is not None:
+            lines.append("")
+            lines.append(f"Memory (process-wide, traced since profiling started): peak {_format_bytes(self.memory['peak'])}, "
+                         f"at end {_format_bytes(self.memory['current'])}")
+            lines.append("Top allocations at end:")
+            lines.extend(f"  {line}" for line in self.memory['top'])
+        return '\n'.join(lines) + '\n'
+
+    def save(self, directory=DEFAULT_PROFILE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        stats = self.stats()
+        if stats is not None:
+            stats.dump_stats(os.path.join(directory, f"{self.name}.pstats"))
+        with open(os.path.join(directory, f"{self.name}_timeline.json"), 'w') as f:
+            json.dump({'name': self.name, 'started_at': self.started_at, 'seconds': round(self.seconds, 3),
+                       'windows': sorted(self.timeline, key=lambda entry: entry['start'])}, f)
+        summary_path = os.path.join(directory, f"{self.name}_summary.txt")
+        with open(summary_path, 'w') as f:
+            f.write(self.summary(stats))
+        print(f"🔬 Profile of {self.name} saved to {summary_path} ({self.seconds:.1f}s)")
+        return summary_path
+
+@contextlib.contextmanager
+def profile_session(name, directory=DEFAULT_PROFILE_DIR):
+    """Profile the with block as one session and save it to `directory`."""
+    session = ProfileSession(name).start()
+    try:
+        yield session
+    finally:
+        session.finish(directory)
+
+def profile_window(label):
+    """Profile a search window under the active session, if there is one (a no-op otherwise)."""
+    session = _current_session.get()
+    return session.window(label) if session is not None else contextlib.nullcontext()
+
+def write_profile_summary(directory, names):
+    """
+    Collect the summaries of the named sessions (saved by this process or by batch
+    subprocesses) into <directory>/summary.txt. Returns its path.
+    """
+    parts = []
+    for name in names:
+        path = os.path.join(directory, f"{name}_summary.txt")
+        if os.path.exists(path):
+            with open(path) as f:
+                parts.append(f.read())
+    summary_path = os.path.join(directory, PROFILE_SUMMARY_FILE)
+    with open(summary_path, 'w') as f:
+        f.write('\n'.join(parts))
+    print(f"🔬 Profile summary saved to {summary_path} ({len(parts)} sessions)")
+    return summary_path
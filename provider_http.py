@@ -0,0 +1,172 @@
+"""
+HTTP hooks for the sessions camply's providers use to talk to
+ReserveCalifornia and Recreation.gov.
+Every provider session gets a ProviderAdapter, which caps each request's timeout
+by the deadline of the window being searched, serves responses from the on-disk response
+cache when possible, waits on the provider's shared rate limiter, and backs off and retries
+when the provider throttles us.
+
+camply sends Recreation.gov availability requests from a classmethod with the module-level
+requests.request, bypassing the provider's session, so the wrapped Recreation.gov provider
+replaces those methods to send through an adapter-mounted session as well.
+"""
+
+import random
+import threading
+import time
+import requests
+import tenacity
+from requests.adapters import HTTPAdapter
+from camply.config import STANDARD_HEADERS, RecreationBookingConfig
+from fake_useragent import UserAgent
+from deadlines import current_deadline, DeadlineExceeded, DEFAULT_REQUEST_TIMEOUT
+from metrics import get_metrics
+from rate_limit import get_rate_limiter, parse_retry_after
+from response_cache import get_response_cache
+
+# Retries for throttled (429/5xx) responses before handing the response back to camply
+MAX_THROTTLE_RETRIES = 3
+# Keep-alive connections kept per host, shared by every search against a provider
+POOL_MAXSIZE = 16
+# Attempts at a Recreation.gov month fetch answered with an error, and the longest wait between them
+# (camply's own retry keeps going for up to 100 minutes, far past any window deadline)
+RECDOTGOV_MONTH_ATTEMPTS = 3
+RECDOTGOV_RETRY_MAX_WAIT = 10
+
+class ProviderAdapter(HTTPAdapter):
+    """Transport adapter applied to every request made by a provider session."""
+
+    def __init__(self, provider, request_timeout=DEFAULT_REQUEST_TIMEOUT, max_throttle_retries=MAX_THROTTLE_RETRIES, **kwargs):
+        self.provider = provider
+        self.request_timeout = request_timeout
+        self.max_throttle_retries = max_throttle_retries
+        super().__init__(**kwargs)
+
+    @property
+    def rate_limiter(self):
+        return get_rate_limiter(self.provider)
+
+    def send(self, request, **kwargs):
+        cache = get_response_cache()
+        if cache is None:
+            return self._send_throttled(request, **kwargs)
+        return cache.send(self.provider, request, lambda request: self._send_throttled(request, **kwargs))
+
+    def _send_throttled(self, request, **kwargs):
+        deadline = current_deadline()
+        requested_timeout = kwargs.get('timeout')
+        metrics = get_metrics()
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(deadline)
+            kwargs['timeout'] = deadline.request_timeout(requested_timeout, self.request_timeout)
+            with metrics.timer('http_request', provider=self.provider):
+                response = super().send(request, **kwargs)
+                # Reads the body now (camply reads it next anyway), so the timer covers the download
+                metrics.inc('http_bytes', len(response.content), provider=self.provider)
+            metrics.inc('http_requests', provider=self.provider, status=response.status_code)
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            delay = self.rate_limiter.record_response(response.status_code, retry_after)
+            if delay is None or attempt >= self.max_throttle_retries:
+                return response
+
+            # Exponential backoff with jitter, but never less than what Retry-After asked for
+            backoff = max(delay, (2 ** attempt) * (0.5 + random.random()))
+            if backoff >= deadline.remaining():
+                return response
+            response.close()
+            metrics.inc('http_throttle_retries', provider=self.provider)
+            time.sleep(backoff)
+            attempt += 1
+
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+def get_provider_adapter(provider):
+    """
+    Get the process-wide ProviderAdapter for a provider.
+    Sharing one adapter shares its connection pool, so every searcher reuses warm
+    keep-alive connections instead of opening new ones.
+    """
+    with _adapters_lock:
+        if provider not in _adapters:
+            _adapters[provider] = ProviderAdapter(provider, pool_maxsize=POOL_MAXSIZE)
+        return _adapters[provider]
+
+def mount_provider_adapter(session, provider):
+    """
+    Mount the provider's shared ProviderAdapter for all http(s) traffic on a requests session.
+    """
+    adapter = get_provider_adapter(provider)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return adapter
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_provider_session(provider):
+    """
+    Get the process-wide requests session for a provider, with its ProviderAdapter mounted,
+    for requests camply makes without a provider instance's session.
+    """
+    with _sessions_lock:
+        if provider not in _sessions:
+            session = requests.Session()
+            mount_provider_adapter(session, provider)
+            _sessions[provider] = session
+        return _sessions[provider]
+
+def _stop_month_retries(retry_state):
+    return retry_state.attempt_number >= RECDOTGOV_MONTH_ATTEMPTS or current_deadline().expired
+
+_month_retry_backoff = tenacity.wait_random_exponential(multiplier=1, max=RECDOTGOV_RETRY_MAX_WAIT)
+
+def _wait_month_retry(retry_state):
+    # Never sleep past the window's deadline
+    return min(_month_retry_backoff(retry_state), current_deadline().remaining())
+
+def recdotgov_request_methods(provider):
+    """
+    Replacements for camply's Recreation.gov request methods:
+    - make_recdotgov_request sends camply's request over the provider's session (see get_provider_session)
+      instead of requests.request,
+    - _make_recdotgov_availability_request retries a month answered with an error a few times
+      within the window's deadline, and never retries a DeadlineExceeded.
+    """
+    def make_recdotgov_request(cls, url, method='GET', params=None, **kwargs):
+        headers = STANDARD_HEADERS.copy()
+        headers.update({'User-Agent': UserAgent(browsers=['chrome']).random})
+        headers.update(RecreationBookingConfig.API_REFERRERS)
+        return get_provider_session(provider).request(method=method, url=url, headers=headers, params=params,
+                                                      timeout=DEFAULT_REQUEST_TIMEOUT, **kwargs)
+
+    @tenacity.retry(wait=_wait_month_retry, stop=_stop_month_retries,
+                    retry=tenacity.retry_if_not_exception_type(DeadlineExceeded), reraise=True)
+    def _make_recdotgov_availability_request(self, campground_id, month):
+        response = self.make_recdotgov_availability_request(campground_id, month)
+        if not response.ok:
+            raise ConnectionError(f"Bad Data Returned from the RecreationDotGov API: {response.text}")
+        return response
+
+    return {'make_recdotgov_request': classmethod(make_recdotgov_request),
+            '_make_recdotgov_availability_request': _make_recdotgov_availability_request}
+
+def with_provider_adapter(search_class, provider):
+    """
+    Subclass a camply search class so the provider it creates has a ProviderAdapter
+    mounted on its session before any request is made (including those in the searcher's constructor),
+    and Recreation.gov's session-less requests go through the adapter too.
+    """
+    base_provider = search_class.provider_class
+
+    def __init__(self, *args, **kwargs):
+        base_provider.__init__(self, *args, **kwargs)
+        mount_provider_adapter(self.session, provider)
+
+    methods = {'__init__': __init__, '__module__': __name__}
+    if hasattr(base_provider, 'make_recdotgov_request'):
+        methods.update(recdotgov_request_methods(provider))
+    provider_class = type(base_provider.__name__, (base_provider,), methods)
+    return type(search_class.__name__, (search_class,), {'provider_class': provider_class, '__module__': __name__})
@@ -0,0 +1,155 @@
+"""
+Adaptive per-provider rate limiting.
+Every request to a provider takes a token from that provider's bucket. The refill rate
+creeps up while requests succeed and is cut when the provider answers 429/5xx,
+and a Retry-After header pauses the whole provider until the time it asks for.
+"""
+
+import datetime
+import email.utils
+import threading
+import time
+
+# Status codes that mean the provider wants us to slow down
+THROTTLE_STATUS_CODES = {429, 502, 503, 504}
+
+# Starting rate (requests per second), burst size and ceiling for each provider
+DEFAULT_RATE_LIMITS = {
+    'reserve_california': {'rate': 1.0, 'burst': 2, 'max_rate': 4.0},
+    'recreation_gov': {'rate': 2.0, 'burst': 4, 'max_rate': 8.0}
+}
+FALLBACK_RATE_LIMIT = {'rate': 1.0, 'burst': 2, 'max_rate': 4.0}
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """
+        Take a token if one is available.
+        Returns 0 on success, otherwise the number of seconds until a token will be available.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header (delay in seconds or an HTTP date) into seconds from now.
+    Returns None if the header is missing or unparseable.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+class AdaptiveRateLimiter:
+    """
+    Rate limiter shared by every search against one provider.
+    Additive increase on success, multiplicative decrease on throttling responses.
+    """
+
+    def __init__(self, provider, rate, burst, max_rate, min_rate=0.1, increase_step=0.05, decrease_factor=0.5):
+        self.provider = provider
+        self.bucket = TokenBucket(rate, burst)
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+        self.throttled_count = 0
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def acquire(self, deadline=None):
+        """
+        Block until a request may be sent. Raises DeadlineExceeded (via deadline.check)
+        if the wait would run past the deadline.
+        """
+        while True:
+            wait = max(0.0, self.paused_until - time.monotonic())
+            if wait == 0:
+                wait = self.bucket.try_acquire()
+                if wait == 0:
+                    return
+            if deadline is not None and wait > deadline.remaining():
+                time.sleep(deadline.remaining())
+                deadline.check(f"Waiting for {self.provider} rate limit")
+            time.sleep(wait)
+
+    def record_response(self, status_code, retry_after=None):
+        """
+        Adjust the rate based on a response. Returns the suggested delay before retrying
+        (None when the response was not a throttling response).
+        """
+        if status_code not in THROTTLE_STATUS_CODES:
+            with self.lock:
+                if self.bucket.rate < self.max_rate:
+                    self.bucket.set_rate(min(self.max_rate, self.bucket.rate + self.increase_step))
+            return None
+
+        with self.lock:
+            self.throttled_count += 1
+            self.bucket.set_rate(max(self.min_rate, self.bucket.rate * self.decrease_factor))
+            delay = retry_after if retry_after is not None else 1.0 / self.bucket.rate
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider):
+    """
+    Get the process-wide rate limiter for a provider, creating it on first use.
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            settings = DEFAULT_RATE_LIMITS.get(provider, FALLBACK_RATE_LIMIT)
+            _limiters[provider] = AdaptiveRateLimiter(provider, **settings)
+        return _limiters[provider]
+
+def configure_rate_limit(provider, rate=None, burst=None, max_rate=None):
+    """
+    Override a provider's rate limit settings (takes effect for limiters created afterwards).
+    """
+    settings = dict(DEFAULT_RATE_LIMITS.get(provider, FALLBACK_RATE_LIMIT))
+    if rate is not None:
+        settings['rate'] = rate
+        settings['max_rate'] = max(settings['max_rate'], rate)
+    if burst is not None:
+        settings['burst'] = burst
+    if max_rate is not None:
+        settings['max_rate'] = max_rate
+    DEFAULT_RATE_LIMITS[provider] = settings
+    with _limiters_lock:
+        _limiters.pop(provider, None)
@@ -0,0 +1,329 @@
+"""
+Persistent on-disk cache for provider HTTP responses.
+Availability responses are keyed by (provider, campground_id, month) and expire sooner
+the closer the month is (near-term dates churn from cancellations, far-out ones barely move).
+Stale entries are revalidated with If-None-Match/If-Modified-Since when the provider sent
+an ETag or Last-Modified, and the least recently used entries are evicted past a size cap.
+
+Several threads and processes (run_batches, sharded_crawl workers) share the cache file, so
+hits only note their access time in memory and write them with the next store; the size cap
+is checked against a running total and only measured when that says it is exceeded. Cache
+errors (e.g. "database is locked" under contention) are treated as misses: the request goes
+to the provider instead of failing.
+"""
+
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DEFAULT_CACHE_PATH = os.path.join('.cache', 'provider_responses.sqlite')
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024  # 200 MB
+# Seconds to wait for another writer's lock on the cache file
+BUSY_TIMEOUT = 30
+# Hits whose access time is kept in memory before being written without a store
+ACCESS_FLUSH_EVERY = 100
+
+# (days until the month starts, TTL in seconds); first matching tier wins
+AVAILABILITY_TTL_TIERS = [
+    (14, 5 * 60),        # next two weeks: 5 minutes
+    (31, 15 * 60),       # next month: 15 minutes
+    (92, 30 * 60),       # next three months: 30 minutes
+    (None, 2 * 60 * 60)  # further out: 2 hours
+]
+# Headers that describe the wire encoding rather than the (already decoded) body we store
+UNCACHED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+# Campground/campsite metadata barely changes
+METADATA_TTL = 24 * 60 * 60
+
+RECREATION_GOV_AVAILABILITY = re.compile(r'/availability/campground/(\d+)/month')
+
+def availability_ttl(month, today=None):
+    """
+    TTL in seconds for an availability response covering the month starting at `month`.
+    """
+    today = today or datetime.date.today()
+    days_out = (month - today).days
+    for max_days, ttl in AVAILABILITY_TTL_TIERS:
+        if max_days is None or days_out < max_days:
+            return ttl
+    return AVAILABILITY_TTL_TIERS[-1][1]
+
+def describe_request(provider, request):
+    """
+    Work out the cache key, campground_id and month (or None) for a prepared request.
+    """
+    body = request.body or b''
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha1(request.method.encode() + b' ' + request.url.encode() + b'\n' + body).hexdigest()[:16]
+
+    campground_id = month = None
+    parsed = urlparse(request.url)
+    match = RECREATION_GOV_AVAILABILITY.search(parsed.path)
+    if match:
+        # Recreation.gov: GET .../availability/campground/<id>/month?start_date=YYYY-MM-01T00:00:00.000Z
+        campground_id = match.group(1)
+        start = parse_qs(parsed.query).get('start_date', [''])[0][:10]
+        try:
+            month = datetime.datetime.strptime(start, '%Y-%m-%d').date()
+        except ValueError:
+            month = None
+    elif request.method == 'POST' and body:
+        # ReserveCalifornia (UseDirect): POST .../search/grid with FacilityId and StartDate (MM-DD-YYYY)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = None
+        if isinstance(payload, dict) and 'FacilityId' in payload:
+            campground_id = str(payload['FacilityId'])
+            try:
+                month = datetime.datetime.strptime(payload.get('StartDate', ''), '%m-%d-%Y').date()
+            except ValueError:
+                month = None
+
+    if month is not None:
+        key = f"{provider}:{campground_id}:{month.strftime('%Y-%m')}:{digest}"
+    else:
+        key = f"{provider}:{digest}"
+    return key, campground_id, month
+
+class CachedEntry:
+    """A cached response row."""
+
+    def __init__(self, key, status, headers, body, etag, last_modified, expires_at):
+        self.key = key
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires_at
+
+    def to_response(self, request):
+        """Rebuild a requests.Response from the cached data."""
+        response = requests.Response()
+        response.status_code = self.status
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.from_cache = True
+        return response
+
+class ResponseCache:
+    """SQLite-backed HTTP response cache, safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        # Readers don't wait for writers (and vice versa) in write-ahead logging mode
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT,
+                campground_id TEXT,
+                month TEXT,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL,
+                expires_at REAL,
+                last_access REAL,
+                size INTEGER
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.conn.commit()
+        # Running size of the cached bodies; other processes' stores are only seen when evicting
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.accessed = {}  # key -> access time not yet written
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stores': 0, 'evictions': 0, 'errors': 0}
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Hold the lock, rolling back what a failed statement left open so the file isn't kept locked."""
+        with self.lock:
+            try:
+                yield
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+
+    def get(self, key):
+        """Look up a cached entry (fresh or stale) by key."""
+        with self.transaction():
+            row = self.conn.execute(
+                "SELECT status, headers, body, etag, last_modified, expires_at FROM responses WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            self.accessed[key] = time.time()
+            if len(self.accessed) >= ACCESS_FLUSH_EVERY:
+                self._write_access_times()
+                self.conn.commit()
+        status, headers, body, etag, last_modified, expires_at = row
+        return CachedEntry(key, status, json.loads(headers), body, etag, last_modified, expires_at)
+
+    def _write_access_times(self):
+        """Write the pending access times (caller holds the lock and commits)."""
+        if self.accessed:
+            accessed, self.accessed = self.accessed, {}
+            self.conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                                  [(accessed_at, key) for key, accessed_at in accessed.items()])
+
+    def put(self, key, provider, campground_id, month, response, ttl):
+        """Store a successful response."""
+        body = response.content
+        now = time.time()
+        with self.transaction():
+            self._write_access_times()
+            self.accessed.pop(key, None)
+            previous = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, campground_id, month.isoformat() if month else None,
+                 response.status_code, json.dumps({name: value for name, value in response.headers.items() if name.lower() not in UNCACHED_HEADERS}), body,
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                 now, now + ttl, now, len(body)))
+            self.conn.commit()
+            self.total_bytes += len(body) - (previous[0] if previous else 0)
+            self.stats['stores'] += 1
+            over_cap = self.total_bytes > self.max_bytes
+        if over_cap:
+            self.evict()
+
+    def touch(self, key, ttl):
+        """Extend a revalidated entry's lifetime."""
+        now = time.time()
+        with self.transaction():
+            self.accessed.pop(key, None)
+            self.conn.execute("UPDATE responses SET expires_at = ?, last_access = ? WHERE key = ?", (now + ttl, now, key))
+            self.conn.commit()
+
+    def evict(self):
+        """Drop least recently used entries until the cache is under 90% of max_bytes."""
+        with self.transaction():
+            self._write_access_times()
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            self.total_bytes = total
+            if total <= self.max_bytes:
+                self.conn.commit()
+                return
+            target = self.max_bytes * 0.9
+            for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+                if total <= target:
+                    break
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                self.stats['evictions'] += 1
+            self.conn.commit()
+            self.total_bytes = total
+
+    def record(self, outcome):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def failed(self, action, error):
+        """Note a cache error; the request carries on as a miss. Reported once per cache."""
+        self.record('errors')
+        if self.stats['errors'] == 1:
+            print(f"⚠️ Response cache {action} failed, fetching from the provider: {type(error).__name__}: {error}")
+
+    def summary(self):
+        """One-line hit/miss report."""
+        lookups = self.stats['hits'] + self.stats['misses'] + self.stats['revalidated']
+        hit_rate = (self.stats['hits'] + self.stats['revalidated']) / lookups * 100 if lookups else 0
+        return (f"Response cache: {self.stats['hits']} hits, {self.stats['revalidated']} revalidated, "
+                f"{self.stats['misses']} misses ({hit_rate:.0f}% hit rate), "
+                f"{self.stats['stores']} stored, {self.stats['evictions']} evicted"
+                + (f", {self.stats['errors']} errors" if self.stats['errors'] else ''))
+
+    def send(self, provider, request, send):
+        """
+        Serve `request` from the cache when fresh, otherwise call send(request) and cache the result.
+        Stale entries with validators are revalidated with a conditional request.
+        """
+        key, campground_id, month = describe_request(provider, request)
+        if request.method != 'GET' and month is None:
+            # Only availability searches are cached among non-GET requests
+            return send(request)
+        ttl = availability_ttl(month) if month is not None else METADATA_TTL
+        try:
+            entry = self.get(key)
+        except sqlite3.Error as e:
+            self.failed('lookup', e)
+            entry = None
+        if entry is not None and entry.fresh:
+            self.record('hits')
+            return entry.to_response(request)
+
+        if entry is not None:
+            if entry.etag:
+                request.headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                request.headers['If-Modified-Since'] = entry.last_modified
+
+        response = send(request)
+        if response.status_code == 304 and entry is not None:
+            self.record('revalidated')
+            try:
+                self.touch(key, ttl)
+            except sqlite3.Error as e:
+                self.failed('refresh', e)
+            response.close()
+            return entry.to_response(request)
+
+        self.record('misses')
+        if response.status_code == 200:
+            try:
+                self.put(key, provider, campground_id, month, response, ttl)
+            except sqlite3.Error as e:
+                self.failed('store', e)
+        return response
+
+_cache = None
+_cache_configured = False
+_cache_lock = threading.RLock()
+
+def configure_response_cache(path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Set up the process-wide response cache. Pass path=None to disable caching.
+    """
+    global _cache, _cache_configured
+    with _cache_lock:
+        _cache = ResponseCache(path, max_bytes) if path else None
+        _cache_configured = True
+    return _cache
+
+def get_response_cache():
+    """
+    The process-wide response cache (created at DEFAULT_CACHE_PATH on first use), or None if disabled.
+    """
+    with _cache_lock:
+        if not _cache_configured:
+            configure_response_cache()
+        return _cache
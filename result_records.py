@@ -0,0 +1,119 @@
+"""
+Compact in-memory store for search results.
+
+camply result objects are converted as they arrive into small tuples
+(miles, booking date ordinal, facility_id, campsite_site_name) with interned strings;
+facility names, areas, URLs and distances are kept once per facility. The records are
+sorted once, in results.json order (see results_format.merge_key), and rows are produced
+lazily so results can be written out as a stream.
+"""
+
+import datetime
+import sys
+
+# Distance used for facilities missing from the miles lookup
+UNKNOWN_MILES = 999
+
+class ResultSet:
+    """Interned, sort-once collection of search results for one search."""
+    __slots__ = ('miles_lookup', 'url_lookup', 'facilities', 'site_urls', 'records', '_sorted')
+
+    def __init__(self, miles_lookup, url_lookup, sites=()):
+        self.miles_lookup = miles_lookup
+        self.url_lookup = url_lookup
+        # facility_id -> (facility_name, recreation_area, booking_url or None, miles, first site's booking_url)
+        self.facilities = {}
+        # (facility_id, campsite_site_name) -> booking_url, for facilities without a catalog URL
+        self.site_urls = {}
+        self.records = []
+        self._sorted = True
+        self.extend(sites)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __bool__(self):
+        return bool(self.records)
+
+    def add(self, site):
+        """Add one result (a camply AvailableCampsite or anything with the same attributes)."""
+        facility_id = sys.intern(str(site.facility_id))
+        facility = self.facilities.get(facility_id)
+        if facility is None:
+            facility = (site.facility_name, site.recreation_area, self.url_lookup.get(facility_id),
+                        self.miles_lookup.get(facility_id, UNKNOWN_MILES), site.booking_url)
+            self.facilities[facility_id] = facility
+        site_name = sys.intern(site.campsite_site_name)
+        if facility[2] is None:
+            self.site_urls.setdefault((facility_id, site_name), site.booking_url)
+        self.records.append((facility[3], site.booking_date.toordinal(), facility_id, site_name))
+        self._sorted = False
+
+    def extend(self, sites):
+        for site in sites:
+            self.add(site)
+
+    def with_distances(self, miles_lookup):
+        """The same results with distances (and so order) from another miles lookup, e.g. another origin."""
+        other = ResultSet(miles_lookup, self.url_lookup)
+        other.site_urls = self.site_urls
+        other.facilities = {facility_id: (facility_name, recreation_area, booking_url, miles_lookup.get(facility_id, UNKNOWN_MILES), first_url)
+                            for facility_id, (facility_name, recreation_area, booking_url, _, first_url) in self.facilities.items()}
+        other.records = [(other.facilities[facility_id][3], ordinal, facility_id, site_name)
+                         for _, ordinal, facility_id, site_name in self.records]
+        other._sorted = not other.records
+        return other
+
+    def sort(self):
+        """Sort into results.json order; a no-op when nothing was added since the last sort."""
+        if not self._sorted:
+            self.records.sort()
+            self._sorted = True
+        return self
+
+    def iter_rows(self):
+        """Yield the legacy results.json rows, in order."""
+        self.sort()
+        fromordinal = datetime.date.fromordinal
+        for miles, ordinal, facility_id, site_name in self.records:
+            facility_name, recreation_area, booking_url, _, _ = self.facilities[facility_id]
+            yield {
+                'facility_id': facility_id,
+                'facility_name': facility_name,
+                'recreation_area': recreation_area,
+                'campsite_site_name': site_name,
+                'booking_date': fromordinal(ordinal).isoformat(),
+                'booking_url': booking_url if booking_url is not None else self.site_urls[(facility_id, site_name)],
+                'miles': miles
+            }
+
+    def rows(self):
+        """A re-iterable, sized view of the rows (for results data payloads)."""
+        return ResultRows(self)
+
+    def facility_dates(self):
+        """
+        Yield (facility_id, facility_name, recreation_area, first booking_url, miles, sorted unique dates)
+        per facility, nearest facility first.
+        """
+        self.sort()
+        dates = {}
+        for _, ordinal, facility_id, _ in self.records:
+            dates.setdefault(facility_id, set()).add(ordinal)
+        for facility_id, ordinals in dates.items():
+            facility_name, recreation_area, _, miles, first_url = self.facilities[facility_id]
+            yield (facility_id, facility_name, recreation_area, first_url, miles,
+                   [datetime.date.fromordinal(ordinal) for ordinal in sorted(ordinals)])
+
+class ResultRows:
+    """Sized, re-iterable rows of a ResultSet, already in results.json (merge_key) order."""
+    __slots__ = ('result_set',)
+
+    def __init__(self, result_set):
+        self.result_set = result_set
+
+    def __len__(self):
+        return len(self.result_set)
+
+    def __iter__(self):
+        return self.result_set.iter_rows()
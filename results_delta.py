@@ -0,0 +1,157 @@
+"""
+Incremental change detection between runs.
+A snapshot of the previous run's availability is kept on disk, grouped by facility with a
+digest per facility. Each run only diffs the facilities whose digest changed and writes the
+added/removed (facility, site, date) entries to a compact results_delta.json.
+A partial run passes the check-ins it could not search (see unsearched_checkins); those keep
+their previous state instead of counting as removed.
+"""
+
+import datetime
+import hashlib
+import itertools
+import json
+import os
+from dateutil import tz
+
+DEFAULT_SNAPSHOT_PATH = os.path.join('.cache', 'availability_snapshot.json')
+DEFAULT_DELTA_PATH = 'results_delta.json'
+
+def write_json_atomic(data, path, **dump_kwargs):
+    """
+    Write JSON to a temp file next to `path` and rename it into place,
+    so readers never see a half-written file.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **dump_kwargs)
+    os.replace(tmp_path, path)
+
+def build_snapshot(rows):
+    """
+    Group result rows into {facility_id: {'digest': str, 'sites': {site_name: [dates]}}}.
+    """
+    facilities = {}
+    for row in rows:
+        sites = facilities.setdefault(row['facility_id'], {})
+        sites.setdefault(row['campsite_site_name'], set()).add(row['booking_date'])
+
+    snapshot = {}
+    for facility_id, sites in facilities.items():
+        sites = {site: sorted(dates) for site, dates in sorted(sites.items())}
+        digest = hashlib.sha1(json.dumps(sites, separators=(',', ':')).encode('utf-8')).hexdigest()
+        snapshot[facility_id] = {'digest': digest, 'sites': sites}
+    return snapshot
+
+def load_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    """
+    Load the previous run's snapshot. Returns None if there is none (or it is unreadable).
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_snapshot(facilities, path=DEFAULT_SNAPSHOT_PATH, taken_at=None):
+    """Persist a snapshot (as built by build_snapshot) for the next run."""
+    write_json_atomic({'taken_at': taken_at, 'facilities': facilities}, path, separators=(',', ':'))
+
+def _entries(sites):
+    return {(site, date) for site, dates in sites.items() for date in dates}
+
+def diff_snapshots(previous, current):
+    """
+    Compare two snapshots' facilities and return (added, removed) as
+    {facility_id: {site_name: [dates]}}. Facilities with an unchanged digest are skipped.
+    """
+    added = {}
+    removed = {}
+    for facility_id in previous.keys() | current.keys():
+        before = previous.get(facility_id)
+        after = current.get(facility_id)
+        if before is not None and after is not None and before['digest'] == after['digest']:
+            continue
+
+        before_entries = _entries(before['sites']) if before else set()
+        after_entries = _entries(after['sites']) if after else set()
+        for target, entries in ((added, after_entries - before_entries), (removed, before_entries - after_entries)):
+            if not entries:
+                continue
+            grouped = target.setdefault(facility_id, {})
+            for site, date in sorted(entries):
+                grouped.setdefault(site, []).append(date)
+    return added, removed
+
+def iter_delta_entries(grouped):
+    """Yield (facility_id, site_name, booking_date) from a grouped added/removed section."""
+    for facility_id, sites in grouped.items():
+        for site, dates in sites.items():
+            for date in dates:
+                yield facility_id, site, date
+
+def unsearched_checkins(spans, nights):
+    """
+    The check-ins a search cannot vouch for, from the night spans it failed (or never got) to
+    fetch: [(facility_ids, first_night, end_night)], end exclusive. Any stay of `nights` nights
+    touching a span is unknown, so each becomes [facility_ids, first_checkin, end_checkin]
+    (ISO dates, end exclusive), ready for a results header.
+    """
+    return [[sorted(str(facility_id) for facility_id in facility_ids),
+             (start - datetime.timedelta(days=nights - 1)).isoformat(), end.isoformat()]
+            for facility_ids, start, end in spans]
+
+def searched_filter(unsearched):
+    """
+    A predicate searched(facility_id, booking_date) for the check-ins outside the unsearched
+    ranges (see unsearched_checkins); with none, everything counts as searched.
+    """
+    ranges = {}
+    for facility_ids, start, end in unsearched or ():
+        for facility_id in facility_ids:
+            ranges.setdefault(facility_id, []).append((start, end))
+
+    def searched(facility_id, booking_date):
+        booking_date = str(booking_date)
+        return not any(start <= booking_date < end for start, end in ranges.get(str(facility_id), ()))
+    return searched
+
+def update_delta(rows, snapshot_path=DEFAULT_SNAPSHOT_PATH, delta_path=DEFAULT_DELTA_PATH, unsearched=None):
+    """
+    Diff this run's result rows against the stored snapshot, write results_delta.json,
+    and replace the snapshot with this run's availability. Returns the delta data.
+    unsearched lists the check-in ranges a partial run did not search: the previous
+    snapshot's entries there are carried over, so they are neither removed nor re-added.
+    """
+    pacific_time = datetime.datetime.now(tz.gettz('US/Pacific'))
+    previous = load_snapshot(snapshot_path)
+    if unsearched and previous:
+        searched = searched_filter(unsearched)
+        rows = itertools.chain(rows, (
+            {'facility_id': facility_id, 'campsite_site_name': site, 'booking_date': date}
+            for facility_id, facility in previous['facilities'].items()
+            for site, dates in facility['sites'].items()
+            for date in dates if not searched(facility_id, date)))
+    current = build_snapshot(rows)
+    added, removed = diff_snapshots(previous['facilities'] if previous else {}, current)
+
+    delta = {
+        "generated_at": pacific_time.isoformat(),
+        "previous_snapshot_at": previous.get('taken_at') if previous else None,
+        "baseline": previous is None,  # No earlier snapshot: everything counts as added
+        "partial": bool(unsearched),  # Unsearched check-ins kept their previous state
+        "added_count": sum(1 for _ in iter_delta_entries(added)),
+        "removed_count": sum(1 for _ in iter_delta_entries(removed)),
+        "added": added,
+        "removed": removed
+    }
+    write_json_atomic(delta, delta_path, separators=(',', ':'))
+    save_snapshot(current, snapshot_path, taken_at=pacific_time.isoformat())
+
+    print(f"Delta saved to {delta_path}: +{delta['added_count']} / -{delta['removed_count']} (site, date) entries")
+    return delta
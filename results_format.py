@@ -0,0 +1,317 @@
+"""
+Compact, versioned results format and its precompressed variants.
+
+results.json repeats facility_name, recreation_area, booking_url and miles on every row.
+results_compact.json stores each facility once, with its site names and, per site,
+the booking dates as day offsets from a shared base date:
+
+    {
+      "schema": "yayarea.results", "version": 2, "base_date": "2026-07-03", ...header fields...,
+      "facilities": [
+        {"id": "629", "name": "...", "area": "...", "url": "...", "miles": 30,
+         "sites": ["Tent Campsite #17", ...], "days": [[0, 7, 14], ...]}
+      ]
+    }
+
+read_results() accepts either format and always returns the legacy row-based layout.
+iter_result_rows() and write_results_stream() read and write legacy files one row at a
+time, so merging batches keeps memory flat however many rows there are.
+"""
+
+import datetime
+import gzip
+import heapq
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # Optional: .br variants are skipped without it
+    brotli = None
+
+COMPACT_SCHEMA = "yayarea.results"
+COMPACT_VERSION = 2
+COMPACT_PATH = 'results_compact.json'
+# Files smaller than this get brotli's slowest, best compression
+BROTLI_MAX_QUALITY_BYTES = 4 * 1024 * 1024
+
+# Row fields that are stored once per facility in the compact format
+FACILITY_FIELDS = {
+    'name': 'facility_name',
+    'area': 'recreation_area',
+    'url': 'booking_url',
+    'miles': 'miles'
+}
+
+def is_compact(data):
+    return isinstance(data, dict) and data.get('schema') == COMPACT_SCHEMA
+
+def to_compact(data):
+    """
+    Convert a legacy results payload (header fields plus a 'results' row list) to the compact format.
+    data['results'] may be any iterable of rows (e.g. iter_result_rows) and is consumed once.
+    Facilities keep the order in which they first appear in the rows.
+    """
+    header = {key: value for key, value in data.items() if key != 'results'}
+
+    facilities = {}
+    for row in data.get('results', []):
+        facility = facilities.get(row['facility_id'])
+        if facility is None:
+            facility = {'id': row['facility_id']}
+            for key, field in FACILITY_FIELDS.items():
+                facility[key] = row.get(field)
+            facility['sites'] = []
+            facility['days'] = []
+            facility['_site_index'] = {}
+            facilities[row['facility_id']] = facility
+
+        site_index = facility['_site_index'].get(row['campsite_site_name'])
+        if site_index is None:
+            site_index = len(facility['sites'])
+            facility['_site_index'][row['campsite_site_name']] = site_index
+            facility['sites'].append(row['campsite_site_name'])
+            facility['days'].append(set())
+            if row.get('booking_url') != facility['url']:
+                facility.setdefault('site_urls', {})[str(site_index)] = row.get('booking_url')
+        facility['days'][site_index].add(datetime.date.fromisoformat(row['booking_date']).toordinal())
+
+    # Offsets are relative to the earliest date in the file
+    base_ordinal = min((min(days) for facility in facilities.values() for days in facility['days']), default=None)
+    for facility in facilities.values():
+        del facility['_site_index']
+        facility['days'] = [sorted(day - base_ordinal for day in days) for days in facility['days']]
+
+    compact = {"schema": COMPACT_SCHEMA, "version": COMPACT_VERSION}
+    compact.update(header)
+    compact["total_results"] = sum(len(days) for facility in facilities.values() for days in facility['days'])
+    compact["base_date"] = datetime.date.fromordinal(base_ordinal).isoformat() if base_ordinal else None
+    compact["facilities"] = list(facilities.values())
+    return compact
+
+def iter_compact_rows(compact):
+    """Yield legacy result rows from a compact payload."""
+    if not compact.get('base_date'):
+        return
+    base_date = datetime.date.fromisoformat(compact['base_date'])
+    for facility in compact.get('facilities', []):
+        site_urls = facility.get('site_urls', {})
+        for site_index, (site, days) in enumerate(zip(facility['sites'], facility['days'])):
+            booking_url = site_urls.get(str(site_index), facility['url'])
+            for offset in days:
+                yield {
+                    'facility_id': facility['id'],
+                    'facility_name': facility['name'],
+                    'recreation_area': facility['area'],
+                    'campsite_site_name': site,
+                    'booking_date': (base_date + datetime.timedelta(days=offset)).isoformat(),
+                    'booking_url': booking_url,
+                    'miles': facility['miles']
+                }
+
+def from_compact(compact):
+    """Convert a compact payload back to the legacy row-based layout."""
+    data = {key: value for key, value in compact.items()
+            if key not in ('schema', 'version', 'base_date', 'facilities')}
+    data['results'] = list(iter_compact_rows(compact))
+    return data
+
+def read_results(path='results.json'):
+    """
+    Read a results file in either the legacy or the compact format (plain or .gz/.br)
+    and return it in the legacy row-based layout.
+    """
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+    elif path.endswith('.br'):
+        if brotli is None:
+            raise RuntimeError("Reading .br files requires the brotli package")
+        with open(path, 'rb') as f:
+            data = json.loads(brotli.decompress(f.read()))
+    else:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    return from_compact(data) if is_compact(data) else data
+
+class _JsonStream:
+    """Incremental reader over a JSON file: decodes one value at a time from a sliding buffer."""
+
+    def __init__(self, f, chunk_size=65536):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character (without consuming it), or '' at end of file."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} in results file")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next JSON value, reading more of the file until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+def iter_result_rows(path='results.json'):
+    """
+    Yield the rows of a legacy results file one at a time without loading the whole file.
+    Compact files are small and are expanded in memory instead.
+    """
+    with open(path, 'r') as f:
+        stream = _JsonStream(f)
+        stream.expect('{')
+        while stream.peek() not in ('}', ''):
+            key = stream.value()
+            stream.expect(':')
+            if key == 'results':
+                stream.expect('[')
+                while stream.peek() != ']':
+                    yield stream.value()
+                    if stream.peek() == ',':
+                        stream.expect(',')
+                stream.expect(']')
+            elif key == 'schema' and stream.value() == COMPACT_SCHEMA:
+                break
+            else:
+                stream.value()
+            if stream.peek() == ',':
+                stream.expect(',')
+        else:
+            return
+    # Compact file
+    yield from iter_compact_rows(read_compact(path))
+
+def read_compact(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def merge_key(row):
+    """Global order of result rows: distance, then date, then facility and site."""
+    return (row['miles'], row['booking_date'], row['facility_id'], row['campsite_site_name'])
+
+def dedup_key(row):
+    return (row['facility_id'], row['campsite_site_name'], row['booking_date'])
+
+def merge_sorted_rows(*inputs):
+    """
+    K-way merge of row iterables that are each sorted by merge_key, dropping duplicate
+    (facility_id, campsite_site_name, booking_date) rows. Duplicates share a merge key
+    prefix, so they arrive next to each other and only the last few keys need remembering.
+    """
+    last_key = None
+    seen = set()
+    for row in heapq.merge(*inputs, key=merge_key):
+        key = merge_key(row)[:2]
+        if key != last_key:
+            last_key = key
+            seen = set()
+        row_key = dedup_key(row)
+        if row_key in seen:
+            continue
+        seen.add(row_key)
+        yield row
+
+def write_results_stream(path, header, rows, trailer=None):
+    """
+    Write a legacy results file one row per line: header fields, then "results", then the
+    fields returned by trailer() (evaluated after all rows were written, e.g. counts).
+    Written to a temp file and renamed into place so readers never see a partial file.
+    Returns the number of rows written.
+    """
+    tmp_path = f"{path}.tmp"
+    count = 0
+    with open(tmp_path, 'w') as f:
+        f.write('{\n')
+        for key, value in header.items():
+            f.write(f'  {json.dumps(key)}: {json.dumps(value)},\n')
+        f.write('  "results": [')
+        for row in rows:
+            f.write(',\n    ' if count else '\n    ')
+            f.write(json.dumps(row))
+            count += 1
+        f.write('\n  ]' if count else ']')
+        for key, value in (trailer() if trailer else {}).items():
+            f.write(f',\n  {json.dumps(key)}: {json.dumps(value)}')
+        f.write('\n}\n')
+    os.replace(tmp_path, path)
+    return count
+
+def write_precompressed(path, chunk_size=1024 * 1024):
+    """
+    Write .gz (and .br when brotli is installed) copies of `path` for servers that
+    can serve precompressed files, streaming in chunks. Returns the list of files written.
+    """
+    written = []
+
+    # mtime=0 keeps the gzip output identical when the content is unchanged
+    tmp_path = f"{path}.gz.tmp"
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as raw_out:
+        with gzip.GzipFile(fileobj=raw_out, mode='wb', compresslevel=9, mtime=0, filename='') as out:
+            while chunk := src.read(chunk_size):
+                out.write(chunk)
+    os.replace(tmp_path, f"{path}.gz")
+    written.append(f"{path}.gz")
+
+    if brotli is not None:
+        # Maximum quality is very slow on large inputs; it only pays off for small files
+        quality = 11 if os.path.getsize(path) < BROTLI_MAX_QUALITY_BYTES else 6
+        compressor = brotli.Compressor(quality=quality)
+        tmp_path = f"{path}.br.tmp"
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as out:
+            while chunk := src.read(chunk_size):
+                out.write(compressor.process(chunk))
+            out.write(compressor.finish())
+        os.replace(tmp_path, f"{path}.br")
+        written.append(f"{path}.br")
+    return written
+
+def write_result_variants(data, results_path='results.json', compact_path=COMPACT_PATH):
+    """
+    Write the compact results file next to results.json and precompressed copies of both.
+    data['results'] may be an iterable such as iter_result_rows(results_path).
+    """
+    compact = to_compact(data)
+    tmp_path = f"{compact_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(compact, f, separators=(',', ':'))
+    os.replace(tmp_path, compact_path)
+
+    written = [compact_path]
+    for path in (results_path, compact_path):
+        written.extend(write_precompressed(path))
+    sizes = ', '.join(f"{path} {os.path.getsize(path) / 1024:.0f} KB" for path in [results_path] + written)
+    print(f"Result variants saved: {sizes}")
+    return compact
@@ -0,0 +1,268 @@
+"""
+In-memory indexes over results.json for serving queries instead of the whole file.
+
+The index is built once per results file: facilities sorted by distance (so a max-miles filter
+is a bisect), each with its available dates as sorted ordinals and the sites free on each date,
+plus facility and provider lookups. ResultsIndexStore rebuilds it when a new results file lands
+(main.py replaces results.json atomically) and swaps it in with a single reference assignment,
+so a query always sees one complete index, never a half-built one.
+
+Queries return results pre-grouped by facility, like the page shows them:
+
+    {"total_facilities": 12, "total_results": 340, "offset": 0, "limit": 20,
+     "facilities": [{"id": "629", "name": "...", "area": "...", "url": "...", "miles": 30,
+                     "provider": "recreation_gov", "results": 14, "dates": ["2026-07-03", ...],
+                     "sites": {"2026-07-03": ["Tent Campsite #17", ...], ...}}, ...]}
+"""
+
+import bisect
+import datetime
+import os
+import threading
+import time
+from campsites_map import load_catalog
+from results_format import read_results
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+class QueryError(ValueError):
+    """A query parameter that can't be used (reported to the client as a 400)."""
+
+class FacilityEntry:
+    """One facility's details and availability: sorted date ordinals and the sites free on each."""
+    __slots__ = ('id', 'name', 'area', 'url', 'miles', 'provider', 'ordinals', 'sites')
+
+    def __init__(self, row, provider):
+        self.id = row['facility_id']
+        self.name = row['facility_name']
+        self.area = row['recreation_area']
+        self.url = row['booking_url']
+        self.miles = row['miles']
+        self.provider = provider
+        self.ordinals = []
+        self.sites = []
+
+    def date_slice(self, first=None, last=None):
+        """Index range of the dates within [first, last] (ordinals, inclusive)."""
+        start = 0 if first is None else bisect.bisect_left(self.ordinals, first)
+        end = len(self.ordinals) if last is None else bisect.bisect_right(self.ordinals, last)
+        return start, end
+
+    def details(self):
+        return {'id': self.id, 'name': self.name, 'area': self.area, 'url': self.url,
+                'miles': self.miles, 'provider': self.provider}
+
+    def entries(self):
+        """Set of (site name, date ordinal) pairs."""
+        return {(site, ordinal) for ordinal, sites in zip(self.ordinals, self.sites) for site in sites}
+
+    def to_json(self, start, end, include_sites=True):
+        entry = self.details()
+        entry['results'] = sum(len(sites) for sites in self.sites[start:end])
+        entry['dates'] = [datetime.date.fromordinal(ordinal).isoformat() for ordinal in self.ordinals[start:end]]
+        if include_sites:
+            entry['sites'] = dict(zip(entry['dates'], self.sites[start:end]))
+        return entry
+
+class ResultsIndex:
+    """Immutable indexes over one results file."""
+
+    def __init__(self, data, provider_of=None):
+        provider_of = provider_of or {}
+        self.header = {key: value for key, value in data.items() if key != 'results'}
+        facilities = {}
+        dates = {}  # facility_id -> {ordinal: set of site names}
+        for row in data.get('results', []):
+            facility = facilities.get(row['facility_id'])
+            if facility is None:
+                facility = facilities[row['facility_id']] = FacilityEntry(row, provider_of.get(row['facility_id']))
+                dates[facility.id] = {}
+            ordinal = datetime.date.fromisoformat(row['booking_date']).toordinal()
+            dates[facility.id].setdefault(ordinal, set()).add(row['campsite_site_name'])
+
+        for facility_id, facility in facilities.items():
+            by_date = dates[facility_id]
+            facility.ordinals = sorted(by_date)
+            facility.sites = [sorted(by_date[ordinal]) for ordinal in facility.ordinals]
+
+        # Distance order, as the page lists facilities
+        self.facilities = sorted(facilities.values(), key=lambda facility: (facility.miles, facility.name, facility.id))
+        self.miles = [facility.miles for facility in self.facilities]
+        self.by_id = facilities
+        self.providers = sorted({facility.provider for facility in self.facilities if facility.provider})
+        self.total_results = sum(len(sites) for facility in self.facilities for sites in facility.sites)
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            provider_of = load_catalog().provider_of
+        except OSError:
+            provider_of = {}
+        return cls(read_results(path), provider_of)
+
+    def query(self, date_from=None, date_to=None, max_miles=None, facility_ids=None, provider=None,
+              offset=0, limit=DEFAULT_PAGE_SIZE, include_sites=True):
+        """
+        Facilities with availability matching the filters, nearest first, one page of them.
+        date_from/date_to are inclusive datetime.dates; facility_ids is a collection of ids.
+        """
+        if provider is not None and provider not in self.providers:
+            raise QueryError(f"Unknown provider {provider!r} (known: {', '.join(self.providers)})")
+        first = date_from.toordinal() if date_from else None
+        last = date_to.toordinal() if date_to else None
+
+        if facility_ids:
+            candidates = sorted((self.by_id[facility_id] for facility_id in set(facility_ids) if facility_id in self.by_id),
+                                key=lambda facility: (facility.miles, facility.name, facility.id))
+        else:
+            candidates = self.facilities
+        if max_miles is not None:
+            if candidates is self.facilities:
+                candidates = self.facilities[:bisect.bisect_right(self.miles, max_miles)]
+            else:
+                candidates = [facility for facility in candidates if facility.miles <= max_miles]
+
+        matches = []
+        total_results = 0
+        for facility in candidates:
+            if provider is not None and facility.provider != provider:
+                continue
+            start, end = facility.date_slice(first, last)
+            if start < end:
+                matches.append((facility, start, end))
+                total_results += sum(len(sites) for sites in facility.sites[start:end])
+
+        return {
+            'last_updated': self.header.get('last_updated'),
+            'last_updated_pst': self.header.get('last_updated_pst'),
+            'search_criteria': self.header.get('search_criteria'),
+            'total_facilities': len(matches),
+            'total_results': total_results,
+            'offset': offset,
+            'limit': limit,
+            'facilities': [facility.to_json(start, end, include_sites)
+                           for facility, start, end in matches[offset:offset + limit]]
+        }
+
+def diff_indexes(previous, current):
+    """
+    (added, removed) (facility, site, date) entries between two indexes, grouped like
+    results_delta.json: {facility_id: {site_name: [dates]}}. Facilities whose dates and sites
+    are unchanged are skipped without building entry sets.
+    """
+    added = {}
+    removed = {}
+    before_by_id = previous.by_id if previous is not None else {}
+    for facility_id in before_by_id.keys() | current.by_id.keys():
+        before = before_by_id.get(facility_id)
+        after = current.by_id.get(facility_id)
+        if before is not None and after is not None and before.ordinals == after.ordinals and before.sites == after.sites:
+            continue
+        before_entries = before.entries() if before is not None else set()
+        after_entries = after.entries() if after is not None else set()
+        for target, entries in ((added, after_entries - before_entries), (removed, before_entries - after_entries)):
+            if not entries:
+                continue
+            grouped = target.setdefault(facility_id, {})
+            for site, ordinal in sorted(entries):
+                grouped.setdefault(site, []).append(datetime.date.fromordinal(ordinal).isoformat())
+    return added, removed
+
+def parse_query(params):
+    """
+    Query keyword arguments from URL parameters (dict of name -> list of values, as from
+    urllib.parse.parse_qs): from, to, max_miles, facility (repeatable or comma-separated),
+    provider, offset, limit and sites=0 to leave out per-date site names.
+    """
+    def single(name):
+        values = params.get(name)
+        return values[-1] if values else None
+
+    def parse(name, convert, description):
+        value = single(name)
+        if value is None or value == '':
+            return None
+        try:
+            return convert(value)
+        except ValueError:
+            raise QueryError(f"{name} must be {description}, got {value!r}")
+
+    query = {
+        'date_from': parse('from', datetime.date.fromisoformat, 'a YYYY-MM-DD date'),
+        'date_to': parse('to', datetime.date.fromisoformat, 'a YYYY-MM-DD date'),
+        'max_miles': parse('max_miles', float, 'a number'),
+        'provider': single('provider') or None,
+        'offset': parse('offset', int, 'an integer') or 0,
+        'limit': parse('limit', int, 'an integer'),
+        'include_sites': single('sites') not in ('0', 'false')
+    }
+    facility_ids = [facility_id for value in params.get('facility', []) for facility_id in value.split(',') if facility_id]
+    query['facility_ids'] = facility_ids or None
+    if query['limit'] is None:
+        query['limit'] = DEFAULT_PAGE_SIZE
+    if query['offset'] < 0 or not 1 <= query['limit'] <= MAX_PAGE_SIZE:
+        raise QueryError(f"offset must be >= 0 and limit between 1 and {MAX_PAGE_SIZE}")
+    return query
+
+class ResultsIndexStore:
+    """
+    The current ResultsIndex for a results file, rebuilt when the file changes.
+    Readers never block on a rebuild: they keep using the previous index until the new one
+    is swapped in. Only one thread rebuilds at a time.
+    Listeners are called as listener(previous_state, new_state) after each swap.
+    """
+
+    def __init__(self, path='results.json'):
+        self.path = path
+        # (version, index): (mtime_ns, size) of the file and the index built from it,
+        # replaced as one tuple so readers always see a matching pair
+        self.state = None
+        self.build_lock = threading.Lock()
+        self.listeners = []
+
+    def current(self):
+        """(version, index) for the results file as it is now, building the index if needed."""
+        state = self.state
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            if state is None:
+                raise
+            return state  # Mid-replace or removed: keep serving what we have
+        version = (stat.st_mtime_ns, stat.st_size)
+        if state is not None and state[0] == version:
+            return state
+        # The first build is waited for; later rebuilds are left to whichever thread started one
+        if not self.build_lock.acquire(blocking=state is None):
+            return state
+        try:
+            previous = state = self.state
+            if state is None or state[0] != version:
+                started = datetime.datetime.now()
+                index = ResultsIndex.from_file(self.path)
+                self.state = state = (version, index)
+                elapsed = (datetime.datetime.now() - started).total_seconds()
+                print(f"📇 Indexed {self.path}: {len(index.facilities)} facilities, {index.total_results} results ({elapsed:.2f}s)")
+                for listener in self.listeners:
+                    try:
+                        listener(previous, state)
+                    except Exception as e:
+                        print(f"⚠️ Results listener failed: {type(e).__name__}: {e}")
+            return state
+        finally:
+            self.build_lock.release()
+
+    def watch(self, interval=2.0):
+        """Check for a new results file every `interval` seconds in a background thread."""
+        def poll():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.current()
+                except Exception as e:
+                    print(f"⚠️ Could not index {self.path}: {type(e).__name__}: {e}")
+
+        thread = threading.Thread(target=poll, name='results-watch', daemon=True)
+        thread.start()
+        return thread
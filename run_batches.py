@@ -1,20 +1,120 @@
 #!/usr/bin/env python3
 """
-Script to run two batches of campsite searches with a 5-minute delay between them.
+Script to run two batches of campsite searches.
 Batch 1: Tomorrow to 3 months from now
 Batch 2: 3 months from now to 6 months from now
+The split is planned over the whole six months (see window_planner.split_batches) and moved to
+the nearest search-job boundary, so no month is fetched by both batches.
 Results are merged into a single results.json file.
+
+By default the searches run in-process on a worker pool, one worker per provider, so imports and
+HTTP connections stay warm and results come back as objects. Pass --isolated to run each
+batch in its own `python3 main.py` subprocess instead.
+
+Every search window is checkpointed (see checkpoints.py). If a run fails, rerunning with --resume
+only searches the windows that failed or never ran; checkpoints are cleared after a complete run,
+and when a run starts without --resume, so a later resume never picks up an older run's windows.
+
+--profile profiles each provider batch (in-process or in its subprocess) and the merge; see profiling.py.
+
+--workers N crawls the whole six months as a sharded crawl instead (see sharded_crawl.py): one work
+item per campground and search window on a queue in --queue-dir, searched by N worker processes
+(plus any started by hand on machines sharing that directory), then reduced into results.json.
 """
 
+import contextlib
 import subprocess
+import argparse
 import datetime
-import time
 import json
 import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dateutil.relativedelta import relativedelta
+from run_changes import record_run_changes
+from results_format import write_result_variants, write_results_stream, iter_result_rows, merge_sorted_rows, merge_key
+from result_records import ResultRows
+from checkpoints import CheckpointStore
+from metrics import get_metrics, record_response_cache_stats, DEFAULT_METRICS_DIR
+from profiling import profile_session, write_profile_summary, DEFAULT_PROFILE_DIR
+from availability_history import DEFAULT_HISTORY_PATH
+from watch_alerts import DEFAULT_WATCHES_PATH, DEFAULT_OUTBOX_DIR
+from distances import get_distance_engine, ORIGINS, DEFAULT_ORIGIN
+from sharded_crawl import DEFAULT_QUEUE_DIR
+from window_planner import split_batches, checkin_weekdays, months_of_nights, plan_search_jobs, count_provider_calls, count_monthly_calls
+
+# Time budget for each batch's search; main.py stops and saves what finished when it runs out
+BATCH_TIME_BUDGET = 1500  # 25 minutes
+# Extra time given to the subprocess on top of its budget before it is killed as a last resort
+BATCH_KILL_GRACE = 120
+# Time sharded crawl workers keep claiming items: what both batches would get
+SHARDED_TIME_BUDGET = 2 * BATCH_TIME_BUDGET
+
+PROVIDERS = ['reserve_california', 'recreation_gov']
+# Stay pattern searched by main.run_search: two consecutive nights, Friday check-in
+CONSECUTIVE_NIGHTS = 2
+WEEKENDS_ONLY = True
+# Short provider keys used in batch file names and batch_info
+PROVIDER_KEYS = {
+    'reserve_california': 'rc',
+    'recreation_gov': 'rg'
+}
+
+def report_planned_calls(batch_ranges, monthly_ranges):
+    """
+    Print the provider calls the planned batches will make against the whole-month windows
+    the fixed three-month split used to search.
+    """
+    from campsites_map import load_catalog
+    from main import generate_monthly_search_windows
 
-def run_batch(start_date, end_date, batch_name, provider='reserve_california', append=False):
-    """Run a single batch of the search for a specific provider."""
+    catalog = load_catalog()
+    weekdays = checkin_weekdays(WEEKENDS_ONLY)
+    planned = monthly = 0
+    for provider in PROVIDERS:
+        campgrounds = len(catalog.campground_ids(provider))
+        for start_date, end_date in batch_ranges:
+            planned += count_provider_calls(plan_search_jobs(start_date, end_date, provider, CONSECUTIVE_NIGHTS, weekdays)) * campgrounds
+        for start_date, end_date in monthly_ranges:
+            monthly += count_monthly_calls(generate_monthly_search_windows(start_date, end_date, WEEKENDS_ONLY), WEEKENDS_ONLY) * campgrounds
+    print(f"Planned provider calls: {planned} (monthly windows: {monthly}, saved {monthly - planned})")
+
+def check_batch_status(batch_name, data, output=None):
+    """
+    Report a batch's search status and return whether it counts as a success.
+    output (captured subprocess stdout) is echoed when given.
+    """
+    total_results = data.get('total_results', 0)
+    search_status = data.get('search_status', 'success')  # Default to success for backward compatibility
+    error_message = data.get('error_message')
+
+    # Check search_status instead of just result count
+    # "success" = search completed without errors (0 results is valid - no availability)
+    # "partial" = some errors but got results
+    # "error" = all searches failed
+    if search_status == "error":
+        print(f"❌ {batch_name} failed with errors: {error_message}")
+        success = False
+    elif search_status == "partial":
+        print(f"⚠️ {batch_name} completed with some errors ({total_results} results): {error_message}")
+        success = True  # Still count as success if we got some results
+    else:  # success
+        print(f"✅ {batch_name} completed successfully with {total_results} results")
+        success = True  # 0 results is valid - means no availability (not an error)
+    if output is not None:
+        print("STDOUT:", output)
+    return success
+
+def run_batch(start_date, end_date, batch_name, provider='reserve_california', append=False, resume=False,
+              metrics_dir=DEFAULT_METRICS_DIR, profile_dir=None, origin=DEFAULT_ORIGIN):
+    """
+    Run a single batch of the search for a specific provider in a main.py subprocess.
+    Returns (success, header) where header is the batch's results.json without its rows
+    (search_status, error_message, ...), or None if no results.json was written.
+    The subprocess exports its own metrics to metrics_dir (as run <provider>_<batch>), and
+    with a profile_dir profiles itself into it.
+    """
     print(f"\n{'='*60}")
     print(f"Starting {batch_name} ({provider})")
     print(f"Date range: {start_date} to {end_date}")
@@ -26,56 +126,130 @@ def run_batch(start_date, end_date, batch_name, provider='reserve_california', a
         '--start-date', start_date.strftime('%Y-%m-%d'),
         '--end-date', end_date.strftime('%Y-%m-%d'),
         '--batch-name', batch_name,
-        '--provider', provider
+        '--provider', provider,
+        '--time-budget', str(BATCH_TIME_BUDGET),
+        '--origins', origin
     ]
+    if resume:
+        cmd.append('--resume')
+    cmd.extend(['--metrics-dir', metrics_dir or ''])
+    if profile_dir:
+        cmd.extend(['--profile', '--profile-dir', profile_dir])
     
     try:
         # Run the search
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=1800)  # 30 minute timeout
+        # main.py enforces its own time budget; this timeout only catches a hung interpreter
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=BATCH_TIME_BUDGET + BATCH_KILL_GRACE)
 
         if result.returncode == 0:
             # Check if results.json was created and check search status
             if os.path.exists('results.json'):
                 with open('results.json', 'r') as f:
                     data = json.load(f)
-                    total_results = data.get('total_results', 0)
-                    search_status = data.get('search_status', 'success')  # Default to success for backward compatibility
-                    error_message = data.get('error_message')
-
-                # Check search_status instead of just result count
-                # "success" = search completed without errors (0 results is valid - no availability)
-                # "partial" = some errors but got results
-                # "error" = all searches failed
-                if search_status == "error":
-                    print(f"❌ {batch_name} failed with errors: {error_message}")
-                    print("STDOUT:", result.stdout)
-                    return False
-                elif search_status == "partial":
-                    print(f"⚠️ {batch_name} completed with some errors ({total_results} results): {error_message}")
-                    print("STDOUT:", result.stdout)
-                    return True  # Still count as success if we got some results
-                else:  # success
-                    print(f"✅ {batch_name} completed successfully with {total_results} results")
-                    print("STDOUT:", result.stdout)
-                    return True  # 0 results is valid - means no availability (not an error)
+                header = {key: value for key, value in data.items() if key != 'results'}
+                return check_batch_status(batch_name, data, result.stdout), header
             else:
                 print(f"❌ {batch_name} completed but no results.json created")
                 print("STDOUT:", result.stdout)
-                return False
+                return False, None
         else:
             print(f"❌ {batch_name} failed with return code {result.returncode}")
             print("STDERR:", result.stderr)
-            return False
+            return False, None
             
     except subprocess.TimeoutExpired:
-        print(f"⏰ {batch_name} timed out after 30 minutes")
-        return False
+        print(f"⏰ {batch_name} timed out after {(BATCH_TIME_BUDGET + BATCH_KILL_GRACE) // 60} minutes")
+        return False, None
     except Exception as e:
         print(f"💥 {batch_name} failed with exception: {e}")
-        return False
+        return False, None
+
+def run_batch_in_process(start_date, end_date, batch_name, provider='reserve_california', resume=False, profile_dir=None,
+                         origin=DEFAULT_ORIGIN):
+    """
+    Run a single batch of the search for a specific provider in this process.
+    Returns (success, results data) where the data is the same payload main.py would write to results.json.
+    With a profile_dir the batch is profiled into it as <provider>_<batch>.
+    """
+    # Imported here so --isolated runs never pay for the camply import
+    from main import run_search
+
+    print(f"\n{'='*60}")
+    print(f"Starting {batch_name} ({provider}) in-process")
+    print(f"Date range: {start_date} to {end_date}")
+    print(f"{'='*60}")
+
+    try:
+        with profile_session(f"{provider}_{batch_name}", profile_dir) if profile_dir else contextlib.nullcontext():
+            outcome = run_search(provider, start_date, end_date, batch_name, time_budget=BATCH_TIME_BUDGET, resume=resume,
+                                 origin=origin)
+            data = outcome.to_results_data()
+    except Exception as e:
+        print(f"💥 {batch_name} ({provider}) failed with exception: {e}")
+        return False, None
+    return check_batch_status(f"{batch_name} ({provider})", data), data
+
+def run_batch_for_providers(start_date, end_date, batch_name, executor=None, resume=False, metrics_dir=DEFAULT_METRICS_DIR,
+                            profile_dir=None, origin=DEFAULT_ORIGIN):
+    """
+    Run one batch for every provider and return {batch key: (success, data)}, e.g. {'rc_batch1': ...}.
+    With an executor the providers run concurrently in-process; without one each
+    provider runs in an isolated subprocess, its rows are kept in results_<key>.json and
+    data is only the file's header (search_status and so on).
+    """
+    outcomes = {}
+    if executor is not None:
+        futures = {provider: executor.submit(run_batch_in_process, start_date, end_date, batch_name, provider, resume, profile_dir, origin)
+                   for provider in PROVIDERS}
+        for provider, future in futures.items():
+            outcomes[f"{PROVIDER_KEYS[provider]}_{batch_name}"] = future.result()
+        return outcomes
+
+    for provider in PROVIDERS:
+        key = f"{PROVIDER_KEYS[provider]}_{batch_name}"
+        success, header = run_batch(start_date, end_date, batch_name, provider, append=False, resume=resume,
+                                    metrics_dir=metrics_dir, profile_dir=profile_dir, origin=origin)
+        if success and os.path.exists('results.json'):
+            os.rename('results.json', f'results_{key}.json')
+            print(f"✅ {provider} {batch_name} results saved to results_{key}.json")
+        outcomes[key] = (success, header)
+    return outcomes
+
+def all_batches_succeeded(outcomes):
+    """
+    Whether every batch in {batch key: (success, data)} finished with search_status "success".
+    A partial batch, or one without data (no results file), does not count.
+    """
+    return all(data is not None and data.get('search_status') == 'success' for _, data in outcomes.values())
 
-def merge_results():
-    """Merge results from all batches and providers."""
+def merged_search_status(outcomes):
+    """
+    The merged run's (search_status, unsearched) from {batch key: (success, data)}: "partial"
+    with every batch's unsearched check-in ranges when any batch was partial, else "success".
+    """
+    statuses = [data.get('search_status', 'success') for _, data in outcomes.values() if data is not None]
+    unsearched = [entry for _, data in outcomes.values() if data is not None for entry in data.get('unsearched', [])]
+    if 'partial' in statuses:
+        return 'partial', unsearched
+    return 'success', None
+
+def count_rows(rows, counts, key):
+    """Pass rows through while counting them into counts[key]."""
+    counts[key] = 0
+    for row in rows:
+        counts[key] += 1
+        yield row
+
+def merge_results(batches=None, origin=DEFAULT_ORIGIN):
+    """
+    Merge results from all batches and providers with a streaming k-way merge.
+    Rows are merged in (miles, date) order and deduplicated on (facility_id, campsite_site_name, booking_date),
+    then written to results.json via a temp file and rename.
+    batches maps batch keys (e.g. 'rc_batch1') to in-memory results data; when not given,
+    the results_<key>.json files written by isolated runs are streamed from disk instead.
+    Returns the merged file's header fields (without the rows), or None if there was nothing to merge.
+    origin is where the batches' distances were measured from.
+    """
     # Define all possible result files
     result_files = [
         'results_rc_batch1.json',  # Reserve California batch 1
@@ -84,132 +258,297 @@ def merge_results():
         'results_rg_batch2.json'   # Recreation.gov batch 2
     ]
     
-    if not any(os.path.exists(f) for f in result_files):
+    inputs = {}
+    if batches is None:
+        for result_file in result_files:
+            if os.path.exists(result_file):
+                # Batch files are written sorted by merge_key, so they can be streamed as-is
+                inputs[result_file.replace('results_', '').replace('.json', '')] = iter_result_rows(result_file)
+    else:
+        for key, data in batches.items():
+            if data is not None:
+                rows = data.get('results', [])
+                # In-process results (ResultRows) are produced in merge_key order already
+                inputs[key] = iter(rows) if isinstance(rows, ResultRows) else sorted(rows, key=merge_key)
+
+    if not inputs:
         print("No batch results found to merge")
-        return
+        return None
     
-    merged_results = []
-    total_results = 0
     batch_info = {}
-    
-    # Load results from each file
-    for result_file in result_files:
-        if os.path.exists(result_file):
-            with open(result_file, 'r') as f:
-                data = json.load(f)
-                results = data.get('results', [])
-                merged_results.extend(results)
-                total_results += len(results)
-                
-                # Track batch info
-                file_key = result_file.replace('results_', '').replace('.json', '')
-                batch_info[file_key] = len(results)
-                print(f"Loaded {len(results)} results from {result_file}")
+    streams = [count_rows(rows, batch_info, key) for key, rows in inputs.items()]
     
     # Create merged results file
     from dateutil import tz
     pacific_tz = tz.gettz('US/Pacific')
     pacific_time = datetime.datetime.now(pacific_tz)
     
-    merged_data = {
+    header = {
         "last_updated": pacific_time.isoformat(),
         "last_updated_pst": pacific_time.strftime('%Y-%m-%d %I:%M %p %Z'),
-        "total_results": total_results,
         "search_criteria": {
             "batch1": "Tomorrow to 3 months",
             "batch2": "3 months to 6 months",
             "consecutive_nights": 2,
-            "weekends_only": True
-        },
-        "batch_info": {
+            "weekends_only": True,
+            "origin": origin
+        }
+    }
+    merged_data = dict(header)
+    written = {'rows': 0}
+
+    def counted(rows):
+        for row in rows:
+            written['rows'] += 1
+            yield row
+
+    def trailer():
+        # Counts are only known once every row has streamed through
+        merged_data["total_results"] = written['rows']
+        merged_data["batch_info"] = {
             "batch1_results": batch_info.get('rc_batch1', 0) + batch_info.get('rg_batch1', 0),
             "batch2_results": batch_info.get('rc_batch2', 0) + batch_info.get('rg_batch2', 0)
-        },
-        "results": merged_results
-    }
-    
-    with open('results.json', 'w') as f:
-        json.dump(merged_data, f, indent=2)
+        }
+        return {"total_results": merged_data["total_results"], "batch_info": merged_data["batch_info"],
+                "metrics": get_metrics().snapshot()}
+
+    metrics = get_metrics()
+    with metrics.timer('merge'):
+        write_results_stream('results.json', header, counted(merge_sorted_rows(*streams)), trailer)
+    total_results = merged_data["total_results"]
+    for key in inputs:
+        print(f"Loaded {batch_info.get(key, 0)} results from {key}")
+    duplicates = sum(batch_info.values()) - total_results
     
     print(f"\n✅ Merged results saved to results.json")
-    print(f"Total campsites found: {total_results}")
+    with metrics.timer('write_variants'):
+        write_result_variants(dict(merged_data, results=iter_result_rows('results.json')))
+    print(f"Total campsites found: {total_results} ({duplicates} duplicates removed)")
     print(f"Batch 1: {merged_data['batch_info']['batch1_results']} results")
     print(f"Batch 2: {merged_data['batch_info']['batch2_results']} results")
     print(f"Reserve CA Batch 1: {batch_info.get('rc_batch1', 0)} results")
     print(f"Reserve CA Batch 2: {batch_info.get('rc_batch2', 0)} results")
     print(f"Recreation.gov Batch 1: {batch_info.get('rg_batch1', 0)} results")
     print(f"Recreation.gov Batch 2: {batch_info.get('rg_batch2', 0)} results")
+    return merged_data
+
+def write_results_from_origin(origin, merged_data, path='results.json'):
+    """
+    Write the merged results as measured from another origin to results_from_<origin>.json:
+    the same rows with that origin's distances, in its (miles, date) order.
+    """
+    miles_lookup = get_distance_engine().miles_lookup(origin)
+    rows = [dict(row, miles=miles_lookup.get(row['facility_id'], row['miles'])) for row in iter_result_rows(path)]
+    rows.sort(key=merge_key)
+    header = {key: value for key, value in merged_data.items() if key not in ('total_results', 'batch_info', 'metrics')}
+    header['search_criteria'] = dict(header['search_criteria'], origin=origin)
+    origin_path = f"results_from_{origin}.json"
+    write_results_stream(origin_path, header, rows, lambda: {"total_results": len(rows), "batch_info": merged_data["batch_info"]})
+    print(f"Results from {ORIGINS[origin].name} saved to {origin_path}")
+    return origin_path
+
+def record_changes(merged_data, start_date, end_date, args, origins, search_status='success', unsearched=None):
+    """
+    Record what changed since the previous run (delta, watch alerts, availability history)
+    and write the merged results as measured from the other origins.
+    A partial run passes the check-in ranges it did not search (see run_changes.py).
+    """
+    record_run_changes(lambda: iter_result_rows('results.json'), search_status, start_date, end_date, 'run_batches', unsearched,
+                       args.watches_path, args.outbox, args.history_path)
+    # The same results from other origins, without searching again
+    for origin in origins[1:]:
+        write_results_from_origin(origin, merged_data)
+
+def run_workers(workers, queue_dir, metrics_dir=DEFAULT_METRICS_DIR):
+    """
+    Start `workers` sharded crawl worker processes on the queue in queue_dir and wait for them
+    to drain it. Returns the number of workers that exited cleanly.
+    """
+    host = socket.gethostname()
+    processes = []
+    for i in range(workers):
+        cmd = [
+            'python3', 'sharded_crawl.py',
+            '--queue-dir', queue_dir,
+            '--metrics-dir', metrics_dir or '',
+            'work',
+            '--worker', f"{host}-w{i + 1}",
+            '--time-budget', str(SHARDED_TIME_BUDGET)
+        ]
+        processes.append(subprocess.Popen(cmd))
+
+    # Workers stop claiming when their budget runs out; the grace covers the items in flight
+    deadline = time.monotonic() + SHARDED_TIME_BUDGET + BATCH_KILL_GRACE
+    succeeded = 0
+    for i, process in enumerate(processes, 1):
+        try:
+            returncode = process.wait(timeout=max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            print(f"⏰ Worker {i} timed out and was stopped; its items go back to the queue when their leases lapse")
+            continue
+        if returncode == 0:
+            succeeded += 1
+        else:
+            print(f"❌ Worker {i} failed with return code {returncode}")
+    return succeeded
+
+def run_sharded_crawl(args, origins, profile_dir=None):
+    """Plan the six months as a sharded crawl, run --workers worker processes on it and reduce the shards."""
+    from sharded_crawl import plan_crawl, reduce_shards
+
+    tomorrow = datetime.date.today() + relativedelta(days=1)
+    six_months = tomorrow + relativedelta(months=6)
+    print(f"🚀 Starting sharded campsite search with {args.workers} workers")
+    print(f"Date range: {tomorrow} to {six_months}")
+
+    plan_crawl(args.queue_dir, tomorrow, six_months, providers=PROVIDERS, resume=args.resume)
+    started = time.monotonic()
+    succeeded = run_workers(args.workers, args.queue_dir, args.metrics_dir)
+    print(f"\n👷 {succeeded}/{args.workers} workers finished in {time.monotonic() - started:.1f}s")
+
+    print(f"\n🔄 Reducing shards...")
+    with profile_session('merge', profile_dir) if profile_dir else contextlib.nullcontext():
+        merged_data = reduce_shards(args.queue_dir, origin=origins[0])
+        if merged_data is None:
+            print(f"❌ Crawl incomplete; rerun with --resume to search only the items left")
+            exit(1)
+        record_changes(merged_data, tomorrow, six_months, args, origins, merged_data['search_status'],
+                       merged_data.get('unsearched'))
+
+    if args.metrics_dir:
+        record_response_cache_stats()
+        get_metrics().export(args.metrics_dir, 'run', sharded=True, workers=args.workers,
+                             search_status=merged_data['search_status'])
+    if profile_dir:
+        write_profile_summary(profile_dir, ['merge'])
+
+    if merged_data['search_status'] == 'error':
+        print(f"❌ Sharded search failed: {merged_data['error_message']}")
+        exit(1)
+    print(f"\n🎉 Sharded search completed: {merged_data['total_results']} results saved to results.json")
 
 def main():
     """Main function to run both batches."""
+    parser = argparse.ArgumentParser(description='Run the two-batch campsite search for all providers')
+    parser.add_argument('--isolated', action='store_true',
+                       help='Run each batch in its own main.py subprocess instead of in-process')
+    parser.add_argument('--resume', action='store_true',
+                       help='Reuse recent window checkpoints (e.g. from a failed run) and only search what is missing')
+    parser.add_argument('--metrics-dir', type=str, default=DEFAULT_METRICS_DIR,
+                       help='Directory for the run metrics (Prometheus textfile and runs.jsonl history); '
+                            'empty to disable')
+    parser.add_argument('--history-path', type=str, default=DEFAULT_HISTORY_PATH,
+                       help='SQLite availability history fed with the merged results (see availability_history.py); '
+                            'empty to disable')
+    parser.add_argument('--watches-path', type=str, default=DEFAULT_WATCHES_PATH,
+                       help='Watch store matched against the new availability (see watch_alerts.py); empty to disable')
+    parser.add_argument('--outbox', type=str, default=DEFAULT_OUTBOX_DIR,
+                       help='Spool directory for watch matches')
+    parser.add_argument('--origins', type=str, default=DEFAULT_ORIGIN,
+                       help=f"Comma-separated origins to measure distances from ({', '.join(ORIGINS)}); "
+                            "the first orders results.json, the others get results_from_<origin>.json")
+    parser.add_argument('--workers', type=int, default=0,
+                       help='Run a sharded crawl with this many local worker processes instead of the two batches')
+    parser.add_argument('--queue-dir', type=str, default=DEFAULT_QUEUE_DIR,
+                       help='Work queue and shard directory for --workers (shared with workers on other machines)')
+    parser.add_argument('--profile', action='store_true',
+                       help='Profile every provider batch and the merge (cProfile, tracemalloc, window timeline) into --profile-dir')
+    parser.add_argument('--profile-dir', type=str, default=DEFAULT_PROFILE_DIR,
+                       help='Directory for --profile output')
+    args = parser.parse_args()
+    profile_dir = args.profile_dir if args.profile else None
+    origins = [name.strip() for name in args.origins.split(',') if name.strip()] or [DEFAULT_ORIGIN]
+    unknown_origins = [name for name in origins if name not in ORIGINS]
+    if unknown_origins:
+        parser.error(f"Unknown origin(s): {', '.join(unknown_origins)} (known: {', '.join(ORIGINS)})")
+
+    if args.workers > 0:
+        run_sharded_crawl(args, origins, profile_dir)
+        return
+
     print("🚀 Starting two-batch campsite search")
+    if not args.resume:
+        # A fresh run: windows checkpointed by earlier runs must not be resumed by its retries
+        CheckpointStore().clear()
     
     # Calculate dates
     tomorrow = datetime.date.today() + relativedelta(days=1)
     three_months = tomorrow + relativedelta(months=3)
     six_months = tomorrow + relativedelta(months=6)
+
+    # Plan both batches together and split on a job boundary near the three month mark
+    (batch1_start, batch1_end), (batch2_start, batch2_end) = split_batches(
+        tomorrow, six_months, three_months, None, CONSECUTIVE_NIGHTS, checkin_weekdays(WEEKENDS_ONLY))
+    shared_months = months_of_nights(batch1_start, batch1_end) & months_of_nights(batch2_start, batch2_end)
     
-    print(f"Batch 1: {tomorrow} to {three_months}")
-    print(f"Batch 2: {three_months} to {six_months}")
-    
-    # Run batch 1 for both providers
-    print(f"\n🔄 Running Batch 1 for both providers...")
-    
-    # Reserve California batch 1
-    success_rc1 = run_batch(tomorrow, three_months, "batch1", "reserve_california", append=False)
-    if success_rc1 and os.path.exists('results.json'):
-        os.rename('results.json', 'results_rc_batch1.json')
-        print("✅ Reserve California Batch 1 results saved to results_rc_batch1.json")
-    
-    # Recreation.gov batch 1
-    success_rg1 = run_batch(tomorrow, three_months, "batch1", "recreation_gov", append=False)
-    if success_rg1 and os.path.exists('results.json'):
-        os.rename('results.json', 'results_rg_batch1.json')
-        print("✅ Recreation.gov Batch 1 results saved to results_rg_batch1.json")
-    
-    # Check if both providers succeeded in batch 1 (strict requirement)
-    if not success_rc1 or not success_rg1:
-        print(f"\n❌ CRITICAL ERROR: One or both providers failed in Batch 1")
-        print(f"❌ Reserve California Batch 1: {'✅ Success' if success_rc1 else '❌ Failed'}")
-        print(f"❌ Recreation.gov Batch 1: {'✅ Success' if success_rg1 else '❌ Failed'}")
-        print(f"❌ Cannot proceed to Batch 2 without BOTH providers succeeding in Batch 1")
-        print(f"❌ Job will fail - no meaningful results")
-        exit(1)
-    
-    print(f"\n✅ Batch 1 completed successfully")
-    print(f"✅ Reserve California Batch 1: {'✅ Success' if success_rc1 else '❌ Failed'}")
-    print(f"✅ Recreation.gov Batch 1: {'✅ Success' if success_rg1 else '❌ Failed'}")
-    
-    # Wait 5 minutes between batches
-    print(f"\n⏰ Waiting 5 minutes before starting batch 2...")
-    time.sleep(300)  # 5 minutes
-    
-    # Run batch 2 for both providers
-    print(f"\n🔄 Running Batch 2 for both providers...")
-    
-    # Reserve California batch 2
-    success_rc2 = run_batch(three_months, six_months, "batch2", "reserve_california", append=False)
-    if success_rc2 and os.path.exists('results.json'):
-        os.rename('results.json', 'results_rc_batch2.json')
-        print("✅ Reserve California Batch 2 results saved to results_rc_batch2.json")
-    
-    # Recreation.gov batch 2
-    success_rg2 = run_batch(three_months, six_months, "batch2", "recreation_gov", append=False)
-    if success_rg2 and os.path.exists('results.json'):
-        os.rename('results.json', 'results_rg_batch2.json')
-        print("✅ Recreation.gov Batch 2 results saved to results_rg_batch2.json")
+    print(f"Batch 1: {batch1_start} to {batch1_end}")
+    print(f"Batch 2: {batch2_start} to {batch2_end}")
+    print(f"Months fetched by both batches: {len(shared_months)}")
+    report_planned_calls([(batch1_start, batch1_end), (batch2_start, batch2_end)],
+                         [(tomorrow, three_months), (three_months, six_months)])
+
+    # Reusable worker pool, one worker per provider, shared by both batches
+    executor = None if args.isolated else ThreadPoolExecutor(max_workers=len(PROVIDERS), thread_name_prefix='batch')
     
-    # Check if both providers succeeded in batch 2 (strict requirement)
-    if not success_rc2 or not success_rg2:
-        print(f"\n❌ CRITICAL ERROR: One or both providers failed in Batch 2")
-        print(f"❌ Reserve California Batch 2: {'✅ Success' if success_rc2 else '❌ Failed'}")
-        print(f"❌ Recreation.gov Batch 2: {'✅ Success' if success_rg2 else '❌ Failed'}")
-        print(f"❌ Job will fail - incomplete results from Batch 2")
-        exit(1)
+    try:
+        # Run batch 1 for both providers
+        print(f"\n🔄 Running Batch 1 for both providers...")
+        batch1 = run_batch_for_providers(batch1_start, batch1_end, "batch1", executor, args.resume, args.metrics_dir, profile_dir,
+                                         origins[0])
+        success_rc1, success_rg1 = batch1['rc_batch1'][0], batch1['rg_batch1'][0]
+        
+        # Check if both providers succeeded in batch 1 (strict requirement)
+        if not success_rc1 or not success_rg1:
+            print(f"\n❌ CRITICAL ERROR: One or both providers failed in Batch 1")
+            print(f"❌ Reserve California Batch 1: {'✅ Success' if success_rc1 else '❌ Failed'}")
+            print(f"❌ Recreation.gov Batch 1: {'✅ Success' if success_rg1 else '❌ Failed'}")
+            print(f"❌ Cannot proceed to Batch 2 without BOTH providers succeeding in Batch 1")
+            print(f"❌ Job will fail - no meaningful results")
+            exit(1)
+        
+        print(f"\n✅ Batch 1 completed successfully")
+        print(f"✅ Reserve California Batch 1: {'✅ Success' if success_rc1 else '❌ Failed'}")
+        print(f"✅ Recreation.gov Batch 1: {'✅ Success' if success_rg1 else '❌ Failed'}")
+        
+        # No fixed pause between batches: each search paces itself with the adaptive
+        # per-provider rate limiter (see rate_limit.py), backing off on 429/5xx and Retry-After.
+        
+        # Run batch 2 for both providers
+        print(f"\n🔄 Running Batch 2 for both providers...")
+        batch2 = run_batch_for_providers(batch2_start, batch2_end, "batch2", executor, args.resume, args.metrics_dir, profile_dir,
+                                         origins[0])
+        success_rc2, success_rg2 = batch2['rc_batch2'][0], batch2['rg_batch2'][0]
+        
+        # Check if both providers succeeded in batch 2 (strict requirement)
+        if not success_rc2 or not success_rg2:
+            print(f"\n❌ CRITICAL ERROR: One or both providers failed in Batch 2")
+            print(f"❌ Reserve California Batch 2: {'✅ Success' if success_rc2 else '❌ Failed'}")
+            print(f"❌ Recreation.gov Batch 2: {'✅ Success' if success_rg2 else '❌ Failed'}")
+            print(f"❌ Job will fail - incomplete results from Batch 2")
+            exit(1)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
     
     # Merge results
     print(f"\n🔄 Merging results from both batches...")
-    merge_results()
+    with profile_session('merge', profile_dir) if profile_dir else contextlib.nullcontext():
+        if args.isolated:
+            merged_data = merge_results(origin=origins[0])
+        else:
+            merged_data = merge_results({key: data for key, (success, data) in {**batch1, **batch2}.items()}, origins[0])
+
+        # Record what changed since the previous run
+        if merged_data is not None:
+            search_status, unsearched = merged_search_status({**batch1, **batch2})
+            record_changes(merged_data, batch1_start, batch2_end, args, origins, search_status, unsearched)
+
+    # Nothing left to resume once every window of every batch succeeded; after a partial run the
+    # checkpoints stay, so a --resume run only searches the windows that failed
+    if merged_data is not None and all_batches_succeeded({**batch1, **batch2}):
+        CheckpointStore().clear()
     
     # Clean up temporary files
     for temp_file in ['results_rc_batch1.json', 'results_rc_batch2.json', 'results_rg_batch1.json', 'results_rg_batch2.json']:
@@ -217,6 +556,22 @@ def main():
             os.remove(temp_file)
             print(f"🗑️ Cleaned up {temp_file}")
     
+    if not args.isolated:
+        from response_cache import get_response_cache
+        if get_response_cache() is not None:
+            print(get_response_cache().summary())
+
+    # In-process runs cover every batch; isolated batches exported their own metrics, so this covers the merge
+    if args.metrics_dir:
+        record_response_cache_stats()
+        batch_statuses = {key: data.get('search_status') for key, (_, data) in {**batch1, **batch2}.items() if data is not None}
+        get_metrics().export(args.metrics_dir, 'run', isolated=args.isolated, search_status=batch_statuses or None)
+
+    # Batch profiles were saved in-process or by the batch subprocesses, under the same names
+    if profile_dir:
+        write_profile_summary(profile_dir, [f"{provider}_{batch_name}" for batch_name in ('batch1', 'batch2')
+                                            for provider in PROVIDERS] + ['merge'])
+
     print(f"\n🎉 Two-batch search completed for both providers!")
     print(f"Final merged results saved to results.json")
 
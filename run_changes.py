@@ -0,0 +1,31 @@
+"""
+What a finished run changed since the previous one: results_delta.json, the watch alerts it
+triggers and the availability history. Shared by main.py, run_batches.py and sharded_crawl.py.
+
+Only runs whose results can be trusted are recorded. A failed ("error") run records nothing:
+its missing rows say nothing about availability. A "partial" run passes the check-in ranges
+it could not search, which keep their previous state (see results_delta.unsearched_checkins).
+"""
+
+from availability_history import record_history, DEFAULT_HISTORY_PATH
+from metrics import get_metrics
+from results_delta import update_delta
+from watch_alerts import deliver_watch_alerts, DEFAULT_WATCHES_PATH, DEFAULT_OUTBOX_DIR
+
+def record_run_changes(load_rows, search_status, start_date, end_date, source, unsearched=None,
+                       watches_path=DEFAULT_WATCHES_PATH, outbox=DEFAULT_OUTBOX_DIR, history_path=DEFAULT_HISTORY_PATH):
+    """
+    Update the delta from this run's result rows, deliver the watch alerts it triggers and add
+    the run to the history. load_rows() returns a fresh iterable of the rows on each call.
+    Returns the delta data, or None if the run failed and nothing was recorded.
+    """
+    if search_status == 'error':
+        print("⚠️ Search failed; keeping the previous availability snapshot and history, no delta written")
+        return None
+    with get_metrics().timer('delta'):
+        delta = update_delta(load_rows(), unsearched=unsearched)
+    with get_metrics().timer('watches'):
+        deliver_watch_alerts(delta, watches_path, outbox)
+    with get_metrics().timer('history'):
+        record_history(load_rows(), start_date, end_date, source, history_path, unsearched)
+    return delta
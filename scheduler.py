@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Long-running refresh scheduler: re-searches near-term dates more often than far-out ones.
+
+The six-month horizon is split into tiers by how far out a stay checks in, and each tier is
+refreshed at its own cadence (near-term weekends churn from cancellations, dates five months
+out barely move). Every (provider, campground, window) search job sits in a priority queue
+keyed by when it is next due; each cycle runs the due jobs concurrently with the usual search
+engine, keeps the site-nights each job found, and publishes results.json (plus its variants
+and results_delta.json) from everything known. Nothing is published until every planned job
+has data, so a half-searched horizon never shows up as booked out. When the plan moves on at
+the day rollover, new jobs start from what the jobs they replace knew until they are refreshed.
+
+    python scheduler.py                 # run until interrupted
+    python scheduler.py --cycles 50     # stop after 50 refresh cycles
+"""
+
+import argparse
+import datetime
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from campsites_map import load_catalog
+from checkpoints import checkpoint_key, file_digest
+from deadlines import RunBudget
+from result_records import ResultSet
+from results_delta import update_delta
+from results_format import write_result_variants
+from search_engine import SearchJob, run_search_jobs
+from site_filters import SiteFilter, load_site_rules, SITE_FILTERS_PATH
+from stay_profiles import NightBitmapBuilder, get_profiles, to_stay_record, DEFAULT_PROFILES
+from window_planner import candidate_stays, plan_stay_jobs, count_provider_calls
+
+PROVIDERS = ['reserve_california', 'recreation_gov']
+
+@dataclass(frozen=True)
+class RefreshTier:
+    """Stays checking in less than max_days out are re-searched every `interval` seconds."""
+    name: str
+    max_days: int
+    interval: int
+
+# Nearest tier first; the last tier's max_days is the search horizon
+REFRESH_TIERS = [
+    RefreshTier('2 weeks', 14, 15 * 60),
+    RefreshTier('1 month', 31, 30 * 60),
+    RefreshTier('3 months', 92, 2 * 60 * 60),
+    RefreshTier('6 months', 183, 6 * 60 * 60)
+]
+
+# Most jobs run per cycle, so a cycle (and the results it publishes) never takes too long
+DEFAULT_MAX_JOBS_PER_CYCLE = 40
+CYCLE_TIME_BUDGET = 600  # seconds
+# Longest sleep between checks, so the day rollover is noticed promptly
+MAX_IDLE_SLEEP = 60
+
+@dataclass(order=True)
+class ScheduledJob:
+    """A search job in the priority queue, ordered by when it is next due."""
+    due: float
+    seq: int
+    key: str = field(compare=False)
+    tier: RefreshTier = field(compare=False)
+    job: SearchJob = field(compare=False)
+    calls: int = field(compare=False, default=1)  # provider calls one refresh costs
+
+def plan_refresh_jobs(today, catalog, profiles, tiers=REFRESH_TIERS, providers=PROVIDERS):
+    """
+    Plan (tier, SearchJob, provider calls) for every provider and campground: each tier covers
+    the stays checking in between the previous tier's limit and its own.
+    """
+    planned = []
+    lower = today + datetime.timedelta(days=1)
+    horizon = today + datetime.timedelta(days=tiers[-1].max_days)
+    longest = max(profile.nights for profile in profiles)
+    for tier in tiers:
+        upper = today + datetime.timedelta(days=tier.max_days)
+        # Stays checking in within the tier, checking out by the horizon
+        stays = [(checkin, checkout) for profile in profiles
+                 for checkin, checkout in candidate_stays(lower, min(horizon, upper + datetime.timedelta(days=longest)),
+                                                          profile.nights, profile.checkin_weekdays)
+                 if checkin < upper]
+        for provider in providers:
+            planned_jobs = plan_stay_jobs(stays, provider)
+            for campground_id in catalog.campground_ids(provider):
+                for planned_job in planned_jobs:
+                    planned.append((tier, SearchJob(provider, planned_job.start, planned_job.end, [campground_id],
+                                                    windows=planned_job.windows),
+                                    count_provider_calls([planned_job])))
+        lower = upper
+    return planned
+
+def _night(record):
+    """A StayRecord's booking date as a date."""
+    booking_date = record.booking_date
+    return booking_date.date() if isinstance(booking_date, datetime.datetime) else booking_date
+
+class RefreshScheduler:
+    """Priority queue of due search jobs plus the latest site-nights each job found."""
+
+    def __init__(self, profiles=None, tiers=REFRESH_TIERS, max_jobs_per_cycle=DEFAULT_MAX_JOBS_PER_CYCLE,
+                 max_in_flight=3, site_filters_path=SITE_FILTERS_PATH):
+        self.profiles = get_profiles(profiles or DEFAULT_PROFILES)
+        self.tiers = tiers
+        self.max_jobs_per_cycle = max_jobs_per_cycle
+        self.max_in_flight = max_in_flight
+        self.site_filter = SiteFilter(load_site_rules(site_filters_path))
+        self.context = {'nights': 1, 'weekends_only': False, 'site_filters': file_digest(site_filters_path)}
+        self.catalog = load_catalog()
+        self.queue = []
+        self.seq = itertools.count()
+        self.nights = {}       # job key -> site-nights (StayRecords) from the job's latest successful search
+        self.errors = {}       # job key -> error message from its latest failed search
+        self.stale = set()     # job keys whose nights were carried over from the previous day's plan
+        self.refreshed_at = {}  # tier name -> when one of its jobs last finished
+        self.planned_for = None
+
+    def replan(self, today):
+        """(Re)build the queue for `today`, keeping what is known for jobs that are still planned."""
+        planned = plan_refresh_jobs(today, self.catalog, self.profiles, self.tiers)
+        due_by_key = {scheduled.key: scheduled.due for scheduled in self.queue}
+        # Everything known so far by (provider, campground), to seed the jobs new to this plan
+        known = {}
+        for scheduled in self.queue:
+            if scheduled.key in self.nights:
+                known.setdefault((scheduled.job.provider, scheduled.job.campground_ids[0]), []).extend(self.nights[scheduled.key])
+        now = time.time()
+        self.queue = []
+        keys = set()
+        for tier, job, calls in planned:
+            key = checkpoint_key(job, self.context)
+            keys.add(key)
+            heapq.heappush(self.queue, ScheduledJob(due_by_key.get(key, now), next(self.seq), key, tier, job, calls))
+            if key not in self.nights and (job.provider, job.campground_ids[0]) in known:
+                self.nights[key] = [record for record in known[(job.provider, job.campground_ids[0])]
+                                    if any(start <= _night(record) < end for start, end in job.search_windows)]
+                self.stale.add(key)
+        self.nights = {key: nights for key, nights in self.nights.items() if key in keys}
+        self.errors = {key: error for key, error in self.errors.items() if key in keys}
+        self.stale &= keys
+        self.planned_for = today
+
+        per_hour = sum(scheduled.calls * 3600 / scheduled.tier.interval for scheduled in self.queue)
+        # Compared with searching the whole horizon at the nearest tier's cadence
+        full_per_hour = sum(scheduled.calls for scheduled in self.queue) * 3600 / self.tiers[0].interval
+        print(f"📅 Planned {len(self.queue)} refresh jobs for {today}: about {per_hour:.0f} provider calls per hour "
+              f"(vs {full_per_hour:.0f} refreshing everything every {self.tiers[0].interval // 60} minutes)")
+        for tier in self.tiers:
+            count = sum(1 for scheduled in self.queue if scheduled.tier == tier)
+            print(f"   {tier.name}: {count} jobs every {tier.interval // 60} minutes")
+
+    def due_jobs(self, now):
+        """Pop the jobs due at `now`, most overdue first, up to max_jobs_per_cycle."""
+        due = []
+        while self.queue and self.queue[0].due <= now and len(due) < self.max_jobs_per_cycle:
+            due.append(heapq.heappop(self.queue))
+        return due
+
+    def run_cycle(self):
+        """Run the jobs that are due and reschedule them. Returns the number of jobs run."""
+        due = self.due_jobs(time.time())
+        if not due:
+            return 0
+        scheduled_by_job = {}
+        jobs = []
+        for index, scheduled in enumerate(due, 1):
+            scheduled.job.index = index
+            scheduled_by_job[index] = scheduled
+            jobs.append(scheduled.job)
+
+        print(f"\n🔄 Refreshing {len(jobs)} jobs ({', '.join(sorted({s.tier.name for s in due}))})...")
+        budget = RunBudget(total_seconds=CYCLE_TIME_BUDGET, window_seconds=60)
+        for window in run_search_jobs(jobs, 1, False, max_in_flight=self.max_in_flight, budget=budget):
+            scheduled = scheduled_by_job[window.job.index]
+            if window.error is not None:
+                self.errors[scheduled.key] = f"{window.job.label}: {type(window.error).__name__} - {window.error}"
+                print(f"  ❌ {window.job.provider} {window.job.campground_ids[0]} {window.job.label}: {window.error}")
+            else:
+                kept = self.site_filter.filter(window.results, window.job.provider)
+                self.nights[scheduled.key] = [to_stay_record(result) for result in kept]
+                self.errors.pop(scheduled.key, None)
+                self.stale.discard(scheduled.key)
+                self.refreshed_at[scheduled.tier.name] = datetime.datetime.now().isoformat(timespec='seconds')
+            # Failed jobs are retried at the same cadence; the response cache keeps retries cheap
+            scheduled.due = time.time() + scheduled.tier.interval
+            scheduled.seq = next(self.seq)
+            heapq.heappush(self.queue, scheduled)
+        return len(jobs)
+
+    def missing_jobs(self):
+        """Planned jobs that have never returned data (not even carried over from the previous plan)."""
+        return sum(1 for scheduled in self.queue if scheduled.key not in self.nights)
+
+    def publish(self):
+        """
+        Write results.json, its variants and results_delta.json from every job's latest site-nights.
+        Only call this once every planned job has data (see missing_jobs): a job without any
+        would make its dates look booked out, and the delta would report them removed.
+        """
+        # Imported here: main pulls in the full search stack, which callers of this module already have
+        from main import build_results_data, write_results_data
+
+        start_date = self.planned_for + datetime.timedelta(days=1)
+        end_date = self.planned_for + datetime.timedelta(days=self.tiers[-1].max_days)
+        builder = NightBitmapBuilder(start_date, end_date)
+        for nights in self.nights.values():
+            builder.add(nights)
+        bitmap = builder.build()
+
+        primary = self.profiles[0]
+        results = ResultSet(self.catalog.miles_lookup, self.catalog.url_lookup, bitmap.iter_stays(primary))
+        search_criteria = {
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "consecutive_nights": primary.nights,
+            "weekends_only": primary.name == 'weekend',
+            "stay_profile": primary.name,
+            "refresh_tiers": {tier.name: {"max_days": tier.max_days, "interval_minutes": tier.interval // 60,
+                                          "refreshed_at": self.refreshed_at.get(tier.name)}
+                              for tier in self.tiers}
+        }
+        # Jobs whose last refresh failed, or that still hold the previous plan's nights, publish older data
+        problems = []
+        if self.errors:
+            problems.append(f"{len(self.errors)} jobs failed on their last refresh: {'; '.join(list(self.errors.values())[:5])}")
+        if self.stale:
+            problems.append(f"{len(self.stale)} jobs not refreshed since the plan moved to {self.planned_for}")
+        status, error_message = ("partial", '; '.join(problems)) if problems else ("success", None)
+        data = build_results_data(results, self.catalog.miles_lookup, self.catalog.url_lookup, search_criteria,
+                                  "scheduler", status, error_message)
+        write_results_data(data)
+        print(f"📦 Published {len(results)} results ({status}, {len(self.stale)} carried-over and {len(self.errors)} failed "
+              f"of {len(self.queue)} jobs) - {data['last_updated_pst']}")
+        write_result_variants(data)
+        update_delta(results.rows())
+
+    def run(self, max_cycles=None):
+        """Refresh and publish until interrupted (or for max_cycles cycles that ran jobs)."""
+        cycles = 0
+        while max_cycles is None or cycles < max_cycles:
+            today = datetime.date.today()
+            if self.planned_for != today:
+                self.replan(today)
+            if self.run_cycle():
+                missing = self.missing_jobs()
+                if missing:
+                    print(f"⏳ Not publishing yet: {missing}/{len(self.queue)} planned jobs have no data")
+                else:
+                    self.publish()
+                cycles += 1
+                continue
+            wait = self.queue[0].due - time.time() if self.queue else MAX_IDLE_SLEEP
+            time.sleep(max(1, min(wait, MAX_IDLE_SLEEP)))
+
+def main():
+    parser = argparse.ArgumentParser(description='Refresh campsite availability continuously, near-term dates most often')
+    parser.add_argument('--cycles', type=int, help='Stop after this many refresh cycles (default: run until interrupted)')
+    parser.add_argument('--max-jobs-per-cycle', type=int, default=DEFAULT_MAX_JOBS_PER_CYCLE,
+                        help='Most search jobs run in one cycle before results are published')
+    parser.add_argument('--max-in-flight', type=int, default=3,
+                        help='Maximum number of search jobs run concurrently per provider')
+    parser.add_argument('--profiles', type=str, default=','.join(DEFAULT_PROFILES),
+                        help='Comma-separated stay profiles; the first is published to results.json')
+    args = parser.parse_args()
+
+    scheduler = RefreshScheduler([name.strip() for name in args.profiles.split(',') if name.strip()],
+                                 max_jobs_per_cycle=args.max_jobs_per_cycle, max_in_flight=args.max_in_flight)
+    print("🚀 Starting refresh scheduler")
+    try:
+        scheduler.run(args.cycles)
+    except KeyboardInterrupt:
+        print("\n⏹️ Scheduler stopped")
+
+if __name__ == "__main__":
+    main()
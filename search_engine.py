@@ -0,0 +1,203 @@
+"""
+Concurrent search engine for campsite availability.
+Fans (provider, window) search jobs out over a thread pool and yields
+each window's results as soon as it finishes.
+Every window runs under a deadline taken from the run's time budget; windows still
+running when the budget runs out are reported as timed out so finished ones can be saved.
+Windows failing with a transient error (connection problems, timeouts, 429/5xx) are retried
+with exponential backoff and full jitter while their deadline allows.
+"""
+
+import contextvars
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+from camply.search import SearchReserveCalifornia, SearchRecreationDotGov
+from camply.containers import SearchWindow
+from camply.providers.base_provider import ProviderError
+import requests
+import tenacity
+from deadlines import DeadlineExceeded, RunBudget, deadline_scope
+from profiling import profile_window
+from provider_http import with_provider_adapter
+from rate_limit import THROTTLE_STATUS_CODES
+
+# Maximum number of windows searched at the same time for each provider
+DEFAULT_MAX_IN_FLIGHT = {
+    'reserve_california': 3,
+    'recreation_gov': 3
+}
+
+# Retries for a window failing with a transient error, and the backoff between them (seconds)
+DEFAULT_WINDOW_RETRIES = 2
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 30
+
+# camply search classes whose provider sessions enforce our deadlines
+SEARCH_CLASSES = {
+    'reserve_california': with_provider_adapter(SearchReserveCalifornia, 'reserve_california'),
+    'recreation_gov': with_provider_adapter(SearchRecreationDotGov, 'recreation_gov')
+}
+
+@dataclass
+class SearchJob:
+    """
+    A single provider search over one date window, or over several precise
+    (start, end) windows (end exclusive) inside it when `windows` is given.
+    """
+    provider: str
+    window_start: object
+    window_end: object
+    campground_ids: List[str]
+    index: int = 0
+    windows: Optional[list] = None
+
+    @property
+    def search_windows(self):
+        return self.windows or [(self.window_start, self.window_end)]
+
+    @property
+    def label(self):
+        return self.window_start.strftime('%Y-%m')
+
+@dataclass
+class WindowResult:
+    """Outcome of one SearchJob: the matching campsites or the error raised."""
+    job: SearchJob
+    results: list = field(default_factory=list)
+    error: Optional[Exception] = None
+    attempts: int = 1
+    seconds: float = 0.0  # Time spent on the window, including retries
+
+def build_searcher(provider, windows, campground_ids, nights, weekends_only):
+    """
+    Create the camply searcher for a provider and a list of (start, end) date windows.
+    """
+    search_window = [SearchWindow(start_date=start, end_date=end) for start, end in windows]
+
+    if provider == 'reserve_california':
+        return SEARCH_CLASSES[provider](
+            search_window=search_window,
+            recreation_area=[],  # We're using specific campgrounds instead
+            campgrounds=campground_ids,
+            nights=nights,
+            weekends_only=weekends_only
+        )
+    elif provider == 'recreation_gov':
+        return SEARCH_CLASSES[provider](
+            search_window=search_window,
+            campgrounds=campground_ids,
+            nights=nights,
+            weekends_only=weekends_only
+        )
+    raise ValueError(f"Unknown provider: {provider}")
+
+def is_transient_error(error):
+    """
+    Whether a window's error is worth retrying: network failures, timeouts (other than our own
+    deadlines), throttling/5xx responses and truncated JSON.
+    """
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status is None or status in THROTTLE_STATUS_CODES or status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                              ProviderError, tenacity.RetryError, ConnectionError, TimeoutError, json.JSONDecodeError))
+
+def retry_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Exponential backoff with full jitter for the given retry attempt (0 for the first retry)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def default_search(searcher):
+    """
+    Run a camply search and return its matching campsites.
+    """
+    return searcher.get_matching_campsites()
+
+def run_search_jobs(jobs, nights, weekends_only, search_fn=default_search, result_filter: Optional[Callable] = None,
+                    max_in_flight=None, budget: Optional[RunBudget] = None, retries=DEFAULT_WINDOW_RETRIES):
+    """
+    Run all search jobs concurrently and yield a WindowResult per job as it finishes.
+    search_fn(searcher) performs the actual search.
+    max_in_flight limits concurrent windows per provider (dict of provider -> int, or an int for all).
+    budget splits the run's time into per-window deadlines; when it runs out, unfinished
+    jobs are yielded with a DeadlineExceeded error and abandoned.
+    Transient errors are retried up to `retries` times per window (see is_transient_error).
+    Errors are captured per window so one failing window never stops the others.
+    """
+    if not jobs:
+        return
+
+    budget = budget or RunBudget()
+    limits = dict(DEFAULT_MAX_IN_FLIGHT)
+    if isinstance(max_in_flight, int):
+        limits = {provider: max_in_flight for provider in limits}
+    elif max_in_flight:
+        limits.update(max_in_flight)
+
+    providers = {job.provider for job in jobs}
+    semaphores = {provider: threading.BoundedSemaphore(max(1, limits.get(provider, 1))) for provider in providers}
+    not_started = {provider: sum(1 for job in jobs if job.provider == provider) for provider in providers}
+    counter_lock = threading.Lock()
+    pool_size = sum(max(1, limits.get(provider, 1)) for provider in providers)
+
+    def run_job(job):
+        with semaphores[job.provider], profile_window(job.label):
+            with counter_lock:
+                windows_remaining = not_started[job.provider]
+                not_started[job.provider] -= 1
+            window_deadline = budget.window_deadline(windows_remaining, max(1, limits.get(job.provider, 1)))
+            window_deadline.check(f"Search for {job.label}")
+            started = time.monotonic()
+            attempt = 0
+            while True:
+                try:
+                    with deadline_scope(window_deadline):
+                        searcher = build_searcher(job.provider, job.search_windows,
+                                                  job.campground_ids, nights, weekends_only)
+                        results = search_fn(searcher)
+                    break
+                except Exception as e:
+                    delay = retry_delay(attempt)
+                    if attempt >= retries or not is_transient_error(e) or delay >= window_deadline.remaining():
+                        e.attempts = attempt + 1
+                        e.seconds = time.monotonic() - started
+                        raise
+                    print(f"  Retrying {job.label} in {delay:.1f}s after {type(e).__name__}: {e}")
+                    time.sleep(delay)
+                    attempt += 1
+            if result_filter is not None:
+                results = result_filter(results)
+            return results, attempt + 1, time.monotonic() - started
+
+    executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='search')
+    try:
+        # Jobs run in the caller's context, so they see its --profile session (see profiling.py)
+        futures = {executor.submit(contextvars.copy_context().run, run_job, job): job for job in jobs}
+        pending = set(futures)
+        while pending:
+            remaining = budget.remaining()
+            done, pending = wait(pending, timeout=None if math.isinf(remaining) else remaining,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                job = futures[future]
+                try:
+                    results, attempts, seconds = future.result()
+                    yield WindowResult(job=job, results=results, attempts=attempts, seconds=seconds)
+                except Exception as e:
+                    yield WindowResult(job=job, error=e, attempts=getattr(e, 'attempts', 1), seconds=getattr(e, 'seconds', 0.0))
+            if pending and budget.expired:
+                # Out of time: report stragglers and stop waiting on them.
+                # Their next HTTP request fails fast because its deadline has passed.
+                for future in pending:
+                    future.cancel()
+                    yield WindowResult(job=futures[future], error=DeadlineExceeded("Run time budget exhausted before window finished"))
+                pending = set()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
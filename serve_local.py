@@ -1,59 +1,487 @@
 #!/usr/bin/env python3
 """
-Simple local HTTP server to serve the campsite search results.
-This solves CORS issues when testing locally.
+Local HTTP server for the campsite search results.
+This solves CORS issues when testing locally, and can serve the site for real:
+
+- Threaded: a slow client doesn't block the others; HTTP/1.1 keep-alive.
+- Compression: Accept-Encoding negotiation, preferring the precompressed .br/.gz copies
+  main.py writes next to results.json; other text files are gzipped on the fly (cached).
+- Revalidation: strong ETags and Last-Modified, answered with 304 Not Modified.
+  JSON is served with Cache-Control: no-cache, so browsers revalidate instead of re-downloading.
+- Range requests (single byte ranges, with If-Range).
+- Query API: /api/results?from=2026-07-01&to=2026-07-31&max_miles=60&provider=recreation_gov
+  (also facility=<id>[,<id>...], offset, limit, sites=0) answers from in-memory indexes over
+  results.json, grouped by facility, so a client downloads only the facilities it asked for.
+  The indexes are rebuilt and swapped in when a new results.json lands (see results_index.py).
+- Live updates: /api/events is a Server-Sent Events stream of the (facility, site, date)
+  entries that changed with each new results.json (see live_events.py).
+- Only the page, the results files (with their .br/.gz copies) and images/ are served; the
+  code, caches, checkpoints, history and watch stores next to them are not (see is_public_path).
+
+    python serve_local.py                         # http://localhost:8000, opens a browser
+    python serve_local.py --bind 0.0.0.0 --port 8080 --headless
 """
 
+import argparse
+import email.utils
+import gzip
+import hashlib
 import http.server
-import socketserver
+import json
+import os
+import re
+import threading
 import webbrowser
+from collections import OrderedDict
+from http import HTTPStatus
 from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from live_events import EventHub, change_event, format_event, version_id, RETRY_MILLISECONDS
+from results_index import QueryError, ResultsIndexStore, parse_query
+
+DEFAULT_PORT = 8000
+
+# Encodings we can serve, in order of preference, with the suffix of their precompressed copies
+PRECOMPRESSED = [('br', '.br'), ('gzip', '.gz')]
+# Types worth compressing on the fly when no precompressed copy exists
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+# Files smaller than this aren't worth compressing; larger ones are only served precompressed
+MIN_COMPRESS_BYTES = 1024
+MAX_COMPRESS_BYTES = 8 * 1024 * 1024
+# Bytes of on-the-fly gzip output kept in memory
+GZIP_CACHE_BYTES = 32 * 1024 * 1024
+
+# How long browsers may use static assets without revalidating; JSON is always revalidated
+STATIC_MAX_AGE = 300  # seconds
+
+# Files served, relative to the served directory; any path segment starting with '.' is refused
+PUBLIC_FILES = re.compile(r'index\.html|results[\w-]*\.json(\.br|\.gz)?|images/[\w-][\w.-]*(/[\w-][\w.-]*)*')
+
+QUERY_PATH = '/api/results'
+EVENTS_PATH = '/api/events'
+
+def accepted_encodings(header):
+    """Content codings a client accepts (q=0 means refused)."""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single 'bytes=' range, None when the header should be ignored,
+    or 'unsatisfiable'. Multi-range requests are answered with the whole file.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[6:].strip().partition('-')
+    try:
+        if first == '':
+            length = int(last)
+            if length <= 0:
+                return 'unsatisfiable'
+            return (max(0, size - length), size - 1)
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        return 'unsatisfiable'
+    if end < start:
+        return None
+    return (start, min(end, size - 1))
+
+class FileCache:
+    """
+    Per-file ETags and on-the-fly gzip bodies, keyed by (path, mtime, size) so a replaced file
+    is picked up on the next request. Thread-safe; the gzip cache is LRU-bounded by bytes.
+    """
+
+    def __init__(self, max_bytes=GZIP_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.etags = {}
+        self.gzipped = OrderedDict()
+        self.gzipped_bytes = 0
+        self.lock = threading.Lock()
+
+    def etag(self, path, stat):
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        etag = self.etags.get(key)
+        if etag is None:
+            digest = hashlib.sha1()
+            with open(path, 'rb') as f:
+                while chunk := f.read(1024 * 1024):
+                    digest.update(chunk)
+            etag = digest.hexdigest()[:20]
+            with self.lock:
+                self.etags[key] = etag
+        return etag
+
+    def gzip(self, path, stat):
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            body = self.gzipped.get(key)
+            if body is not None:
+                self.gzipped.move_to_end(key)
+                return body
+        with open(path, 'rb') as f:
+            body = gzip.compress(f.read(), compresslevel=6, mtime=0)
+        with self.lock:
+            if key not in self.gzipped:
+                self.gzipped[key] = body
+                self.gzipped_bytes += len(body)
+            while self.gzipped_bytes > self.max_bytes and len(self.gzipped) > 1:
+                _, evicted = self.gzipped.popitem(last=False)
+                self.gzipped_bytes -= len(evicted)
+        return body
+
+FILE_CACHE = FileCache()
+
+def is_public_path(relative_path):
+    """Whether a path relative to the served directory (with / separators) may be served."""
+    parts = relative_path.split('/')
+    if any(not part or part.startswith('.') for part in parts):
+        return False
+    return PUBLIC_FILES.fullmatch(relative_path) is not None
+
+class ResultsRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Static files with compression, ETag/304 revalidation and Range support."""
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle's algorithm on, keep-alive clients
+    # wait out a delayed ACK (~40 ms) on every response
+    disable_nagle_algorithm = True
+
+    def end_headers(self):
+        # Add CORS headers to allow local file access
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, HEAD, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, If-None-Match, Range')
+        super().end_headers()
+
+    def guess_type(self, path):
+        # Ensure JSON files are served with correct MIME type
+        if path.endswith('.json'):
+            return 'application/json'
+        return super().guess_type(path)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def do_OPTIONS(self):
+        self.send_response(HTTPStatus.NO_CONTENT)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == QUERY_PATH:
+            self.serve_query(send_body=True)
+        elif path == EVENTS_PATH:
+            self.serve_events()
+        else:
+            self.serve_file(send_body=True)
+
+    def do_HEAD(self):
+        if urlsplit(self.path).path == QUERY_PATH:
+            self.serve_query(send_body=False)
+        else:
+            self.serve_file(send_body=False)
+
+    def send_json(self, status, payload, send_body=True, etag=None):
+        """A JSON response, gzipped when the client accepts it and it's worth it."""
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        encoding = None
+        if 'gzip' in accepted_encodings(self.headers.get('Accept-Encoding')) and len(body) >= MIN_COMPRESS_BYTES:
+            body = gzip.compress(body, compresslevel=6, mtime=0)
+            encoding = 'gzip'
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Content-Type', 'application/json')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def serve_query(self, send_body):
+        """Answer /api/results from the results index."""
+        query_string = urlsplit(self.path).query
+        try:
+            version, index = self.server.results_index.current()
+        except OSError:
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': 'No results available yet'}, send_body)
+            return
+        # Same results file + same query = same answer
+        digest = hashlib.sha1(query_string.encode('utf-8')).hexdigest()[:12]
+        etag = f'"q{version[0]:x}-{version[1]:x}-{digest}"'
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match and etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            return
+        try:
+            payload = index.query(**parse_query(parse_qs(query_string)))
+        except QueryError as e:
+            self.send_json(HTTPStatus.BAD_REQUEST, {'error': str(e)}, send_body)
+            return
+        self.send_json(HTTPStatus.OK, payload, send_body, etag)
+
+    def serve_events(self):
+        """Start an SSE stream, then hand the connection to the event hub."""
+        hub = self.server.event_hub
+        if hub is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "Live updates are not enabled")
+            return
+        if not hub.reserve():
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': 'Too many live update clients'})
+            return
+        # The slot is only the hub's once it has the connection; until then any failure
+        # (a client hanging up mid-headers, say) must give it back
+        added = False
+        try:
+            try:
+                version, index = self.server.results_index.current()
+                current = {'version': version_id(version), 'last_updated_pst': index.header.get('last_updated_pst')}
+            except OSError:
+                current = {'version': None, 'last_updated_pst': None}
+
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('X-Accel-Buffering', 'no')
+            self.end_headers()
+            initial = f"retry: {RETRY_MILLISECONDS}\n\n".encode('utf-8')
+            # A reconnecting client that missed a change reloads instead of waiting for the next one
+            last_event_id = self.headers.get('Last-Event-ID')
+            event = 'reload' if last_event_id and last_event_id != current['version'] else 'hello'
+            initial += format_event(event, current, current['version'])
+
+            self.close_connection = True
+            self.server.detach(self.connection)
+            hub.add(self.connection, initial)
+            added = True
+        finally:
+            if not added:
+                hub.release()
+
+    def resolve_path(self):
+        """Filesystem path for the request, or None after sending a redirect/error."""
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            url_path = self.path.split('?', 1)[0].split('#', 1)[0]
+            if not url_path.endswith('/'):
+                self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+                self.send_header('Location', url_path + '/')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+            path = os.path.join(path, 'index.html')
+        relative_path = os.path.relpath(path, self.directory).replace(os.sep, '/')
+        if not is_public_path(relative_path) or not os.path.isfile(path):
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+        return path
+
+    def select_representation(self, path, content_type):
+        """
+        (encoding or None, file path or None, in-memory body or None, stat) of the best
+        representation of `path` for this client.
+        """
+        stat = os.stat(path)
+        accepted = accepted_encodings(self.headers.get('Accept-Encoding'))
+        for encoding, suffix in PRECOMPRESSED:
+            if encoding not in accepted:
+                continue
+            try:
+                encoded_stat = os.stat(path + suffix)
+            except OSError:
+                continue
+            # A copy older than the file it was made from is stale
+            if encoded_stat.st_mtime_ns >= stat.st_mtime_ns:
+                return encoding, path + suffix, None, encoded_stat
+        if ('gzip' in accepted and content_type.startswith(COMPRESSIBLE_TYPES)
+                and MIN_COMPRESS_BYTES <= stat.st_size <= MAX_COMPRESS_BYTES):
+            return 'gzip', None, FILE_CACHE.gzip(path, stat), stat
+        return None, path, None, stat
+
+    def serve_file(self, send_body):
+        path = self.resolve_path()
+        if path is None:
+            return
+        content_type = self.guess_type(path)
+        try:
+            encoding, body_path, body, stat = self.select_representation(path, content_type)
+            # Strong validator per representation: content digest of the file plus the coding
+            etag = f'"{FILE_CACHE.etag(path, os.stat(path))}{"-" + encoding if encoding else ""}"'
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        size = len(body) if body is not None else stat.st_size
+
+        if self.not_modified(etag, stat.st_mtime):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_validators(etag, last_modified, content_type)
+            self.end_headers()
+            return
+
+        byte_range = None
+        if_range = self.headers.get('If-Range')
+        if if_range is None or if_range == etag or if_range == last_modified:
+            byte_range = parse_range(self.headers.get('Range'), size)
+        if byte_range == 'unsatisfiable':
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start, end = byte_range or (0, size - 1)
+        length = max(0, end - start + 1)
+        self.send_response(HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK)
+        self.send_validators(etag, last_modified, content_type)
+        self.send_header('Content-Type', content_type)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Accept-Ranges', 'bytes')
+        if byte_range:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        if not send_body or length == 0:
+            return
+
+        if body is not None:
+            self.wfile.write(body[start:end + 1])
+            return
+        with open(body_path, 'rb') as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(64 * 1024, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def not_modified(self, etag, mtime):
+        """Whether the client's cached copy is current (If-None-Match wins over If-Modified-Since)."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return since is not None and int(mtime) <= since.timestamp()
+        return False
+
+    def send_validators(self, etag, last_modified, content_type):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.send_header('Vary', 'Accept-Encoding')
+        if content_type == 'application/json':
+            self.send_header('Cache-Control', 'no-cache')
+        else:
+            self.send_header('Cache-Control', f'public, max-age={STATIC_MAX_AGE}')
+
+class ResultsServer(http.server.ThreadingHTTPServer):
+    """Thread per connection; worker threads don't hold up shutdown."""
+    daemon_threads = True
+    quiet = False
+    results_index = None
+    event_hub = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.detached = set()
+        self.detached_lock = threading.Lock()
+
+    def detach(self, request):
+        """Keep a connection open after its handler returns (it now belongs to the event hub)."""
+        with self.detached_lock:
+            self.detached.add(request)
+
+    def shutdown_request(self, request):
+        with self.detached_lock:
+            if request in self.detached:
+                self.detached.discard(request)
+                return
+        super().shutdown_request(request)
 
 def main():
-    PORT = 8000
-    
+    parser = argparse.ArgumentParser(description='Serve the campsite search results locally')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--bind', default='', help='Address to bind to (default: all interfaces)')
+    parser.add_argument('--directory', default='.', help='Directory to serve (default: current directory)')
+    parser.add_argument('--headless', action='store_true', help="Don't open a browser")
+    parser.add_argument('--quiet', action='store_true', help="Don't log each request")
+    parser.add_argument('--no-events', action='store_true', help="Disable the live update stream")
+    args = parser.parse_args()
+
     # Check if required files exist
     required_files = ['index.html', 'results.json']
     for file in required_files:
-        if not Path(file).exists():
+        if not (Path(args.directory) / file).exists():
             print(f"❌ Error: {file} not found")
             print("Make sure you're in the project directory and have run the search.")
             return
-    
+
+    host = args.bind or 'localhost'
+    url = f'http://{host}:{args.port}'
     print(f"🏕️ Starting local server for Bay Area Camping Tracker")
-    print(f"📍 Server running at: http://localhost:{PORT}")
-    print(f"🌐 Opening browser...")
+    print(f"📍 Server running at: {url}")
+    if not args.headless:
+        print(f"🌐 Opening browser...")
     print(f"⏹️  Press Ctrl+C to stop the server")
     print("=" * 50)
-    
-    # Create custom handler to serve files with correct MIME types
-    class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-        def end_headers(self):
-            # Add CORS headers to allow local file access
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            super().end_headers()
-        
-        def guess_type(self, path):
-            # Ensure JSON files are served with correct MIME type
-            if path.endswith('.json'):
-                return 'application/json'
-            return super().guess_type(path)
-    
+
+    directory = os.path.abspath(args.directory)
+
+    class Handler(ResultsRequestHandler):
+        def __init__(self, *handler_args, **handler_kwargs):
+            super().__init__(*handler_args, directory=directory, **handler_kwargs)
+
     try:
-        with socketserver.TCPServer(("", PORT), CustomHTTPRequestHandler) as httpd:
-            # Open browser
-            webbrowser.open(f'http://localhost:{PORT}')
-            
+        with ResultsServer((args.bind, args.port), Handler) as httpd:
+            httpd.quiet = args.quiet
+            httpd.results_index = ResultsIndexStore(os.path.join(directory, 'results.json'))
+            httpd.results_index.current()  # Build the indexes before the first query
+            if not args.no_events:
+                httpd.event_hub = EventHub()
+                httpd.results_index.listeners.append(
+                    lambda previous, current: httpd.event_hub.broadcast(change_event(previous, current)))
+            httpd.results_index.watch()
+            if not args.headless:
+                webbrowser.open(url)
+
             # Start server
             httpd.serve_forever()
-            
+
     except KeyboardInterrupt:
         print(f"\n🛑 Server stopped")
     except OSError as e:
         if "Address already in use" in str(e):
-            print(f"❌ Port {PORT} is already in use. Try closing other applications or use a different port.")
+            print(f"❌ Port {args.port} is already in use. Try closing other applications or use --port.")
         else:
             print(f"❌ Error starting server: {e}")
 
@@ -0,0 +1,570 @@
+"""
+Sharded crawl: the (provider, campground, window) job space on a durable local work queue.
+
+run_batches.py searches each provider batch as one job list inside one process. With --workers
+(or by hand, below) the same search is split into one work item per campground per planned
+search window and put on a SQLite queue:
+
+- plan:   the crawl's settings (dates, stay profiles, site rules) and its items go on the queue.
+- work:   any number of workers - processes on this machine, or on machines sharing the volume
+          the queue lives on - claim items with a lease, search them and write each item's
+          filtered site-nights to a shard file (checkpoints.py format). A worker renews its
+          leases while it runs; items of a worker that died go back to the queue when the lease
+          runs out. Failed items are retried (up to MAX_ATTEMPTS) by whichever worker comes next.
+- reduce: once the queue is drained, the shards are folded into one night bitmap, the stay
+          profiles are derived and results.json is written as by main.py.
+
+Items are small and independent, so crawl time scales down with the number of workers until
+the providers' rate limits (paced per worker process, see rate_limit.py) are the bottleneck.
+
+    python sharded_crawl.py plan --queue-dir /mnt/shared/crawl
+    python sharded_crawl.py work --queue-dir /mnt/shared/crawl      # on each machine, as often as wanted
+    python sharded_crawl.py status --queue-dir /mnt/shared/crawl
+    python sharded_crawl.py reduce --queue-dir /mnt/shared/crawl
+
+The queue uses SQLite's default rollback journal rather than WAL, which needs shared memory and
+so doesn't work across machines. Lease expiry compares wall clocks, so workers on other machines
+need synchronized clocks (NTP).
+"""
+
+import argparse
+import contextlib
+import datetime
+import itertools
+import json
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from dateutil.relativedelta import relativedelta
+from campsites_map import load_catalog
+from checkpoints import CheckpointStore
+from distances import get_distance_engine, ORIGINS, DEFAULT_ORIGIN
+from metrics import get_metrics, record_response_cache_stats, DEFAULT_METRICS_DIR
+from rate_limit import configure_rate_limit
+from response_cache import configure_response_cache, DEFAULT_CACHE_PATH
+from results_delta import unsearched_checkins
+from run_changes import record_run_changes
+from results_format import iter_result_rows
+from result_records import ResultSet
+from availability_history import DEFAULT_HISTORY_PATH
+from watch_alerts import DEFAULT_WATCHES_PATH, DEFAULT_OUTBOX_DIR
+from site_filters import SiteFilter, SiteRule, SITE_FILTERS_PATH
+from stay_profiles import NightBitmapBuilder, get_profiles, DEFAULT_PROFILES, STAY_PROFILES
+from window_planner import candidate_stays, plan_stay_jobs
+
+DEFAULT_QUEUE_DIR = os.path.join('.cache', 'crawl')
+QUEUE_FILE = 'queue.sqlite'
+SHARDS_DIR = 'shards'
+# A worker's claim on an item lapses this long after its last renewal (seconds)
+DEFAULT_LEASE_SECONDS = 300
+# Claims (including lapsed leases) an item gets before it is marked failed
+MAX_ATTEMPTS = 3
+# Items a worker searches at the same time
+DEFAULT_WORKER_SLOTS = 3
+# How long a worker without work waits for leased items to finish or lapse before exiting
+IDLE_POLL_SECONDS = 5
+
+def queue_paths(queue_dir=DEFAULT_QUEUE_DIR):
+    """(queue database, shard directory) inside a queue directory."""
+    return os.path.join(queue_dir, QUEUE_FILE), os.path.join(queue_dir, SHARDS_DIR)
+
+def default_worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class WorkQueue:
+    """
+    SQLite queue of one crawl's work items, shared by every worker process.
+    Item status: pending -> leased -> done, or back to pending (retry) / failed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        # Autocommit mode; claims take the write lock up front with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS crawl (
+                id TEXT PRIMARY KEY,
+                created_at REAL,
+                settings TEXT
+            );
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                provider TEXT,
+                campground_id TEXT,
+                windows TEXT,
+                status TEXT DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER DEFAULT 0,
+                error TEXT,
+                seconds REAL,
+                site_nights INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS items_status ON items (status, id);
+        """)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def create(self, settings, items):
+        """Replace whatever crawl the queue held with a new one; returns the new crawl id."""
+        crawl_id = uuid.uuid4().hex[:12]
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM crawl")
+            conn.execute("DELETE FROM items")
+            conn.execute("INSERT INTO crawl (id, created_at, settings) VALUES (?, ?, ?)",
+                         (crawl_id, time.time(), json.dumps(settings, sort_keys=True)))
+            conn.executemany("INSERT INTO items (provider, campground_id, windows) VALUES (?, ?, ?)",
+                             [(provider, campground_id, json.dumps(windows)) for provider, campground_id, windows in items])
+        return crawl_id
+
+    def crawl(self):
+        """(crawl id, settings) of the queued crawl, or (None, None) if nothing was planned."""
+        with self.lock:
+            row = self.conn.execute("SELECT id, settings FROM crawl").fetchone()
+        return (row[0], json.loads(row[1])) if row else (None, None)
+
+    def claim(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        """
+        Lease the next pending item (or one whose lease lapsed) to `worker`.
+        Returns the item as a dict, or None when nothing is claimable right now.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            while True:
+                row = conn.execute("""
+                    SELECT id, provider, campground_id, windows, attempts FROM items
+                    WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                    ORDER BY id LIMIT 1
+                """, (now,)).fetchone()
+                if row is None:
+                    return None
+                item_id, provider, campground_id, windows, attempts = row
+                if attempts >= max_attempts:
+                    # Its last worker died (or hung) holding it too many times
+                    conn.execute("UPDATE items SET status = 'failed', error = ? WHERE id = ?",
+                                 (f"Lease lapsed after {attempts} attempts", item_id))
+                    continue
+                conn.execute("UPDATE items SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                             "WHERE id = ?", (worker, now + lease_seconds, item_id))
+                return {'id': item_id, 'provider': provider, 'campground_id': campground_id,
+                        'windows': [(datetime.date.fromisoformat(start), datetime.date.fromisoformat(end))
+                                    for start, end in json.loads(windows)],
+                        'attempt': attempts + 1}
+
+    def renew(self, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend every lease `worker` holds; returns how many it holds."""
+        with self.transaction() as conn:
+            return conn.execute("UPDATE items SET lease_expires = ? WHERE worker = ? AND status = 'leased'",
+                                (time.time() + lease_seconds, worker)).rowcount
+
+    def complete(self, item_id, worker, seconds=None, site_nights=None):
+        """
+        Mark a leased item done. Returns False if the lease was lost meanwhile (it lapsed and
+        another worker claimed the item), in which case the other worker's outcome counts.
+        """
+        with self.transaction() as conn:
+            return conn.execute("""
+                UPDATE items SET status = 'done', lease_expires = NULL, error = NULL, seconds = ?, site_nights = ?
+                WHERE id = ? AND worker = ? AND status = 'leased'
+            """, (seconds, site_nights, item_id, worker)).rowcount == 1
+
+    def fail(self, item_id, worker, error, retry=True, max_attempts=MAX_ATTEMPTS):
+        """
+        Record a failed attempt: back to pending for another worker while attempts remain
+        and `retry` is set, failed otherwise. Returns the item's new status (None if the lease was lost).
+        """
+        with self.transaction() as conn:
+            row = conn.execute("SELECT attempts FROM items WHERE id = ? AND worker = ? AND status = 'leased'",
+                               (item_id, worker)).fetchone()
+            if row is None:
+                return None
+            status = 'pending' if retry and row[0] < max_attempts else 'failed'
+            conn.execute("UPDATE items SET status = ?, lease_expires = NULL, error = ? WHERE id = ?",
+                         (status, error, item_id))
+            return status
+
+    def requeue_failed(self):
+        """Give failed items a fresh set of attempts; returns how many were requeued."""
+        with self.transaction() as conn:
+            return conn.execute("UPDATE items SET status = 'pending', attempts = 0 WHERE status = 'failed'").rowcount
+
+    def counts(self):
+        """Items per status, counting lapsed leases as pending."""
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT CASE WHEN status = 'leased' AND lease_expires < ? THEN 'pending' ELSE status END, COUNT(*)
+                FROM items GROUP BY 1
+            """, (time.time(),)).fetchall()
+        return Counter(dict(rows))
+
+    def items(self, status=None):
+        """Items as dicts, optionally only those with a status."""
+        query = "SELECT id, provider, campground_id, windows, status, worker, attempts, error, seconds, site_nights FROM items"
+        with self.lock:
+            rows = self.conn.execute(query + (" WHERE status = ?" if status else "") + " ORDER BY id",
+                                     (status,) if status else ()).fetchall()
+        fields = ('id', 'provider', 'campground_id', 'windows', 'status', 'worker', 'attempts', 'error', 'seconds', 'site_nights')
+        return [dict(zip(fields, row)) for row in rows]
+
+    def workers(self):
+        """{worker: leases held} for live leases."""
+        with self.lock:
+            return dict(self.conn.execute("SELECT worker, COUNT(*) FROM items WHERE status = 'leased' AND lease_expires >= ? "
+                                          "GROUP BY worker", (time.time(),)).fetchall())
+
+def shard_key(crawl_id, item_id):
+    return f"{crawl_id}_{item_id:06d}"
+
+def crawl_settings(start_date, end_date, profiles=None, site_filters_path=SITE_FILTERS_PATH):
+    """
+    Everything a worker needs to search an item the same way as every other worker, including
+    the site rules themselves (machines may have different copies of site_filters.json).
+    """
+    with open(site_filters_path, 'r') as f:
+        site_rules = json.load(f).get('rules', [])
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'profiles': list(profiles or DEFAULT_PROFILES),
+        'site_rules': site_rules
+    }
+
+def plan_items(start_date, end_date, profiles=None, providers=None, catalog=None):
+    """
+    Work items [(provider, campground_id, windows)] covering every candidate stay of the stay
+    profiles: each provider's planned search jobs (see window_planner), split per campground.
+    Providers are interleaved so every worker keeps all of them busy.
+    """
+    catalog = catalog or load_catalog()
+    stay_profiles = get_profiles(profiles or DEFAULT_PROFILES)
+    stays = [stay for profile in stay_profiles
+             for stay in candidate_stays(start_date, end_date, profile.nights, profile.checkin_weekdays)]
+    per_provider = []
+    for provider in providers or list(catalog.by_provider):
+        windows = [[(start.isoformat(), end.isoformat()) for start, end in job.windows]
+                   for job in plan_stay_jobs(stays, provider)]
+        per_provider.append([(provider, campground_id, job_windows)
+                             for job_windows in windows for campground_id in catalog.campground_ids(provider)])
+    return [item for group in itertools.zip_longest(*per_provider) for item in group if item is not None]
+
+def plan_crawl(queue_dir=DEFAULT_QUEUE_DIR, start_date=None, end_date=None, profiles=None,
+               site_filters_path=SITE_FILTERS_PATH, providers=None, resume=False):
+    """
+    Put a crawl on the queue in queue_dir, replacing the previous one and its shards.
+    With resume, a queued crawl with the same settings is kept instead (its failed items are
+    requeued), so an interrupted crawl picks up where it stopped. Returns the crawl id.
+    """
+    start_date = start_date or datetime.date.today() + relativedelta(days=1)
+    end_date = end_date or start_date + relativedelta(months=6)
+    settings = crawl_settings(start_date, end_date, profiles, site_filters_path)
+    queue_path, shard_dir = queue_paths(queue_dir)
+    queue = WorkQueue(queue_path)
+    try:
+        crawl_id, queued_settings = queue.crawl()
+        if resume and crawl_id is not None and queued_settings == settings:
+            requeued = queue.requeue_failed()
+            counts = queue.counts()
+            print(f"📋 Resuming crawl {crawl_id}: {counts['done']} of {sum(counts.values())} items done, "
+                  f"{requeued} failed items requeued")
+            return crawl_id
+
+        items = plan_items(start_date, end_date, settings['profiles'], providers)
+        CheckpointStore(shard_dir).clear()
+        crawl_id = queue.create(settings, items)
+        providers_count = Counter(provider for provider, _, _ in items)
+        print(f"📋 Planned crawl {crawl_id}: {len(items)} work items from {start_date} to {end_date} "
+              f"({', '.join(f'{provider} {count}' for provider, count in providers_count.items())})")
+        return crawl_id
+    finally:
+        queue.close()
+
+def run_worker(queue_dir=DEFAULT_QUEUE_DIR, worker=None, slots=DEFAULT_WORKER_SLOTS, lease_seconds=DEFAULT_LEASE_SECONDS,
+               window_timeout=60, time_budget=None):
+    """
+    Claim and search items from the queue until none are left (or time_budget seconds have
+    passed), with `slots` items in flight. Returns {'done': n, 'retried': n, 'failed': n}.
+    """
+    # Imported here so planning, status and reduce never pay for the camply import
+    from deadlines import DeadlineExceeded, RunBudget
+    from search_engine import SearchJob, run_search_jobs, is_transient_error
+
+    worker = worker or default_worker_name()
+    queue_path, shard_dir = queue_paths(queue_dir)
+    queue = WorkQueue(queue_path)
+    crawl_id, settings = queue.crawl()
+    if crawl_id is None:
+        print(f"❌ No crawl planned in {queue_dir}")
+        queue.close()
+        return Counter()
+
+    shards = CheckpointStore(shard_dir, max_age=math.inf)
+    site_filter = SiteFilter(tuple(SiteRule(rule) for rule in settings['site_rules']))
+    metrics = get_metrics()
+    outcomes = Counter()
+    outcomes_lock = threading.Lock()
+    stop = threading.Event()
+    stop_claiming_at = time.monotonic() + time_budget if time_budget else math.inf
+
+    def heartbeat():
+        while not stop.wait(lease_seconds / 3):
+            queue.renew(worker, lease_seconds)
+
+    def search_item(item):
+        provider = item['provider']
+        windows = item['windows']
+        job = SearchJob(provider, windows[0][0], max(end for _, end in windows), [item['campground_id']],
+                        index=item['id'], windows=windows)
+        label = f"{provider} {item['campground_id']} {job.label}"
+
+        def filter_results(results):
+            metrics.inc('site_nights_fetched', len(results), provider=provider, batch='sharded')
+            with metrics.timer('filter', provider=provider, batch='sharded'):
+                return site_filter.filter(results, provider)
+
+        budget = RunBudget(window_seconds=window_timeout)
+        window = next(run_search_jobs([job], 1, False, result_filter=filter_results, max_in_flight=1, budget=budget))
+        metrics.record_window(provider, 'sharded', label, window.seconds, window.attempts, len(window.results), window.error)
+        if window.error is None:
+            shards.save(shard_key(crawl_id, item['id']), job, window.results, attempts=window.attempts)
+            if queue.complete(item['id'], worker, round(window.seconds, 3), len(window.results)):
+                print(f"  [{worker}] {label}: {len(window.results)} site-nights in {window.seconds:.1f}s")
+                return 'done'
+            print(f"  [{worker}] {label}: lease lost, result discarded")
+            return 'lost'
+        error = f"{type(window.error).__name__}: {window.error}"
+        retry = is_transient_error(window.error) or isinstance(window.error, DeadlineExceeded)
+        status = queue.fail(item['id'], worker, error, retry)
+        print(f"  [{worker}] {label} failed (attempt {item['attempt']}): {error}"
+              f"{' - requeued' if status == 'pending' else ''}")
+        return 'retried' if status == 'pending' else 'failed'
+
+    def slot():
+        while not stop.is_set() and time.monotonic() < stop_claiming_at:
+            item = queue.claim(worker, lease_seconds)
+            if item is None:
+                # Items leased by other workers may still come back if their lease lapses
+                if not queue.counts()['leased']:
+                    return
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+            outcome = search_item(item)
+            metrics.inc('work_items', outcome=outcome)
+            with outcomes_lock:
+                outcomes[outcome] += 1
+
+    print(f"👷 Worker {worker} crawling {crawl_id} with {slots} slots")
+    renewer = threading.Thread(target=heartbeat, name='lease-renewal', daemon=True)
+    renewer.start()
+    started = time.monotonic()
+    try:
+        threads = [threading.Thread(target=slot, name=f'slot-{i}') for i in range(max(1, slots))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        stop.set()
+        queue.close()
+    print(f"👷 Worker {worker} finished in {time.monotonic() - started:.1f}s: "
+          f"{outcomes['done']} done, {outcomes['retried']} retried, {outcomes['failed']} failed")
+    return outcomes
+
+def reduce_shards(queue_dir=DEFAULT_QUEUE_DIR, allow_partial=False, origin=DEFAULT_ORIGIN, write_variants=True):
+    """
+    Fold every finished item's shard into one night bitmap, derive the stay profiles and save
+    results.json (and results_<profile>.json for the other profiles), like main.py.
+    Returns the results.json payload, or None if items are still outstanding (unless
+    allow_partial) or nothing was planned.
+    """
+    from main import save_results_to_json, build_results_data, write_results_data
+
+    queue_path, shard_dir = queue_paths(queue_dir)
+    queue = WorkQueue(queue_path)
+    try:
+        crawl_id, settings = queue.crawl()
+        counts = queue.counts()
+        items = queue.items()
+    finally:
+        queue.close()
+    if crawl_id is None:
+        print(f"❌ No crawl planned in {queue_dir}")
+        return None
+    outstanding = counts['pending'] + counts['leased']
+    if outstanding and not allow_partial:
+        print(f"⏳ Crawl {crawl_id} still has {outstanding} items pending or leased; not reducing")
+        return None
+
+    metrics = get_metrics()
+    start_date = datetime.date.fromisoformat(settings['start_date'])
+    end_date = datetime.date.fromisoformat(settings['end_date'])
+    stay_profiles = get_profiles(settings['profiles'])
+    primary_profile = stay_profiles[0]
+    miles_lookup = get_distance_engine().miles_lookup(origin)
+    url_lookup = load_catalog().url_lookup
+
+    with metrics.timer('reduce'):
+        shards = CheckpointStore(shard_dir, max_age=math.inf)
+        nights = NightBitmapBuilder(start_date, end_date)
+        done = [item for item in items if item['status'] == 'done']
+        failed = [item for item in items if item['status'] == 'failed']
+        unsearched = [item for item in items if item['status'] != 'done']
+        missing = 0
+        for item in done:
+            records = shards.load(shard_key(crawl_id, item['id']))
+            if records is None:
+                missing += 1
+                unsearched.append(item)
+                continue
+            nights.add(records)
+        night_bitmap = nights.build()
+        profile_results = {profile.name: ResultSet(miles_lookup, url_lookup, night_bitmap.iter_stays(profile))
+                           for profile in stay_profiles}
+    results = profile_results[primary_profile.name]
+    metrics.set('results', len(results), batch='sharded')
+
+    errors = [f"{item['provider']} {item['campground_id']}: {item['error']}" for item in failed]
+    errors += [f"{missing} finished items had no shard"] if missing else []
+    errors += [f"{outstanding} items were not searched"] if outstanding else []
+    if not errors:
+        search_status, error_message = "success", None
+    elif results:
+        search_status, error_message = "partial", f"Some searches failed: {'; '.join(errors)}"
+    else:
+        search_status, error_message = "error", f"All searches failed: {'; '.join(errors)}"
+
+    search_criteria = {
+        "start_date": settings['start_date'],
+        "end_date": settings['end_date'],
+        "consecutive_nights": primary_profile.nights,
+        "weekends_only": primary_profile.name == 'weekend',
+        "stay_profile": primary_profile.name,
+        "origin": origin,
+        "planner": "stays",
+        "work_items": sum(counts.values())
+    }
+    # The windows of unfinished items, so a partial crawl's delta and history leave those dates alone
+    if search_status == "partial":
+        unsearched = unsearched_checkins([([item['campground_id']], datetime.date.fromisoformat(start), datetime.date.fromisoformat(end))
+                                          for item in unsearched for start, end in json.loads(item['windows'])],
+                                         primary_profile.nights)
+    else:
+        unsearched = None
+    print(f"🧩 Reduced {len(done) - missing} shards of crawl {crawl_id}: {len(results)} available stays")
+    output_data = save_results_to_json(results, miles_lookup, url_lookup, search_criteria, 'sharded',
+                                       search_status=search_status, error_message=error_message,
+                                       write_variants=write_variants, unsearched=unsearched)
+    for profile_name, stays in profile_results.items():
+        if profile_name == primary_profile.name:
+            continue
+        profile_criteria = dict(search_criteria, stay_profile=profile_name, consecutive_nights=STAY_PROFILES[profile_name].nights)
+        write_results_data(build_results_data(stays, miles_lookup, url_lookup, profile_criteria, 'sharded',
+                                              search_status, error_message), f"results_{profile_name}.json")
+        print(f"Stay profile {profile_name} saved to results_{profile_name}.json ({len(stays)} stays)")
+    return output_data
+
+def print_status(queue_dir=DEFAULT_QUEUE_DIR):
+    queue = WorkQueue(queue_paths(queue_dir)[0])
+    try:
+        crawl_id, settings = queue.crawl()
+        if crawl_id is None:
+            print(f"No crawl planned in {queue_dir}")
+            return
+        counts = queue.counts()
+        total = sum(counts.values())
+        print(f"Crawl {crawl_id}: {settings['start_date']} to {settings['end_date']}, profiles {', '.join(settings['profiles'])}")
+        print(f"{counts['done']}/{total} done, {counts['leased']} leased, {counts['pending']} pending, {counts['failed']} failed")
+        for worker, leases in sorted(queue.workers().items()):
+            print(f"  {worker}: {leases} items in flight")
+        for item in queue.items('failed'):
+            print(f"  failed: {item['provider']} {item['campground_id']} after {item['attempts']} attempts: {item['error']}")
+    finally:
+        queue.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Sharded campsite crawl over a shared work queue')
+    parser.add_argument('--queue-dir', type=str, default=DEFAULT_QUEUE_DIR,
+                        help='Directory holding the queue and shards (on a shared volume for several machines)')
+    parser.add_argument('--metrics-dir', type=str, default=DEFAULT_METRICS_DIR,
+                        help='Directory for the run metrics; empty to disable')
+    commands = parser.add_subparsers(dest='command', required=True)
+    plan = commands.add_parser('plan', help='Queue a new crawl, replacing the previous one')
+    plan.add_argument('--start-date', type=str, help='Start date in YYYY-MM-DD format (default: tomorrow)')
+    plan.add_argument('--end-date', type=str, help='End date in YYYY-MM-DD format (default: six months later)')
+    plan.add_argument('--profiles', type=str, default=','.join(DEFAULT_PROFILES),
+                      help=f"Comma-separated stay profiles ({', '.join(STAY_PROFILES)}); the first is saved to results.json")
+    plan.add_argument('--site-filters', type=str, default=SITE_FILTERS_PATH, help='JSON file with the site rules')
+    plan.add_argument('--resume', action='store_true', help='Keep a queued crawl with the same settings')
+    work = commands.add_parser('work', help='Claim and search items until the queue is drained')
+    work.add_argument('--worker', type=str, help='Worker name (default: <host>-<pid>)')
+    work.add_argument('--slots', type=int, default=DEFAULT_WORKER_SLOTS, help='Items searched at the same time')
+    work.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS, help='Lease length in seconds')
+    work.add_argument('--window-timeout', type=float, default=60, help='Maximum time in seconds for one item')
+    work.add_argument('--time-budget', type=float, help='Stop claiming new items after this many seconds')
+    work.add_argument('--requests-per-second', type=float,
+                      help='Starting request rate per provider for this worker (adapts to 429/5xx responses)')
+    work.add_argument('--cache-path', type=str, default=DEFAULT_CACHE_PATH, help='SQLite file for the provider response cache')
+    work.add_argument('--no-cache', action='store_true', help='Disable the provider response cache')
+    commands.add_parser('status', help='Show the progress of the queued crawl')
+    reduce = commands.add_parser('reduce', help='Merge the shards into results.json')
+    reduce.add_argument('--allow-partial', action='store_true', help='Reduce even with items still outstanding')
+    reduce.add_argument('--origin', type=str, default=DEFAULT_ORIGIN, choices=list(ORIGINS),
+                        help='Origin to measure distances from (see distances.py)')
+    reduce.add_argument('--history-path', type=str, default=DEFAULT_HISTORY_PATH,
+                        help='SQLite availability history fed with the results (see availability_history.py); empty to disable')
+    reduce.add_argument('--watches-path', type=str, default=DEFAULT_WATCHES_PATH,
+                        help='Watch store matched against the new availability (see watch_alerts.py); empty to disable')
+    reduce.add_argument('--outbox', type=str, default=DEFAULT_OUTBOX_DIR, help='Spool directory for watch matches')
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        start_date = datetime.date.fromisoformat(args.start_date) if args.start_date else None
+        end_date = datetime.date.fromisoformat(args.end_date) if args.end_date else None
+        plan_crawl(args.queue_dir, start_date, end_date, [name.strip() for name in args.profiles.split(',') if name.strip()],
+                   args.site_filters, resume=args.resume)
+    elif args.command == 'work':
+        if args.requests_per_second:
+            for provider in load_catalog().by_provider:
+                configure_rate_limit(provider, rate=args.requests_per_second)
+        configure_response_cache(None if args.no_cache else args.cache_path)
+        worker = args.worker or default_worker_name()
+        outcomes = run_worker(args.queue_dir, worker, args.slots, args.lease, args.window_timeout, args.time_budget)
+        if args.metrics_dir:
+            record_response_cache_stats()
+            get_metrics().export(args.metrics_dir, f"worker_{worker}", outcomes=dict(outcomes))
+    elif args.command == 'status':
+        print_status(args.queue_dir)
+    elif args.command == 'reduce':
+        output_data = reduce_shards(args.queue_dir, args.allow_partial, args.origin)
+        if output_data is None:
+            exit(1)
+        # The reduced results.json is the run's final result, so record what changed since the last run
+        record_run_changes(lambda: iter_result_rows('results.json'), output_data['search_status'],
+                           output_data['search_criteria']['start_date'], output_data['search_criteria']['end_date'], 'sharded',
+                           output_data.get('unsearched'), args.watches_path, args.outbox, args.history_path)
+        if args.metrics_dir:
+            get_metrics().export(args.metrics_dir, 'reduce', search_status=output_data['search_status'])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Configurable site exclusion rules.
+
+Rules are loaded from site_filters.json:
+
+    {"rules": [
+      {"name": "hike-in", "action": "exclude", "site_contains": ["Hike"]},
+      {"name": "day-use", "action": "exclude", "site_contains_ci": ["day"]},
+      {"name": "keep-group", "action": "include", "provider": "recreation_gov", "site_regex": "^Group"},
+      {"name": "kirby-cove-day-use", "action": "exclude", "facility": "232491", "url_contains": ["4241"]}
+    ]}
+
+- Scope: a rule applies everywhere unless it names a "provider" and/or "facility" (an id or a list of ids).
+- Matchers: site_contains (case-sensitive), site_contains_ci (case-insensitive) and site_regex test
+  campsite_site_name; url_contains tests booking_url. Values within a matcher are alternatives;
+  when a rule has several matchers, all of them must match.
+- Verdict: a site is dropped when an exclude rule matches and no include rule does.
+
+The rules that apply to a (provider, facility) are compiled into one matcher with a single
+alternation regex per action, and verdicts are memoized per campsite_site_name (plus booking_url
+for facilities with URL rules), since the same names recur in every window and on every date.
+Rules testing booking_url, and site_regex patterns with capturing groups of their own (whose
+backreferences and group names would break inside the alternation), are matched one by one.
+Each rule counts the results it dropped (or kept, for include rules).
+"""
+
+import json
+import os
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+
+SITE_FILTERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'site_filters.json')
+
+ACTIONS = ('exclude', 'include')
+
+def _as_list(value):
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+class SiteRule:
+    """One include/exclude rule from the config."""
+    __slots__ = ('name', 'action', 'providers', 'facilities', 'site_pattern', 'site_regex', 'url_pattern')
+
+    def __init__(self, config):
+        self.name = config['name']
+        self.action = config.get('action', 'exclude')
+        if self.action not in ACTIONS:
+            raise ValueError(f"Site rule {self.name!r}: unknown action {self.action!r}")
+        self.providers = set(_as_list(config.get('provider')))
+        self.facilities = {str(facility_id) for facility_id in _as_list(config.get('facility'))}
+
+        site_patterns = [re.escape(text) for text in _as_list(config.get('site_contains'))]
+        site_patterns += [f"(?i:{re.escape(text)})" for text in _as_list(config.get('site_contains_ci'))]
+        site_patterns += [f"(?:{pattern})" for pattern in _as_list(config.get('site_regex'))]
+        self.site_pattern = '|'.join(site_patterns) or None
+        url_patterns = [re.escape(text) for text in _as_list(config.get('url_contains'))]
+        self.url_pattern = re.compile('|'.join(url_patterns)) if url_patterns else None
+        if self.site_pattern is None and self.url_pattern is None:
+            raise ValueError(f"Site rule {self.name!r} has no matcher")
+        # Compiled when loading, so bad regexes fail here and not mid-search
+        self.site_regex = re.compile(self.site_pattern) if self.site_pattern is not None else None
+
+    def applies_to(self, provider, facility_id):
+        return ((not self.providers or provider is None or provider in self.providers)
+                and (not self.facilities or facility_id in self.facilities))
+
+    @property
+    def alternation_safe(self):
+        """Whether the rule can join a FacilityMatcher alternation: site-name only, no capturing groups."""
+        return self.url_pattern is None and self.site_regex.groups == 0
+
+    def matches(self, site_name, booking_url):
+        return ((self.url_pattern is None or self.url_pattern.search(booking_url or '') is not None)
+                and (self.site_regex is None or self.site_regex.search(site_name) is not None))
+
+class FacilityMatcher:
+    """The rules for one (provider, facility), compiled, with memoized verdicts."""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.name_patterns = {}  # action -> (compiled alternation, group name -> rule), for site-name-only rules
+        self.other_rules = []    # rules matched one by one (see SiteRule.alternation_safe)
+        for action in ACTIONS:
+            groups = {}
+            alternatives = []
+            for rule in rules:
+                if rule.action != action:
+                    continue
+                if not rule.alternation_safe:
+                    self.other_rules.append(rule)
+                    continue
+                group = f"r{len(groups)}"
+                groups[group] = rule
+                alternatives.append(f"(?P<{group}>{rule.site_pattern})")
+            if alternatives:
+                self.name_patterns[action] = (re.compile('|'.join(alternatives)), groups)
+        self.uses_url = any(rule.url_pattern is not None for rule in self.other_rules)
+        self.verdicts = {}
+
+    def _first_match(self, action, site_name, booking_url):
+        compiled = self.name_patterns.get(action)
+        if compiled is not None:
+            match = compiled[0].search(site_name)
+            if match:
+                return compiled[1][match.lastgroup]
+        for rule in self.other_rules:
+            if rule.action == action and rule.matches(site_name, booking_url):
+                return rule
+        return None
+
+    def verdict(self, site_name, booking_url):
+        """(keep, deciding rule or None) for a site, memoized."""
+        key = (site_name, booking_url) if self.uses_url else site_name
+        verdict = self.verdicts.get(key)
+        if verdict is None:
+            include = self._first_match('include', site_name, booking_url)
+            exclude = self._first_match('exclude', site_name, booking_url) if include is None else None
+            verdict = (True, include) if include is not None else (exclude is None, exclude)
+            self.verdicts[key] = verdict
+        return verdict
+
+class SiteFilter:
+    """All configured rules, compiled per (provider, facility) on first use."""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.matchers = {}
+        self.hits = Counter()
+        self.lock = threading.Lock()
+
+    def matcher(self, provider, facility_id):
+        key = (provider, facility_id)
+        matcher = self.matchers.get(key)
+        if matcher is None:
+            matcher = FacilityMatcher([rule for rule in self.rules if rule.applies_to(provider, facility_id)])
+            with self.lock:
+                matcher = self.matchers.setdefault(key, matcher)
+        return matcher
+
+    def filter(self, results, provider=None):
+        """Keep the results no exclude rule drops; counts each deciding rule's hits."""
+        kept = []
+        hits = Counter()
+        matchers = {}  # facility_id as given -> matcher, so ids aren't re-stringified per result
+        for result in results:
+            matcher = matchers.get(result.facility_id)
+            if matcher is None:
+                matcher = matchers[result.facility_id] = self.matcher(provider, str(result.facility_id))
+            site_name = result.campsite_site_name
+            verdict = matcher.verdicts.get((site_name, result.booking_url) if matcher.uses_url else site_name)
+            if verdict is None:
+                verdict = matcher.verdict(site_name, result.booking_url)
+            if verdict[1] is not None:
+                hits[verdict[1].name] += 1
+            if verdict[0]:
+                kept.append(result)
+        if hits:
+            with self.lock:
+                self.hits.update(hits)
+        return kept
+
+    def summary(self):
+        """One-line report of what each rule matched."""
+        if not self.hits:
+            return "Site filter: no rule matched"
+        counts = ', '.join(f"{rule.name} {'kept' if rule.action == 'include' else 'dropped'} {self.hits[rule.name]}"
+                           for rule in self.rules if self.hits[rule.name])
+        return f"Site filter: {counts}"
+
+@lru_cache(maxsize=None)
+def load_site_rules(path=SITE_FILTERS_PATH):
+    """Read and validate the rule config (cached per path)."""
+    with open(path, 'r') as f:
+        config = json.load(f)
+    rules = tuple(SiteRule(rule) for rule in config.get('rules', []))
+    names = Counter(rule.name for rule in rules)
+    duplicates = [name for name, count in names.items() if count > 1]
+    if duplicates:
+        raise ValueError(f"Duplicate site rule names: {', '.join(duplicates)}")
+    return rules
@@ -0,0 +1,194 @@
+"""
+Fetch once, derive many: stay profiles computed from a per-site night availability bitmap.
+
+Searches fetch single available nights (nights=1, every weekday) for the nights any requested
+profile could use. Those nights become a sites x nights boolean matrix, and each stay profile
+(number of nights + allowed check-in weekdays) is derived from it with a vectorized
+run-length scan, so adding a profile costs no extra provider calls.
+
+A bitmap can be saved to .npz and profiles derived from it later without searching again:
+
+    python stay_profiles.py .cache/night_bitmap_reserve_california_default.npz --profile long_weekend
+"""
+
+import argparse
+import datetime
+import json
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+import numpy as np
+
+@dataclass(frozen=True)
+class StayProfile:
+    """A kind of stay to look for: `nights` consecutive nights starting on one of `checkin_weekdays`."""
+    name: str
+    nights: int
+    checkin_weekdays: Tuple[int, ...]
+
+# Known stay profiles (weekday numbers: Monday=0 ... Sunday=6)
+STAY_PROFILES = {
+    'weekend': StayProfile('weekend', 2, (4,)),             # Friday + Saturday night
+    'one_night': StayProfile('one_night', 1, (0, 1, 2, 3, 4, 5, 6)),
+    'saturday': StayProfile('saturday', 1, (5,)),
+    'long_weekend': StayProfile('long_weekend', 3, (4,)),   # Friday to Monday
+    'midweek': StayProfile('midweek', 2, (0, 1, 2)),        # check in Monday to Wednesday
+    'week': StayProfile('week', 7, (0, 1, 2, 3, 4, 5, 6))
+}
+DEFAULT_PROFILES = ['weekend']
+
+def get_profiles(names):
+    """Look up stay profiles by name; raises ValueError for unknown names."""
+    unknown = [name for name in names if name not in STAY_PROFILES]
+    if unknown:
+        raise ValueError(f"Unknown stay profile(s): {', '.join(unknown)} (known: {', '.join(STAY_PROFILES)})")
+    return [STAY_PROFILES[name] for name in names]
+
+@dataclass(slots=True)
+class StayRecord:
+    """A derived available stay, with the attributes main.py reads from camply results."""
+    facility_id: str
+    facility_name: str
+    recreation_area: str
+    campsite_id: str
+    campsite_site_name: str
+    booking_url: str
+    booking_date: datetime.datetime
+    booking_end_date: datetime.datetime
+    booking_nights: int
+
+# Per-site attributes kept alongside the bitmap rows
+SITE_FIELDS = ('facility_id', 'facility_name', 'recreation_area', 'campsite_id', 'campsite_site_name', 'booking_url')
+
+def to_stay_record(result):
+    """A lightweight StayRecord copy of a camply result (for keeping results around between searches)."""
+    return StayRecord(booking_date=result.booking_date, booking_end_date=result.booking_end_date,
+                      booking_nights=result.booking_nights,
+                      **{field: str(getattr(result, field)) for field in SITE_FIELDS})
+
+class NightBitmap:
+    """
+    Availability of every site for every night in [start_date, end_date):
+    matrix[site, night] is True when the site is free that night.
+    """
+
+    def __init__(self, start_date, end_date, sites: List[Dict[str, str]], matrix: np.ndarray):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.sites = sites
+        self.matrix = matrix
+
+    @classmethod
+    def from_nights(cls, campsites, start_date, end_date):
+        """
+        Build a bitmap from single-night availability records (camply AvailableCampsite objects
+        or anything with the same attributes). Multi-night records mark every night they cover.
+        """
+        builder = NightBitmapBuilder(start_date, end_date)
+        builder.add(campsites)
+        return builder.build()
+
+    @property
+    def nights(self):
+        return self.matrix.shape[1]
+
+    def stay_starts(self, profile: StayProfile):
+        """
+        Boolean matrix (sites x check-in nights): True where `profile.nights` consecutive
+        nights are free from that check-in on, the check-in weekday is allowed and the stay
+        ends by end_date.
+        """
+        nights = profile.nights
+        if nights < 1 or nights > self.nights:
+            return np.zeros((len(self.sites), 0), dtype=bool)
+        # Run-length scan: free nights in [j, j + nights) from a prefix sum along each row
+        counts = np.zeros((len(self.sites), self.nights + 1), dtype=np.int32)
+        np.cumsum(self.matrix, axis=1, out=counts[:, 1:])
+        starts = (counts[:, nights:] - counts[:, :-nights]) == nights
+
+        first_weekday = self.start_date.weekday()
+        weekdays = (np.arange(starts.shape[1]) + first_weekday) % 7
+        return starts & np.isin(weekdays, profile.checkin_weekdays)
+
+    def iter_stays(self, profile: StayProfile):
+        """Yield every available stay for a profile as a StayRecord, in (site, date) order."""
+        rows, cols = np.nonzero(self.stay_starts(profile))
+        start = datetime.datetime.combine(self.start_date, datetime.time())
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            booking_date = start + datetime.timedelta(days=col)
+            yield StayRecord(
+                booking_date=booking_date,
+                booking_end_date=booking_date + datetime.timedelta(days=profile.nights),
+                booking_nights=profile.nights,
+                **self.sites[row]
+            )
+
+    def derive(self, profile: StayProfile):
+        """All available stays for a profile, as a list of StayRecords."""
+        return list(self.iter_stays(profile))
+
+    def save(self, path):
+        """Save as .npz: the bitmap bit-packed, site attributes and dates as JSON."""
+        meta = {'start_date': self.start_date.isoformat(), 'end_date': self.end_date.isoformat(), 'sites': self.sites}
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, bits=np.packbits(self.matrix, axis=1), meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            start_date = datetime.date.fromisoformat(meta['start_date'])
+            end_date = datetime.date.fromisoformat(meta['end_date'])
+            nights = (end_date - start_date).days
+            matrix = np.unpackbits(data['bits'], axis=1, count=nights).astype(bool)
+        return cls(start_date, end_date, meta['sites'], matrix.reshape(len(meta['sites']), nights))
+
+class NightBitmapBuilder:
+    """
+    Collects available nights as they arrive, keeping only site attributes and
+    (site, night) offsets, and builds the NightBitmap at the end.
+    """
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.site_index = {}
+        self.sites = []
+        self.rows = array('q')
+        self.cols = array('q')
+
+    def add(self, campsites):
+        for campsite in campsites:
+            key = (str(campsite.facility_id), str(campsite.campsite_id))
+            row = self.site_index.get(key)
+            if row is None:
+                row = self.site_index[key] = len(self.sites)
+                self.sites.append({field: str(getattr(campsite, field)) for field in SITE_FIELDS})
+            first = (campsite.booking_date.date() - self.start_date).days
+            for offset in range(first, first + campsite.booking_nights):
+                self.rows.append(row)
+                self.cols.append(offset)
+
+    def build(self):
+        matrix = np.zeros((len(self.sites), max(0, (self.end_date - self.start_date).days)), dtype=bool)
+        rows = np.frombuffer(self.rows, dtype=np.int64)
+        cols = np.frombuffer(self.cols, dtype=np.int64)
+        inside = (cols >= 0) & (cols < matrix.shape[1])
+        matrix[rows[inside], cols[inside]] = True
+        return NightBitmap(self.start_date, self.end_date, self.sites, matrix)
+
+def main():
+    parser = argparse.ArgumentParser(description='Derive stay profiles from a saved night availability bitmap')
+    parser.add_argument('bitmap', help='Bitmap .npz file saved by main.py')
+    parser.add_argument('--profile', action='append', choices=list(STAY_PROFILES),
+                        help='Stay profile to derive (repeatable, default: all)')
+    args = parser.parse_args()
+
+    bitmap = NightBitmap.load(args.bitmap)
+    print(f"{len(bitmap.sites)} sites x {bitmap.nights} nights from {bitmap.start_date} to {bitmap.end_date}")
+    for profile in get_profiles(args.profile or list(STAY_PROFILES)):
+        stays = bitmap.stay_starts(profile)
+        print(f"{profile.name}: {int(stays.sum())} available stays at {int(stays.any(axis=1).sum())} sites")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import os
+import sys
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+import rate_limit
+import response_cache
+
+@pytest.fixture(autouse=True)
+def isolated_run_state(monkeypatch):
+    """Fresh metrics and rate limiters and no response cache (unless a test configures one)."""
+    monkeypatch.setattr(rate_limit, '_limiters', {})
+    monkeypatch.setattr(rate_limit, 'DEFAULT_RATE_LIMITS', {provider: dict(settings) for provider, settings
+                                                             in rate_limit.DEFAULT_RATE_LIMITS.items()})
+    metrics.reset_metrics()
+    response_cache.configure_response_cache(None)
+    yield
+    response_cache.configure_response_cache(None)
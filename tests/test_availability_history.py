@@ -0,0 +1,58 @@
+import datetime
+
+from availability_history import AvailabilityHistory
+from results_delta import unsearched_checkins
+
+def row(facility_id, site, date):
+    return {'facility_id': facility_id, 'campsite_site_name': site, 'booking_date': date,
+            'facility_name': f"Camp {facility_id}", 'recreation_area': 'Area', 'booking_url': None}
+
+def observed(date):
+    """An observation time at noon Pacific on `date`."""
+    return datetime.datetime.fromisoformat(f"{date}T12:00:00-07:00").timestamp()
+
+def test_partial_run_does_not_close_unsearched_dates(tmp_path):
+    history = AvailabilityHistory(str(tmp_path / 'history.sqlite'))
+    try:
+        history.record_run([row('1', 'A', '2027-01-05'), row('1', 'A', '2027-02-05')], '2027-01-01', '2027-03-01',
+                           observed_at=observed('2026-12-01'))
+
+        unsearched = unsearched_checkins([(['1'], datetime.date(2027, 2, 1), datetime.date(2027, 3, 1))], nights=2)
+        counts = history.record_run([], '2027-01-01', '2027-03-01', observed_at=observed('2026-12-02'), unsearched=unsearched)
+
+        assert counts == {'closed': 1}
+        current = set(history.conn.execute("SELECT facility_id, site, booking_date FROM current"))
+        assert current == {('1', 'A', '2027-02-05')}
+    finally:
+        history.close()
+
+def test_runs_record_listed_opened_closed_and_expired(tmp_path):
+    history = AvailabilityHistory(str(tmp_path / 'history.sqlite'))
+    try:
+        assert history.record_run([row('1', 'A', '2027-01-05'), row('1', 'A', '2027-01-10')], '2027-01-01', '2027-02-01',
+                                  observed_at=observed('2027-01-01')) == {'listed': 2}
+
+        # Jan 5 booked, Jan 12 freed up on a searched date, March entered the range
+        counts = history.record_run([row('1', 'A', '2027-01-10'), row('1', 'A', '2027-01-12'), row('1', 'A', '2027-03-05')],
+                                    '2027-01-01', '2027-04-01', observed_at=observed('2027-01-02'))
+        assert counts == {'closed': 1, 'opened': 1, 'listed': 1}
+
+        # Jan 10 passed; a narrower run says nothing about March
+        counts = history.record_run([row('1', 'A', '2027-01-12')], '2027-01-11', '2027-02-01',
+                                    observed_at=observed('2027-01-11'))
+        assert counts == {'expired': 1}
+        current = set(history.conn.execute("SELECT booking_date FROM current"))
+        assert current == {('2027-01-12',), ('2027-03-05',)}
+    finally:
+        history.close()
+
+def test_unchanged_runs_are_compacted(tmp_path):
+    history = AvailabilityHistory(str(tmp_path / 'history.sqlite'))
+    try:
+        rows = [row('1', 'A', '2027-01-05')]
+        for day in ('2027-01-01', '2027-01-02', '2027-01-03'):
+            history.record_run(rows, '2027-01-01', '2027-02-01', observed_at=observed(day))
+        runs = history.conn.execute("SELECT run_count, first_observed_at, last_observed_at FROM runs").fetchall()
+        assert runs == [(3, observed('2027-01-01'), observed('2027-01-03'))]
+    finally:
+        history.close()
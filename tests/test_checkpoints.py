@@ -0,0 +1,97 @@
+import datetime
+import os
+import threading
+import time
+
+import checkpoints
+from checkpoints import CheckpointStore, checkpoint_key
+from search_engine import SearchJob
+from stay_profiles import StayRecord
+
+JOB = SearchJob('recreation_gov', datetime.date(2027, 1, 1), datetime.date(2027, 2, 1), ['123'], index=1)
+
+def record(facility_id, campsite_id, day, nights=1):
+    start = datetime.datetime(2027, 1, day)
+    return StayRecord(facility_id=facility_id, facility_name=f"Camp {facility_id}", recreation_area='Area',
+                      campsite_id=campsite_id, campsite_site_name=f"Site {campsite_id}",
+                      booking_url='https://example.com/site', booking_date=start,
+                      booking_end_date=start + datetime.timedelta(days=nights), booking_nights=nights)
+
+def test_save_and_load_round_trip(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    key = checkpoint_key(JOB, {'nights': 1})
+    results = [record('1', 'A', 2), record('1', 'A', 3, nights=2), record('2', 'B', 2)]
+
+    store.save(key, JOB, results)
+
+    assert store.load(key) == results
+    assert store.load(checkpoint_key(JOB, {'nights': 2})) is None
+
+def test_failed_windows_are_not_resumed(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    store.save('failed', JOB, error=TimeoutError('slow'), attempts=3)
+    assert store.load('failed') is None
+
+def test_max_age_cutoff(tmp_path, monkeypatch):
+    store = CheckpointStore(str(tmp_path), max_age=60)
+    store.save('fresh', JOB, [record('1', 'A', 2)])
+    store.save('old', JOB, [record('1', 'A', 2)])
+    # An old checkpoint is not resumed from, and pruning deletes it
+    now = time.time()
+    monkeypatch.setattr(checkpoints.time, 'time', lambda: now + 61)
+    assert store.load('old') is None
+    monkeypatch.undo()
+    os.utime(store.path('old'), (now - 61, now - 61))
+
+    store.prune()
+
+    assert store.load('fresh') is not None
+    assert not os.path.exists(store.path('old'))
+
+def test_two_threads_pruning_at_once(tmp_path, monkeypatch):
+    store = CheckpointStore(str(tmp_path), max_age=60)
+    old = time.time() - 120
+    for i in range(200):
+        store.save(f"old{i}", JOB)
+        os.utime(store.path(f"old{i}"), (old, old))
+    store.save('fresh', JOB)
+
+    # Both threads list the directory before either deletes anything
+    listed = threading.Barrier(2)
+    listdir = os.listdir
+    def listdir_together(path):
+        names = listdir(path)
+        listed.wait(timeout=5)
+        return names
+    monkeypatch.setattr(checkpoints.os, 'listdir', listdir_together)
+    errors = []
+    def prune():
+        try:
+            store.prune()
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=prune) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(listdir(str(tmp_path))) == ['fresh.json']
+
+def test_clear_tolerates_checkpoints_already_deleted(tmp_path, monkeypatch):
+    store = CheckpointStore(str(tmp_path))
+    store.save('a', JOB)
+    store.save('b', JOB)
+    # Another run's clear() deletes the files this one has already listed
+    listdir = os.listdir
+    def listdir_then_delete(path):
+        names = listdir(path)
+        for name in names:
+            os.remove(os.path.join(path, name))
+        return names
+    monkeypatch.setattr(checkpoints.os, 'listdir', listdir_then_delete)
+
+    store.clear()
+
+    assert listdir(str(tmp_path)) == []
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from campsites_map import CampgroundCatalog, Campsite
+from distances import DistanceEngine, Origin, ORIGINS, haversine_miles
+
+def campsite(campground_id, miles, latitude=None, longitude=None):
+    return Campsite(park_name='Park', time_to='1h', miles=miles, campground_name=f"Camp {campground_id}",
+                    url='https://example.com', rec='1', campground_id=campground_id,
+                    latitude=latitude, longitude=longitude)
+
+CATALOG = CampgroundCatalog([
+    ('reserve_california', campsite('near', 12, 37.80, -122.50)),
+    ('reserve_california', campsite('coast', 100, 38.57, -123.33)),
+    ('recreation_gov', campsite('south', 140, 36.25, -121.78)),
+    ('recreation_gov', campsite('unmapped', 70)),
+])
+
+def test_haversine_matrix():
+    sf = ORIGINS['san_francisco']
+    # Known great-circle distances: San Francisco to Oakland and to Los Angeles
+    assert haversine_miles(sf.latitude, sf.longitude, 37.8044, -122.2712) == pytest.approx(8.3, abs=0.1)
+    assert haversine_miles(sf.latitude, sf.longitude, 34.0522, -118.2437) == pytest.approx(347, abs=1)
+
+    # Origins x points in one call, matching the point-by-point distances
+    origins = list(ORIGINS.values())
+    latitudes = np.array([38.57, 36.25, 37.3382])
+    longitudes = np.array([-123.33, -121.78, -121.8863])
+    matrix = haversine_miles(np.array([[origin.latitude] for origin in origins]),
+                             np.array([[origin.longitude] for origin in origins]),
+                             latitudes[None, :], longitudes[None, :])
+    assert matrix.shape == (3, 3)
+    for row, origin in enumerate(origins):
+        for column in range(3):
+            assert matrix[row, column] == pytest.approx(
+                haversine_miles(origin.latitude, origin.longitude, latitudes[column], longitudes[column]))
+    assert matrix[2, 2] == pytest.approx(0, abs=1e-9)  # San Jose to itself
+
+def test_catalog_origin_reproduces_the_catalog_miles():
+    engine = DistanceEngine(CATALOG)
+    assert engine.miles_lookup() == {'near': 12, 'coast': 100, 'south': 140, 'unmapped': 70}
+
+def test_other_origins_scale_straight_line_miles_by_circuity():
+    engine = DistanceEngine(CATALOG)
+    san_jose = engine.miles_lookup('san_jose')
+    # The south campground is much closer to San Jose; the coast one further
+    assert san_jose['south'] < 140 and san_jose['coast'] > 100
+    # Road miles are at least the straight-line miles
+    origin = ORIGINS['san_jose']
+    assert san_jose['coast'] >= haversine_miles(origin.latitude, origin.longitude, 38.57, -123.33)
+    # Campgrounds without coordinates keep the catalog miles from every origin
+    assert san_jose['unmapped'] == 70 and engine.miles_lookup('oakland')['unmapped'] == 70
+
+def test_lookups_are_cached_per_origin():
+    engine = DistanceEngine(CATALOG, origins={**ORIGINS, 'tahoe': Origin('Tahoe', 39.09, -120.03)})
+    lookup = engine.miles_lookup('oakland')
+    assert engine.miles_lookup('oakland') is lookup
+    assert engine.miles_lookup('tahoe') is not lookup
+    assert engine.miles_lookup('tahoe')['coast'] > engine.miles_lookup('oakland')['coast']
+    with pytest.raises(ValueError):
+        engine.miles_lookup('mars')
@@ -0,0 +1,58 @@
+import socket
+import time
+
+from live_events import EventHub, format_event
+
+def connect(hub, initial=b''):
+    """Hand the hub one end of a socket pair, as serve_local does; returns the client's end."""
+    assert hub.reserve()
+    server_end, client_end = socket.socketpair()
+    client_end.settimeout(5)
+    hub.add(server_end, initial)
+    return client_end
+
+def receive(sock, expected):
+    data = b''
+    while len(data) < len(expected):
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_events_fan_out_to_every_client():
+    hub = EventHub()
+    hello = format_event('reload', {'version': 'v1'}, 'v1')
+    clients = [connect(hub, hello) for _ in range(3)]
+    for client in clients:
+        assert receive(client, hello) == hello
+
+    event = format_event('changes', {'added_count': 1}, 'v2')
+    hub.broadcast(event)
+    hub.broadcast(event)
+
+    for client in clients:
+        assert receive(client, event * 2) == event * 2
+        client.close()
+
+def test_client_slots_are_limited_and_given_back():
+    hub = EventHub(max_clients=2)
+    first = connect(hub)
+    second = connect(hub)
+    assert not hub.reserve()
+
+    # A disconnected client frees its slot
+    first.close()
+    wait_for(lambda: hub.client_count == 1)
+    assert hub.reserve()
+    assert not hub.reserve()
+    # As does a reserved slot whose response never started
+    hub.release()
+    assert hub.reserve()
+    second.close()
@@ -0,0 +1,46 @@
+import datetime
+import json
+import requests
+from requests.adapters import HTTPAdapter
+from deadlines import Deadline, deadline_scope
+from metrics import RunMetrics, get_metrics
+from search_engine import SEARCH_CLASSES
+
+def test_recreation_gov_traffic_is_counted(monkeypatch):
+    def send(adapter, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"campsites": {}}'
+        response.url = request.url
+        response.request = request
+        return response
+
+    monkeypatch.setattr(HTTPAdapter, 'send', send)
+    with deadline_scope(Deadline(5)):
+        SEARCH_CLASSES['recreation_gov'].provider_class().get_recdotgov_data(232447, datetime.datetime(2027, 1, 1))
+
+    prometheus = get_metrics().to_prometheus({'run': 'test'})
+    assert 'yayarea_http_requests_total{provider="recreation_gov",run="test",status="200"} 1' in prometheus
+    assert 'yayarea_http_bytes_total{provider="recreation_gov",run="test"} 17' in prometheus
+    assert 'yayarea_http_request_seconds_count{provider="recreation_gov",run="test"} 1' in prometheus
+
+def test_timers_and_export(tmp_path):
+    metrics = RunMetrics()
+    for seconds in (0.5, 1.5):
+        metrics.observe('window', seconds, provider='reserve_california', batch='batch1')
+    metrics.record_window('reserve_california', 'batch1', '2027-01', 2.0, attempts=3, results=4)
+    metrics.inc('results', 4, provider='reserve_california', batch=None)
+
+    snapshot = metrics.snapshot()
+    [window] = snapshot['timers']
+    assert (window['count'], window['seconds'], window['max_seconds']) == (3, 4.0, 2.0)
+    assert {(counter['name'], counter['value']) for counter in snapshot['counters']} == {('window_retries', 2), ('results', 4)}
+    # A None label is dropped rather than exported as "None"
+    assert [counter['labels'] for counter in snapshot['counters'] if counter['name'] == 'results'] == [{'provider': 'reserve_california'}]
+
+    prom_path, history_path = metrics.export(str(tmp_path), 'test', search_status='success')
+    with open(prom_path) as f:
+        assert '# TYPE yayarea_window_seconds summary' in f.read()
+    with open(history_path) as f:
+        record = json.loads(f.readline())
+    assert record['run'] == 'test' and record['search_status'] == 'success'
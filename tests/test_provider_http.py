@@ -0,0 +1,66 @@
+import datetime
+import json
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from deadlines import Deadline, DeadlineExceeded, deadline_scope
+from provider_http import ProviderAdapter
+from search_engine import SEARCH_CLASSES
+
+def make_response(request, status=200, body=b'{"campsites": {}}', headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = body
+    response.url = request.url
+    response.request = request
+    return response
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Requests that reached the network layer, as (adapter class, url, timeout)."""
+    sent = []
+
+    def send(adapter, request, **kwargs):
+        sent.append((type(adapter), request.url, kwargs.get('timeout')))
+        return make_response(request)
+
+    def bypass(*args, **kwargs):
+        raise AssertionError("Recreation.gov request sent with requests.request, bypassing the provider adapter")
+
+    monkeypatch.setattr(HTTPAdapter, 'send', send)
+    monkeypatch.setattr(requests, 'request', bypass)
+    return sent
+
+def recreation_gov_provider():
+    return SEARCH_CLASSES['recreation_gov'].provider_class()
+
+def test_recreation_gov_month_fetch_goes_through_adapter(sent):
+    provider = recreation_gov_provider()
+    with deadline_scope(Deadline(5)):
+        response = provider.make_recdotgov_availability_request(232447, datetime.datetime(2027, 1, 1))
+    assert json.loads(response.content) == {'campsites': {}}
+    assert len(sent) == 1
+    adapter_class, url, timeout = sent[0]
+    assert adapter_class is ProviderAdapter
+    assert '/availability/campground/232447/month' in url
+    # Capped by the window deadline rather than camply's fixed 30 seconds
+    assert timeout <= 5
+
+def test_recreation_gov_data_fetch_stops_at_deadline(sent):
+    provider = recreation_gov_provider()
+    with deadline_scope(Deadline(0)):
+        with pytest.raises(DeadlineExceeded):
+            provider.get_recdotgov_data(232447, datetime.datetime(2027, 1, 1))
+    assert sent == []
+
+def test_recreation_gov_error_months_are_retried_within_deadline(monkeypatch):
+    statuses = iter([500, 200])
+
+    def send(adapter, request, **kwargs):
+        return make_response(request, next(statuses))
+
+    monkeypatch.setattr(HTTPAdapter, 'send', send)
+    monkeypatch.setattr('provider_http._month_retry_backoff', lambda retry_state: 0)
+    with deadline_scope(Deadline(5)):
+        assert recreation_gov_provider().get_recdotgov_data(232447, datetime.datetime(2027, 1, 1)) == {'campsites': {}}
@@ -0,0 +1,80 @@
+import datetime
+import email.utils
+import http.server
+import threading
+import time
+import pytest
+import rate_limit
+from deadlines import Deadline, deadline_scope
+from metrics import get_metrics
+from provider_http import get_provider_session
+from rate_limit import AdaptiveRateLimiter, get_rate_limiter, parse_retry_after
+
+class ThrottlingHandler(http.server.BaseHTTPRequestHandler):
+    """Answers 429 with Retry-After for the first `throttled` requests, then 200."""
+    throttled = 1
+    retry_after = '1'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(time.monotonic())
+        if len(self.requests) <= self.throttled:
+            self.send_response(429)
+            self.send_header('Retry-After', self.retry_after)
+            body = b'slow down'
+        else:
+            self.send_response(200)
+            body = b'{"campsites": {}}'
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def throttling_server():
+    ThrottlingHandler.requests = []
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/camps/availability/campground/232447/month"
+    server.shutdown()
+    server.server_close()
+
+def test_throttling_halves_rate_honours_retry_after_and_recovers(throttling_server, monkeypatch):
+    limiter = AdaptiveRateLimiter('recreation_gov', rate=20.0, burst=20, max_rate=20.0, increase_step=5.0)
+    monkeypatch.setattr(rate_limit, '_limiters', {'recreation_gov': limiter})
+    session = get_provider_session('recreation_gov')
+
+    with deadline_scope(Deadline(30)):
+        response = session.get(throttling_server)
+        assert response.status_code == 200
+        # Halved by the 429, then one step back up for the retried request's success
+        assert limiter.throttled_count == 1
+        assert limiter.rate == 20.0 * 0.5 + 5.0
+        first, retried = ThrottlingHandler.requests
+        assert retried - first >= 1.0
+
+        session.get(throttling_server)
+        assert limiter.rate == 20.0
+
+    counters = {(counter['name'], tuple(sorted(counter['labels'].items()))): counter['value']
+                for counter in get_metrics().snapshot()['counters']}
+    assert counters[('http_throttle_retries', (('provider', 'recreation_gov'),))] == 1
+    assert counters[('http_requests', (('provider', 'recreation_gov'), ('status', '429')))] == 1
+    assert counters[('http_requests', (('provider', 'recreation_gov'), ('status', '200')))] == 2
+
+def test_retry_after_pauses_every_request_to_the_provider():
+    limiter = get_rate_limiter('reserve_california')
+    assert limiter.record_response(429, retry_after=0.3) == 0.3
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.25
+
+def test_parse_retry_after():
+    assert parse_retry_after('7') == 7.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=30)
+    assert 25 <= parse_retry_after(email.utils.format_datetime(later)) <= 30
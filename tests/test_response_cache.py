@@ -0,0 +1,121 @@
+import datetime
+import sqlite3
+import requests
+from requests.adapters import HTTPAdapter
+from deadlines import Deadline, deadline_scope
+import response_cache
+from response_cache import configure_response_cache, availability_ttl
+from search_engine import SEARCH_CLASSES
+
+def test_second_recreation_gov_month_fetch_is_served_from_cache(tmp_path, monkeypatch):
+    sent = []
+
+    def send(adapter, request, **kwargs):
+        sent.append(request.url)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"campsites": {}}'
+        response.url = request.url
+        response.request = request
+        return response
+
+    monkeypatch.setattr(HTTPAdapter, 'send', send)
+    cache = configure_response_cache(str(tmp_path / 'responses.sqlite'))
+    month = datetime.datetime(2027, 1, 1)
+
+    with deadline_scope(Deadline(5)):
+        first = SEARCH_CLASSES['recreation_gov'].provider_class().get_recdotgov_data(232447, month)
+        second = SEARCH_CLASSES['recreation_gov'].provider_class().get_recdotgov_data(232447, month)
+
+    assert first == second == {'campsites': {}}
+    assert len(sent) == 1
+    assert cache.stats['misses'] == 1 and cache.stats['hits'] == 1
+
+    # Keyed by campground and month, with the month's availability TTL
+    conn = sqlite3.connect(cache.path)
+    key, campground_id, stored_month, stored_at, expires_at = conn.execute(
+        "SELECT key, campground_id, month, stored_at, expires_at FROM responses").fetchone()
+    conn.close()
+    assert key.startswith('recreation_gov:232447:2027-01:')
+    assert (campground_id, stored_month) == ('232447', '2027-01-01')
+    assert abs((expires_at - stored_at) - availability_ttl(month.date())) < 1
+
+def test_availability_ttl_is_shorter_for_near_months():
+    today = datetime.date(2027, 1, 1)
+    assert availability_ttl(datetime.date(2027, 1, 1), today) < availability_ttl(datetime.date(2027, 2, 1), today)
+    assert availability_ttl(datetime.date(2027, 2, 1), today) < availability_ttl(datetime.date(2027, 9, 1), today)
+
+def month_request(campground_id, month='2027-01'):
+    return requests.Request('GET', f"https://www.recreation.gov/api/camps/availability/campground/{campground_id}/month",
+                            params={'start_date': f"{month}-01T00:00:00.000Z"}).prepare()
+
+def ok(request, body=b'{"campsites": {}}'):
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    response.url = request.url
+    response.request = request
+    return response
+
+def last_access(cache):
+    conn = sqlite3.connect(cache.path)
+    try:
+        return dict(conn.execute("SELECT campground_id, last_access FROM responses"))
+    finally:
+        conn.close()
+
+def test_hits_write_access_times_with_the_next_store(tmp_path):
+    cache = configure_response_cache(str(tmp_path / 'responses.sqlite'))
+    cache.send('recreation_gov', month_request(1), ok)
+    stored = last_access(cache)['1']
+
+    assert cache.send('recreation_gov', month_request(1), ok).from_cache
+    assert last_access(cache)['1'] == stored and len(cache.accessed) == 1
+
+    cache.send('recreation_gov', month_request(2), ok)
+    assert last_access(cache)['1'] > stored and not cache.accessed
+
+def test_least_recently_used_entries_are_evicted_past_the_cap(tmp_path):
+    cache = configure_response_cache(str(tmp_path / 'responses.sqlite'), max_bytes=250)
+    for campground_id in (1, 2):
+        cache.send('recreation_gov', month_request(campground_id), lambda request: ok(request, b'x' * 100))
+    assert cache.total_bytes == 200
+    # A hit (only noted in memory) keeps the first entry; the second is the least recently used
+    cache.send('recreation_gov', month_request(1), ok)
+    cache.send('recreation_gov', month_request(3), lambda request: ok(request, b'x' * 100))
+
+    assert sorted(last_access(cache)) == ['1', '3']
+    assert cache.total_bytes == 200 and cache.stats['evictions'] == 1
+
+def test_a_locked_cache_is_a_miss(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, 'BUSY_TIMEOUT', 0.1)
+    cache = configure_response_cache(str(tmp_path / 'responses.sqlite'))
+    # Another process holds the write lock
+    other = sqlite3.connect(cache.path)
+    other.execute("BEGIN EXCLUSIVE")
+    sent = []
+    def send(request):
+        sent.append(request.url)
+        return ok(request)
+
+    response = cache.send('recreation_gov', month_request(1), send)
+
+    assert response.status_code == 200 and len(sent) == 1
+    assert cache.stats['errors'] == 1
+    other.rollback()
+    other.close()
+    # The cache works again once the lock is released
+    cache.send('recreation_gov', month_request(1), send)
+    assert cache.send('recreation_gov', month_request(1), send).from_cache
+    assert len(sent) == 2
+
+def test_lookup_errors_go_to_the_provider(tmp_path, monkeypatch):
+    cache = configure_response_cache(str(tmp_path / 'responses.sqlite'))
+    def locked(key):
+        raise sqlite3.OperationalError('database is locked')
+    monkeypatch.setattr(cache, 'get', locked)
+
+    response = cache.send('recreation_gov', month_request(1), ok)
+
+    assert response.status_code == 200 and not getattr(response, 'from_cache', False)
+    assert cache.stats['errors'] == 1 and cache.stats['stores'] == 1
@@ -0,0 +1,48 @@
+import datetime
+from types import SimpleNamespace
+
+from result_records import UNKNOWN_MILES, ResultRows, ResultSet
+from results_format import merge_key
+
+def site(facility_id, name, date, url='https://example.com/site'):
+    return SimpleNamespace(facility_id=facility_id, facility_name=f"Camp {facility_id}", recreation_area='Area',
+                           campsite_site_name=name, booking_date=datetime.datetime.combine(date, datetime.time()),
+                           booking_url=url)
+
+MILES = {'1': 30, '2': 10}
+URLS = {'1': 'https://example.com/camp1'}
+
+def test_rows_come_out_in_results_order_with_catalog_urls():
+    results = ResultSet(MILES, URLS, [site('1', 'A', datetime.date(2027, 1, 8)), site(2, 'B', datetime.date(2027, 1, 9)),
+                                      site('1', 'A', datetime.date(2027, 1, 1)), site('3', 'C', datetime.date(2027, 1, 1))])
+
+    rows = list(results.iter_rows())
+    assert rows == sorted(rows, key=merge_key)
+    assert [(row['facility_id'], row['booking_date'], row['miles']) for row in rows] == [
+        ('2', '2027-01-09', 10), ('1', '2027-01-01', 30), ('1', '2027-01-08', 30), ('3', '2027-01-01', UNKNOWN_MILES)]
+    # The catalog URL wins; facilities without one keep each site's own booking URL
+    assert rows[1]['booking_url'] == 'https://example.com/camp1'
+    assert rows[0]['booking_url'] == 'https://example.com/site'
+    assert rows[1]['facility_name'] == 'Camp 1' and rows[1]['recreation_area'] == 'Area'
+
+def test_site_urls_are_kept_per_site():
+    results = ResultSet({}, {}, [site('5', 'A', datetime.date(2027, 1, 1), 'https://example.com/a'),
+                                 site('5', 'B', datetime.date(2027, 1, 1), 'https://example.com/b')])
+    assert [row['booking_url'] for row in results.iter_rows()] == ['https://example.com/a', 'https://example.com/b']
+
+def test_rows_view_is_sized_and_re_iterable():
+    results = ResultSet(MILES, URLS, [site('1', 'A', datetime.date(2027, 1, 1))])
+    rows = results.rows()
+    assert isinstance(rows, ResultRows) and len(rows) == 1
+    assert list(rows) == list(rows)
+    results.add(site('2', 'B', datetime.date(2027, 1, 2)))
+    assert [row['facility_id'] for row in rows] == ['2', '1']
+    assert not ResultSet(MILES, URLS) and len(ResultSet(MILES, URLS)) == 0
+
+def test_facility_dates_groups_unique_dates_nearest_first():
+    results = ResultSet(MILES, URLS, [site('1', 'A', datetime.date(2027, 1, 8)), site('1', 'B', datetime.date(2027, 1, 8)),
+                                      site('1', 'A', datetime.date(2027, 1, 1)), site('2', 'C', datetime.date(2027, 1, 3))])
+    grouped = list(results.facility_dates())
+    assert [(facility_id, miles, dates) for facility_id, _, _, _, miles, dates in grouped] == [
+        ('2', 10, [datetime.date(2027, 1, 3)]),
+        ('1', 30, [datetime.date(2027, 1, 1), datetime.date(2027, 1, 8)])]
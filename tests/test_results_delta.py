@@ -0,0 +1,71 @@
+import datetime
+import json
+
+from results_delta import (build_snapshot, diff_snapshots, iter_delta_entries, load_snapshot, searched_filter,
+                           unsearched_checkins, update_delta)
+
+def row(facility_id, site, date):
+    return {'facility_id': facility_id, 'campsite_site_name': site, 'booking_date': date}
+
+def test_diff_skips_unchanged_facilities_and_reports_entries():
+    previous = build_snapshot([row('1', 'A', '2027-01-01'), row('2', 'B', '2027-01-02'), row('2', 'B', '2027-01-03')])
+    current = build_snapshot([row('1', 'A', '2027-01-01'), row('2', 'B', '2027-01-03'), row('3', 'C', '2027-01-04')])
+
+    added, removed = diff_snapshots(previous, current)
+
+    assert added == {'3': {'C': ['2027-01-04']}}
+    assert removed == {'2': {'B': ['2027-01-02']}}
+
+def test_facilities_that_vanish_are_removed_whole():
+    previous = build_snapshot([row('1', 'A', '2027-01-01'), row('1', 'B', '2027-01-01')])
+    added, removed = diff_snapshots(previous, {})
+    assert added == {}
+    assert removed == {'1': {'A': ['2027-01-01'], 'B': ['2027-01-01']}}
+    assert sorted(iter_delta_entries(removed)) == [('1', 'A', '2027-01-01'), ('1', 'B', '2027-01-01')]
+
+def test_first_run_is_a_baseline(tmp_path):
+    snapshot_path, delta_path = tmp_path / 'snapshot.json', tmp_path / 'delta.json'
+
+    delta = update_delta([row('1', 'A', '2027-01-01')], snapshot_path, delta_path)
+
+    assert delta['baseline'] and delta['added_count'] == 1 and delta['removed_count'] == 0
+    assert json.loads(delta_path.read_text())['added'] == {'1': {'A': ['2027-01-01']}}
+    assert load_snapshot(snapshot_path)['facilities']['1']['sites'] == {'A': ['2027-01-01']}
+
+def test_unsearched_checkins_cover_every_stay_touching_a_failed_span():
+    unsearched = unsearched_checkins([(['2', '1'], datetime.date(2027, 1, 10), datetime.date(2027, 1, 15))], nights=2)
+
+    assert unsearched == [[['1', '2'], '2027-01-09', '2027-01-15']]
+    searched = searched_filter(unsearched)
+    assert searched('1', '2027-01-08') and searched('1', '2027-01-15') and searched('3', '2027-01-10')
+    assert not searched('1', '2027-01-09') and not searched('2', datetime.date(2027, 1, 14))
+    assert searched_filter(None)('1', '2027-01-10')
+
+def test_partial_run_only_diffs_the_searched_windows(tmp_path):
+    snapshot_path, delta_path = tmp_path / 'snapshot.json', tmp_path / 'delta.json'
+    update_delta([row('1', 'A', '2027-01-05'), row('1', 'A', '2027-02-05'), row('2', 'B', '2027-02-06')],
+                 snapshot_path, delta_path)
+
+    # February failed: its rows are missing, but that says nothing about availability
+    unsearched = unsearched_checkins([(['1', '2'], datetime.date(2027, 2, 1), datetime.date(2027, 3, 1))], nights=2)
+    delta = update_delta([row('1', 'A', '2027-01-06')], snapshot_path, delta_path, unsearched)
+
+    assert delta['partial']
+    assert delta['added'] == {'1': {'A': ['2027-01-06']}}
+    assert delta['removed'] == {'1': {'A': ['2027-01-05']}}
+    assert load_snapshot(snapshot_path)['facilities']['2']['sites'] == {'B': ['2027-02-06']}
+
+    # The next complete run compares against the carried-over February entries
+    delta = update_delta([row('1', 'A', '2027-01-06'), row('1', 'A', '2027-02-05'), row('2', 'B', '2027-02-06')],
+                         snapshot_path, delta_path)
+    assert delta['added_count'] == 0 and delta['removed_count'] == 0
+
+def test_failed_run_leaves_the_snapshot_alone(tmp_path, monkeypatch):
+    from run_changes import record_run_changes
+    monkeypatch.chdir(tmp_path)
+    record_run_changes(lambda: [row('1', 'A', '2027-01-05')], 'success', '2027-01-01', '2027-02-01', 'main',
+                       watches_path='', history_path='')
+    snapshot = (tmp_path / '.cache' / 'availability_snapshot.json').read_text()
+
+    assert record_run_changes(lambda: [], 'error', '2027-01-01', '2027-02-01', 'main', watches_path='', history_path='') is None
+    assert (tmp_path / '.cache' / 'availability_snapshot.json').read_text() == snapshot
@@ -0,0 +1,29 @@
+from results_format import iter_result_rows, merge_key, merge_sorted_rows, write_results_stream
+
+def row(miles, date, facility_id, site):
+    return {'miles': miles, 'booking_date': date, 'facility_id': facility_id, 'campsite_site_name': site}
+
+def test_merge_keeps_the_global_order_and_drops_duplicates():
+    rc = [row(10, '2027-01-01', '1', 'A'), row(10, '2027-01-08', '1', 'A'), row(50, '2027-01-01', '3', 'C')]
+    rg = [row(10, '2027-01-01', '2', 'B'), row(10, '2027-01-08', '1', 'A'), row(20, '2027-01-01', '4', 'D')]
+    again = [row(10, '2027-01-01', '1', 'A')]
+
+    merged = list(merge_sorted_rows(iter(rc), iter(rg), iter(again)))
+
+    assert merged == sorted(merged, key=merge_key)
+    assert [(r['facility_id'], r['booking_date']) for r in merged] == [
+        ('1', '2027-01-01'), ('2', '2027-01-01'), ('1', '2027-01-08'), ('4', '2027-01-01'), ('3', '2027-01-01')]
+
+def test_same_site_and_date_at_other_distances_is_not_a_duplicate():
+    merged = list(merge_sorted_rows([row(10, '2027-01-01', '1', 'A')], [row(20, '2027-01-01', '1', 'A')]))
+    assert len(merged) == 2
+
+def test_merge_of_nothing_is_empty():
+    assert list(merge_sorted_rows()) == []
+    assert list(merge_sorted_rows([], [])) == []
+
+def test_streamed_file_round_trips(tmp_path):
+    path = str(tmp_path / 'results.json')
+    rows = [row(10, '2027-01-01', '1', 'A'), row(12, '2027-01-02', '2', 'Site "B", upper')]
+    assert write_results_stream(path, {'search_status': 'success'}, iter(rows), lambda: {'total_results': 2}) == 2
+    assert list(iter_result_rows(path)) == rows
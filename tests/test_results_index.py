@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+
+import pytest
+
+import results_index
+from results_index import QueryError, ResultsIndex, ResultsIndexStore, parse_query
+
+def row(facility_id, site, date, miles):
+    return {'facility_id': facility_id, 'facility_name': f"Camp {facility_id}", 'recreation_area': 'Area',
+            'campsite_site_name': site, 'booking_date': date, 'booking_url': f"https://example.com/{facility_id}",
+            'miles': miles}
+
+DATA = {'last_updated': '2027-01-01T00:00:00', 'search_status': 'success', 'results': [
+    row('1', 'A', '2027-01-08', 40), row('1', 'B', '2027-01-08', 40), row('1', 'A', '2027-01-15', 40),
+    row('2', 'C', '2027-01-01', 10), row('2', 'C', '2027-01-22', 10),
+    row('3', 'D', '2027-01-15', 90),
+]}
+PROVIDERS = {'1': 'recreation_gov', '2': 'reserve_california', '3': 'recreation_gov'}
+
+def query(params, index=ResultsIndex(DATA, PROVIDERS)):
+    return index.query(**parse_query({name: [value] for name, value in params.items()}))
+
+def test_facilities_come_nearest_first_with_sites_per_date():
+    page = query({})
+    assert [facility['id'] for facility in page['facilities']] == ['2', '1', '3']
+    assert page['total_facilities'] == 3 and page['total_results'] == 6
+    assert page['facilities'][1]['sites'] == {'2027-01-08': ['A', 'B'], '2027-01-15': ['A']}
+    assert page['facilities'][1]['provider'] == 'recreation_gov'
+    assert page['last_updated'] == '2027-01-01T00:00:00'
+
+def test_filters_by_date_range_miles_facility_and_provider():
+    page = query({'from': '2027-01-08', 'to': '2027-01-15'})
+    assert [(facility['id'], facility['dates']) for facility in page['facilities']] == [
+        ('1', ['2027-01-08', '2027-01-15']), ('3', ['2027-01-15'])]
+    assert page['total_results'] == 4
+
+    assert [facility['id'] for facility in query({'max_miles': '40'})['facilities']] == ['2', '1']
+    assert [facility['id'] for facility in query({'facility': '3,1'})['facilities']] == ['1', '3']
+    assert [facility['id'] for facility in query({'facility': '3,1', 'max_miles': '50'})['facilities']] == ['1']
+    assert [facility['id'] for facility in query({'provider': 'reserve_california'})['facilities']] == ['2']
+    assert 'sites' not in query({'sites': '0'})['facilities'][0]
+
+def test_pagination():
+    pages = [query({'offset': str(offset), 'limit': '2'}) for offset in (0, 2, 4)]
+    assert [[facility['id'] for facility in page['facilities']] for page in pages] == [['2', '1'], ['3'], []]
+    assert all(page['total_facilities'] == 3 for page in pages)
+    assert pages[1]['offset'] == 2 and pages[1]['limit'] == 2
+
+def test_bad_parameters_are_query_errors():
+    for params in ({'from': 'July'}, {'max_miles': 'far'}, {'limit': '0'}, {'offset': '-1'}, {'provider': 'nope'}):
+        with pytest.raises(QueryError):
+            query(params)
+
+def write_results(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def test_store_swaps_in_a_rebuilt_index_without_blocking_readers(tmp_path, monkeypatch):
+    path = str(tmp_path / 'results.json')
+    write_results(path, DATA)
+    store = ResultsIndexStore(path)
+    swaps = []
+    store.listeners.append(lambda previous, state: swaps.append((previous, state)))
+    first = store.current()
+    assert first[1].total_results == 6 and swaps == [(None, first)]
+    assert store.current() is first
+
+    # A new results file lands; while it is being indexed, readers keep the previous index
+    write_results(path, {**DATA, 'results': DATA['results'][:2]})
+    os.utime(path, ns=(first[0][0] + 10**9, first[0][0] + 10**9))
+    building = threading.Event()
+    release = threading.Event()
+    from_file = ResultsIndex.from_file
+    def slow_from_file(path):
+        building.set()
+        release.wait(timeout=5)
+        return from_file(path)
+    monkeypatch.setattr(results_index.ResultsIndex, 'from_file', slow_from_file)
+    rebuild = threading.Thread(target=store.current)
+    rebuild.start()
+    assert building.wait(timeout=5)
+    assert store.current() is first
+    release.set()
+    rebuild.join()
+
+    second = store.current()
+    assert second is not first and second[1].total_results == 2
+    assert swaps[-1] == (first, second)
+    # The file vanishing mid-replace keeps the last index
+    os.remove(path)
+    assert store.current() is second
+
+def test_store_without_results_raises(tmp_path):
+    with pytest.raises(OSError):
+        ResultsIndexStore(str(tmp_path / 'results.json')).current()
@@ -0,0 +1,35 @@
+import datetime
+import json
+import subprocess
+
+import run_batches
+from run_batches import all_batches_succeeded, run_batch_for_providers
+
+def fake_batch_run(statuses):
+    """A subprocess.run stand-in for main.py that writes results.json with the given status per provider."""
+    def run(cmd, **kwargs):
+        provider = cmd[cmd.index('--provider') + 1]
+        with open('results.json', 'w') as f:
+            json.dump({"search_status": statuses[provider], "error_message": None, "total_results": 1,
+                       "results": [{"facility_id": "1"}]}, f)
+        return subprocess.CompletedProcess(cmd, 0, stdout='', stderr='')
+    return run
+
+def test_isolated_batches_report_status_from_their_batch_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(run_batches.subprocess, 'run', fake_batch_run({
+        'reserve_california': 'success', 'recreation_gov': 'partial'}))
+
+    outcomes = run_batch_for_providers(datetime.date(2027, 1, 1), datetime.date(2027, 4, 1), 'batch1', executor=None, metrics_dir=None)
+
+    assert outcomes['rc_batch1'] == (True, {"search_status": "success", "error_message": None, "total_results": 1})
+    assert outcomes['rg_batch1'][1]['search_status'] == 'partial'
+    assert (tmp_path / 'results_rg_batch1.json').exists()
+    # A partial isolated batch keeps its checkpoints for --resume
+    assert not all_batches_succeeded(outcomes)
+
+def test_all_batches_succeeded():
+    success = {"search_status": "success"}
+    assert all_batches_succeeded({'rc_batch1': (True, success), 'rg_batch1': (True, success)})
+    assert not all_batches_succeeded({'rc_batch1': (True, success), 'rg_batch1': (False, None)})
+    assert not all_batches_succeeded({'rc_batch1': (True, {"search_status": "partial"})})
@@ -0,0 +1,92 @@
+import datetime
+import json
+
+import scheduler
+from scheduler import RefreshScheduler, RefreshTier
+from search_engine import WindowResult
+from stay_profiles import StayRecord
+
+TIERS = [RefreshTier('2 weeks', 14, 3600)]
+
+def fake_search(failing=()):
+    """A run_search_jobs stand-in: every Saturday night is free at each campground's Site 1."""
+    def run_search_jobs(jobs, nights, weekends_only, max_in_flight=3, budget=None, **kwargs):
+        for job in jobs:
+            if job.campground_ids[0] in failing:
+                yield WindowResult(job, error=ConnectionError('connection reset'))
+                continue
+            results = []
+            for start, end in job.search_windows:
+                night = start
+                while night < end:
+                    if night.weekday() == 5:
+                        booking_date = datetime.datetime.combine(night, datetime.time())
+                        results.append(StayRecord(job.campground_ids[0], 'Camp', 'Area', '1', 'Site 1', 'https://example.com',
+                                                  booking_date, booking_date + datetime.timedelta(days=1), 1))
+                    night += datetime.timedelta(days=1)
+            yield WindowResult(job, results)
+    return run_search_jobs
+
+def read_results():
+    with open('results.json') as f:
+        return json.load(f)
+
+def test_publishes_only_once_every_planned_job_has_data(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scheduler, 'run_search_jobs', fake_search())
+    refresh = RefreshScheduler(['saturday'], tiers=TIERS, max_jobs_per_cycle=10)
+    refresh.replan(datetime.date.today())
+    planned = len(refresh.queue)
+    assert planned > 10
+
+    refresh.run(max_cycles=1)
+    assert refresh.missing_jobs() == planned - 10
+    assert not (tmp_path / 'results.json').exists()
+    assert not (tmp_path / 'results_delta.json').exists()
+
+    refresh.run(max_cycles=(planned - 1) // 10)
+    assert refresh.missing_jobs() == 0
+    data = read_results()
+    assert data['search_status'] == 'success'
+    assert {row['facility_id'] for row in data['results']} == {scheduled.job.campground_ids[0] for scheduled in refresh.queue}
+
+def test_day_rollover_carries_nights_over_and_reports_partial(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scheduler, 'run_search_jobs', fake_search())
+    refresh = RefreshScheduler(['saturday'], tiers=TIERS, max_jobs_per_cycle=1000)
+    refresh.replan(datetime.date.today())
+    refresh.run(max_cycles=1)
+    published = read_results()
+
+    # Tomorrow's plan has new jobs; they start from what today's jobs found
+    refresh.replan(datetime.date.today() + datetime.timedelta(days=1))
+    assert refresh.missing_jobs() == 0
+    assert refresh.stale
+    refresh.publish()
+    data = read_results()
+    assert data['search_status'] == 'partial'
+    assert {row['facility_id'] for row in data['results']} == {row['facility_id'] for row in published['results']}
+    # Only the day that dropped out of the horizon can be gone
+    with open('results_delta.json') as f:
+        removed = json.load(f)['removed']
+    new_start = (datetime.date.today() + datetime.timedelta(days=2)).isoformat()
+    assert all(date < new_start for sites in removed.values() for dates in sites.values() for date in dates)
+
+def test_failed_jobs_keep_their_last_data_and_publish_partial(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scheduler, 'run_search_jobs', fake_search())
+    refresh = RefreshScheduler(['saturday'], tiers=TIERS, max_jobs_per_cycle=1000)
+    refresh.replan(datetime.date.today())
+    refresh.run(max_cycles=1)
+    rows = len(read_results()['results'])
+
+    failing = {scheduled.job.campground_ids[0] for scheduled in refresh.queue[:3]}
+    monkeypatch.setattr(scheduler, 'run_search_jobs', fake_search(failing))
+    for scheduled in refresh.queue:
+        scheduled.due = 0
+    refresh.run(max_cycles=1)
+    data = read_results()
+    assert data['search_status'] == 'partial'
+    assert len(data['results']) == rows
+    with open('results_delta.json') as f:
+        assert json.load(f)['removed_count'] == 0
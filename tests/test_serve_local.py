@@ -0,0 +1,73 @@
+import http.client
+import threading
+
+import pytest
+
+from live_events import EventHub
+from serve_local import ResultsRequestHandler, ResultsServer, is_public_path
+
+def start_server(directory, **attributes):
+    """A ResultsServer on a free port serving `directory`; returns (server, port)."""
+    class Handler(ResultsRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=str(directory), **kwargs)
+
+    httpd = ResultsServer(('127.0.0.1', 0), Handler)
+    httpd.quiet = True
+    for name, value in attributes.items():
+        setattr(httpd, name, value)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, httpd.server_address[1]
+
+@pytest.fixture
+def server(tmp_path):
+    for name in ('index.html', 'results.json', 'results.json.gz', 'main.py', 'site_filters.json', 'results.json.tmp'):
+        (tmp_path / name).write_text('x' * 10)
+    for name in ('.cache/watches/watches.sqlite', '.git/config', 'images/favicon.ico'):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text('x' * 10)
+    httpd, port = start_server(tmp_path)
+    yield port
+    httpd.shutdown()
+    httpd.server_close()
+
+def status(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+def test_serves_only_the_page_results_and_images(server):
+    for path in ('/', '/index.html', '/results.json', '/images/favicon.ico'):
+        assert status(server, path) == 200, path
+    for path in ('/main.py', '/site_filters.json', '/results.json.tmp', '/.cache/watches/watches.sqlite',
+                 '/.git/config', '/images/../main.py', '/%2e%2e/etc/passwd'):
+        assert status(server, path) == 404, path
+
+def test_is_public_path():
+    assert is_public_path('results_compact.json.br') and is_public_path('results_from_sf.json')
+    assert not is_public_path('images/.hidden.png')
+    assert not is_public_path('results.json.tmp')
+    assert not is_public_path('.cache/availability_snapshot.json')
+
+class BrokenIndex:
+    """A results index that fails the way an unexpected bug would."""
+    def current(self):
+        raise ValueError('corrupt results.json')
+
+def test_failed_event_streams_give_their_client_slot_back(tmp_path):
+    hub = EventHub(max_clients=1)
+    httpd, port = start_server(tmp_path, event_hub=hub, results_index=BrokenIndex())
+    try:
+        for _ in range(3):
+            with pytest.raises((http.client.HTTPException, ConnectionError)):
+                status(port, '/api/events')
+        assert hub.client_count == 0
+        assert hub.reserve()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
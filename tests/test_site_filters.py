@@ -0,0 +1,85 @@
+import itertools
+from types import SimpleNamespace
+
+from site_filters import SiteFilter, SiteRule, load_site_rules, SITE_FILTERS_PATH
+
+def site(name, facility_id='1', url='https://example.com/campsite/1'):
+    return SimpleNamespace(facility_id=facility_id, campsite_site_name=name, booking_url=url)
+
+def site_filter(*configs):
+    return SiteFilter(tuple(SiteRule(config) for config in configs))
+
+def names(results):
+    return [result.campsite_site_name for result in results]
+
+def test_rules_are_scoped_by_provider_and_facility():
+    rules = site_filter({'name': 'everywhere', 'site_contains': ['Hike']},
+                        {'name': 'rg-only', 'provider': 'recreation_gov', 'site_contains': ['Group']},
+                        {'name': 'one-camp', 'facility': ['7', 8], 'site_contains': ['Loop']})
+    results = [site('Hike 1'), site('Group A'), site('Loop 3'), site('Loop 4', facility_id=8)]
+
+    assert names(rules.filter(results, 'reserve_california')) == ['Group A', 'Loop 3']
+    assert names(rules.filter(results, 'recreation_gov')) == ['Loop 3']
+    # Facility ids are matched as strings, whatever type the provider uses
+    assert names(rules.filter([site('Loop 1', facility_id=7)], 'recreation_gov')) == []
+
+def test_include_rules_win_over_exclude_rules():
+    rules = site_filter({'name': 'walk-in', 'site_contains_ci': ['walk']},
+                        {'name': 'keep-group', 'action': 'include', 'site_regex': '^Group'})
+    results = [site('Walk-in 1'), site('Group Walk-in'), site('Site 2')]
+
+    assert names(rules.filter(results)) == ['Group Walk-in', 'Site 2']
+    assert rules.hits == {'walk-in': 1, 'keep-group': 1}
+    assert rules.summary() == "Site filter: walk-in dropped 1, keep-group kept 1"
+
+def test_verdicts_are_memoized_per_site_name():
+    rules = site_filter({'name': 'hike-in', 'site_contains': ['Hike']})
+    rules.filter([site('Hike 1'), site('Site 2')])
+    matcher = rules.matcher(None, '1')
+    assert set(matcher.verdicts) == {'Hike 1', 'Site 2'}
+    assert rules.matcher(None, '1') is matcher
+
+    rules.filter([site('Hike 1'), site('Hike 1')])
+    assert len(matcher.verdicts) == 2
+    assert rules.hits == {'hike-in': 3}
+
+def test_kirby_cove_day_use_site_is_dropped_by_url():
+    kirby = SiteFilter(load_site_rules(SITE_FILTERS_PATH))
+    results = [site('Site 1', '232491', 'https://example.com/campsite/4241'),
+               site('Site 2', '232491', 'https://example.com/campsite/4242'),
+               site('Site 1', '100', 'https://example.com/campsite/4241')]
+
+    kept = kirby.filter(results, 'recreation_gov')
+
+    assert kept == results[1:]
+    assert kirby.matcher('recreation_gov', '232491').uses_url
+    assert not kirby.matcher('recreation_gov', '100').uses_url
+    assert kirby.hits == {'kirby-cove-day-use': 1}
+
+def test_regexes_with_their_own_groups_keep_working():
+    rules = site_filter({'name': 'doubled', 'site_regex': r'(\d)\1'},
+                        {'name': 'named', 'site_regex': r'(?P<r0>Loop) (?P=r0)'},
+                        {'name': 'plain', 'site_regex': '^Tent'})
+    results = [site('Site 11'), site('Site 12'), site('Loop Loop'), site('Loop A'), site('Tent 3')]
+
+    assert names(rules.filter(results)) == ['Site 12', 'Loop A']
+    assert rules.hits == {'doubled': 1, 'named': 1, 'plain': 1}
+
+def test_site_filters_json_keeps_what_the_original_filter_kept():
+    def original_keeps(result):
+        return ("Hike" not in result.campsite_site_name
+                and "Accessible" not in result.campsite_site_name
+                and "ADA" not in result.campsite_site_name
+                and "day" not in result.campsite_site_name.lower()
+                and "walk" not in result.campsite_site_name.lower()
+                and ("4241" not in result.booking_url or str(result.facility_id) != "232491"))
+
+    site_names = ['Site 1', 'Hike-in 2', 'hike 3', 'Accessible 4', 'ADA 5', 'Ada 6', 'Day Use', 'SUNDAY',
+                  'Walk-in 7', 'WALKUP', 'Group A', 'Cabin 4241']
+    urls = ['https://example.com/campsite/4241', 'https://example.com/campsite/1000']
+    results = [site(name, facility_id, url)
+               for name, facility_id, url in itertools.product(site_names, ['232491', 232491, '100'], urls)]
+
+    kept = SiteFilter(load_site_rules(SITE_FILTERS_PATH)).filter(results, 'recreation_gov')
+
+    assert kept == [result for result in results if original_keeps(result)]
@@ -0,0 +1,47 @@
+import datetime
+
+import numpy as np
+
+from stay_profiles import STAY_PROFILES, NightBitmap, StayProfile, StayRecord
+
+START = datetime.date(2027, 1, 1)  # A Friday
+
+def night(site, day, nights=1):
+    booking_date = datetime.datetime.combine(START + datetime.timedelta(days=day), datetime.time())
+    return StayRecord('100', 'Camp', 'Area', site, f"Site {site}", 'https://example.com', booking_date,
+                      booking_date + datetime.timedelta(days=nights), nights)
+
+def test_bitmap_marks_every_night_a_record_covers():
+    bitmap = NightBitmap.from_nights([night('1', 0), night('2', 2, nights=3), night('1', 30)], START,
+                                     START + datetime.timedelta(days=7))
+    assert bitmap.matrix.tolist() == [
+        [True, False, False, False, False, False, False],
+        [False, False, True, True, True, False, False]
+    ]
+    assert [site['campsite_id'] for site in bitmap.sites] == ['1', '2']
+
+def test_stays_need_every_night_free_and_an_allowed_checkin_weekday():
+    # Site 1 is free Fri + Sat, site 2 only Saturday, site 3 Sat + Sun
+    records = [night('1', 0), night('1', 1), night('2', 1), night('3', 1), night('3', 2)]
+    bitmap = NightBitmap.from_nights(records, START, START + datetime.timedelta(days=14))
+
+    weekend = bitmap.derive(STAY_PROFILES['weekend'])
+    assert [(stay.campsite_id, stay.booking_date.date(), stay.booking_nights) for stay in weekend] == [('1', START, 2)]
+    assert weekend[0].booking_end_date.date() == START + datetime.timedelta(days=2)
+    saturdays = bitmap.stay_starts(STAY_PROFILES['saturday'])
+    assert saturdays.sum(axis=1).tolist() == [1, 1, 1]
+    assert bitmap.stay_starts(StayProfile('sat_sun', 2, (5,)))[:, 1].tolist() == [False, False, True]
+
+def test_stays_must_end_by_the_bitmap_end():
+    bitmap = NightBitmap.from_nights([night('1', 0), night('1', 1)], START, START + datetime.timedelta(days=2))
+    assert bitmap.stay_starts(STAY_PROFILES['weekend']).tolist() == [[True]]
+    assert bitmap.stay_starts(STAY_PROFILES['long_weekend']).shape == (1, 0)
+
+def test_save_and_load_round_trip(tmp_path):
+    bitmap = NightBitmap.from_nights([night('1', 0), night('2', 9, nights=2)], START, START + datetime.timedelta(days=11))
+    path = tmp_path / 'bitmap.npz'
+    bitmap.save(path)
+
+    loaded = NightBitmap.load(path)
+    assert (loaded.start_date, loaded.end_date, loaded.sites) == (bitmap.start_date, bitmap.end_date, bitmap.sites)
+    assert np.array_equal(loaded.matrix, bitmap.matrix)
@@ -0,0 +1,55 @@
+import datetime
+import json
+
+from results_delta import unsearched_checkins
+from run_changes import record_run_changes
+from watch_alerts import Watch, WatchStore, deliver_watch_alerts
+
+def row(facility_id, site, date):
+    return {'facility_id': facility_id, 'campsite_site_name': site, 'booking_date': date,
+            'facility_name': f"Camp {facility_id}", 'recreation_area': 'Area', 'booking_url': None}
+
+def run(rows, search_status, watches_path, outbox, unsearched=None):
+    start = datetime.date.today()
+    return record_run_changes(lambda: rows, search_status, start, start + datetime.timedelta(days=90), 'main', unsearched,
+                              str(watches_path), str(outbox), history_path='')
+
+def take_matches(outbox):
+    """Consume the outbox like a delivery job: [(watch id, facility_id, site, date)]."""
+    matches = []
+    for path in sorted(outbox.glob('*.json')):
+        data = json.loads(path.read_text())
+        matches += [(data['watch']['id'], m['facility_id'], m['campsite_site_name'], m['booking_date']) for m in data['matches']]
+        path.unlink()
+    return matches
+
+def test_failed_or_partial_runs_do_not_cause_duplicate_alerts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    watches_path, outbox = tmp_path / 'watches.sqlite', tmp_path / 'outbox'
+    store = WatchStore(str(watches_path))
+    store.add(Watch(id='anything'))
+    store.close()
+    date = (datetime.date.today() + datetime.timedelta(days=30)).isoformat()
+    rows = [row('649', 'Site 1', date)]
+
+    run(rows, 'success', watches_path, outbox)
+    assert take_matches(outbox) == [('anything', '649', 'Site 1', date)]
+
+    # A failed run found nothing: that must not forget the queued entry...
+    assert run([], 'error', watches_path, outbox) is None
+    assert deliver_watch_alerts(None, str(watches_path), str(outbox)) == {}
+    run(rows, 'success', watches_path, outbox)
+    assert take_matches(outbox) == []
+
+    # ...and neither must a partial run that did not search its date
+    unsearched = unsearched_checkins([(['649'], datetime.date.fromisoformat(date), datetime.date.fromisoformat(date) +
+                                       datetime.timedelta(days=7))], nights=2)
+    delta = run([], 'partial', watches_path, outbox, unsearched)
+    assert delta['removed_count'] == 0
+    run(rows, 'success', watches_path, outbox)
+    assert take_matches(outbox) == []
+
+    # Once a complete run sees it booked, a reopening alerts again
+    run([], 'success', watches_path, outbox)
+    run(rows, 'success', watches_path, outbox)
+    assert take_matches(outbox) == [('anything', '649', 'Site 1', date)]
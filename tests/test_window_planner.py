@@ -0,0 +1,55 @@
+import datetime
+
+from main import generate_monthly_search_windows
+from window_planner import (candidate_stays, checkin_weekdays, coalesce_stays, count_monthly_calls, count_provider_calls,
+                            months_of_nights, plan_search_jobs, split_batches)
+
+D = datetime.date
+
+def test_candidate_stays_follow_the_checkin_weekdays_and_end_by_end_date():
+    # 2027-01-01 is a Friday
+    stays = candidate_stays(D(2027, 1, 1), D(2027, 1, 17), nights=2, weekdays=checkin_weekdays(True))
+    assert stays == [(D(2027, 1, 1), D(2027, 1, 3)), (D(2027, 1, 8), D(2027, 1, 10)), (D(2027, 1, 15), D(2027, 1, 17))]
+    assert candidate_stays(D(2027, 1, 1), D(2027, 1, 16), nights=2, weekdays=checkin_weekdays(True))[-1][0] == D(2027, 1, 8)
+
+def test_months_of_nights_uses_an_exclusive_end():
+    assert months_of_nights(D(2027, 1, 30), D(2027, 2, 1)) == {D(2027, 1, 1)}
+    assert months_of_nights(D(2027, 1, 30), D(2027, 3, 2)) == {D(2027, 1, 1), D(2027, 2, 1), D(2027, 3, 1)}
+
+def test_coalesce_cuts_spans_at_month_boundaries_and_the_window_limit():
+    stays = candidate_stays(D(2027, 1, 1), D(2027, 3, 1), nights=2)
+    spans = coalesce_stays(stays, max_window_days=31)
+    assert spans[0] == (D(2027, 1, 1), D(2027, 2, 1))
+    assert all((end - start).days <= 31 for start, end in spans)
+    for checkin, checkout in stays:
+        assert any(start <= checkin and checkout <= end for start, end in spans)
+
+def test_plan_covers_every_stay_and_fetches_each_month_once():
+    start, end = D(2027, 1, 1), D(2027, 7, 1)
+    stays = candidate_stays(start, end, nights=2, weekdays=checkin_weekdays(True))
+    jobs = plan_search_jobs(start, end, 'recreation_gov', nights=2, weekdays=checkin_weekdays(True))
+
+    for checkin, checkout in stays:
+        assert any(window_start <= checkin and checkout <= window_end for job in jobs for window_start, window_end in job.windows)
+    assert all(len(job.months) <= 2 for job in jobs)
+    assert count_provider_calls(jobs) == len(set().union(*(job.months for job in jobs)))
+    assert count_provider_calls(jobs) <= count_monthly_calls(generate_monthly_search_windows(start, end, True), True,
+                                                             today=start)
+
+def test_a_stay_across_new_year_ties_both_months_into_one_job():
+    # Friday 2027-12-31 -> Sunday 2028-01-02
+    jobs = plan_search_jobs(D(2027, 12, 31), D(2028, 1, 2), 'reserve_california', nights=2,
+                            weekdays=checkin_weekdays(True))
+    assert len(jobs) == 1
+    assert jobs[0].months == {D(2027, 12, 1), D(2028, 1, 1)}
+
+def test_split_batches_lands_on_a_job_boundary():
+    weekends = checkin_weekdays(True)
+    (start1, end1), (start2, end2) = split_batches(D(2027, 1, 1), D(2027, 7, 1), D(2027, 4, 1), None, 2, weekends)
+    assert (start1, end2) == (D(2027, 1, 1), D(2027, 7, 1))
+    # Between them the batches still cover every stay
+    assert (candidate_stays(start1, end1, 2, weekends) + candidate_stays(start2, end2, 2, weekends) ==
+            candidate_stays(D(2027, 1, 1), D(2027, 7, 1), 2, weekends))
+    batch1 = plan_search_jobs(start1, end1, None, 2, weekends)
+    batch2 = plan_search_jobs(start2, end2, None, 2, weekends)
+    assert not set().union(*(job.months for job in batch1)) & set().union(*(job.months for job in batch2))
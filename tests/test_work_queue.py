@@ -0,0 +1,97 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+from sharded_crawl import WorkQueue
+
+ITEMS = [('recreation_gov', str(campground_id), [['2027-01-01', '2027-01-03']]) for campground_id in range(1, 6)]
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'))
+    queue.create({'start_date': '2027-01-01'}, ITEMS)
+    yield queue
+    queue.close()
+
+def test_claim_leases_each_item_once_in_order(queue, clock):
+    claimed = [queue.claim('w1', lease_seconds=60) for _ in ITEMS]
+
+    assert [item['campground_id'] for item in claimed] == ['1', '2', '3', '4', '5']
+    assert claimed[0]['windows'] == [(datetime.date(2027, 1, 1), datetime.date(2027, 1, 3))]
+    assert claimed[0]['attempt'] == 1
+    assert queue.claim('w2') is None
+    assert queue.counts()['leased'] == 5
+
+def test_lapsed_lease_goes_to_another_worker(queue, clock):
+    item = queue.claim('w1', lease_seconds=60)
+    clock.now += 30
+    assert queue.renew('w1', lease_seconds=60) == 1
+    clock.now += 61
+    assert queue.counts()['pending'] == 5  # The lapsed lease counts as pending again
+
+    taken = queue.claim('w2', lease_seconds=60)
+    assert (taken['id'], taken['attempt']) == (item['id'], 2)
+    # The first worker's late result no longer counts; the new holder's does
+    assert not queue.complete(item['id'], 'w1')
+    assert queue.fail(item['id'], 'w1', 'late') is None
+    assert queue.complete(taken['id'], 'w2', seconds=1.5, site_nights=3)
+    assert queue.items('done')[0]['site_nights'] == 3
+
+def test_item_fails_after_its_leases_lapse_max_attempts_times(queue, clock):
+    for attempt in range(1, 4):
+        item = queue.claim(f"w{attempt}", lease_seconds=10, max_attempts=3)
+        assert (item['id'], item['attempt']) == (1, attempt)
+        clock.now += 11
+
+    assert queue.claim('w4', lease_seconds=10, max_attempts=3)['id'] == 2
+    failed = queue.items('failed')
+    assert [item['id'] for item in failed] == [1]
+    assert failed[0]['error'] == 'Lease lapsed after 3 attempts'
+    assert queue.requeue_failed() == 1
+    assert queue.items('pending')[0]['attempts'] == 0
+
+def test_fail_retries_until_attempts_run_out(queue, clock):
+    item = queue.claim('w1')
+    assert queue.fail(item['id'], 'w1', 'connection reset', max_attempts=2) == 'pending'
+    item = queue.claim('w1')
+    assert queue.fail(item['id'], 'w1', 'connection reset', max_attempts=2) == 'failed'
+    item = queue.claim('w1')
+    assert queue.fail(item['id'], 'w1', 'not found', retry=False) == 'failed'
+    assert queue.counts()['failed'] == 2
+
+def test_concurrent_workers_never_share_an_item(tmp_path):
+    path = str(tmp_path / 'queue.sqlite')
+    setup = WorkQueue(path)
+    setup.create({}, [('recreation_gov', str(campground_id), []) for campground_id in range(200)])
+    setup.close()
+    claimed = []
+
+    def work(worker):
+        queue = WorkQueue(path)
+        try:
+            while (item := queue.claim(worker)) is not None:
+                claimed.append(item['id'])
+        finally:
+            queue.close()
+
+    threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == list(range(1, 201))
@@ -0,0 +1,344 @@
+"""
+Watches: saved searches that are alerted when matching availability opens up.
+
+A watch narrows availability by any of: facilities, check-in dates (a list or a range),
+check-in weekdays and a maximum distance, e.g. "any site within 60 miles, weekend of Nov 6":
+
+    python watch_alerts.py add --label "Nov 6 weekend" --max-miles 60 --date 2026-11-06
+
+After each run, the newly available entries from results_delta.json are matched against the
+watches through inverted indexes, so the cost scales with changes x candidate watches rather
+than watches x rows. Each watch is posted under its most selective condition:
+    facility  -> watches naming that facility
+    date      -> watches naming that check-in date (ranges are expanded)
+    distance  -> watches by the distance band of their max miles (campsites_map.DISTANCE_BANDS)
+    anything  -> watches with none of the above
+and each candidate is then checked against the watch's full conditions.
+
+Matches are queued in a spool directory, one <watch id>.json per watch with its pending
+matches, deduplicated; whatever delivers alerts consumes (and deletes) the files. An entry is
+queued once per watch until it is booked, and again if it opens up later.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict, field
+from typing import List, Optional
+from campsites_map import DISTANCE_BANDS, distance_band, load_catalog
+from results_delta import iter_delta_entries, write_json_atomic, DEFAULT_DELTA_PATH
+
+DEFAULT_WATCHES_PATH = os.path.join('.cache', 'watches', 'watches.sqlite')
+DEFAULT_OUTBOX_DIR = os.path.join('.cache', 'watches', 'outbox')
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+@dataclass
+class Watch:
+    """One saved search; conditions left as None match anything."""
+    id: str
+    label: str = ''
+    facility_ids: Optional[List[str]] = None
+    dates: Optional[List[str]] = None       # Check-in dates (YYYY-MM-DD)
+    date_from: Optional[str] = None         # Check-in date range, inclusive
+    date_to: Optional[str] = None
+    weekdays: Optional[List[int]] = None    # Check-in weekdays, Monday = 0
+    max_miles: Optional[float] = None
+    created_at: float = field(default_factory=time.time)
+
+    def matches(self, facility_id, booking_date, miles):
+        if self.facility_ids is not None and facility_id not in self.facility_ids:
+            return False
+        if self.dates is not None and booking_date not in self.dates:
+            return False
+        if self.date_from is not None and booking_date < self.date_from:
+            return False
+        if self.date_to is not None and booking_date > self.date_to:
+            return False
+        if self.weekdays is not None and datetime.date.fromisoformat(booking_date).weekday() not in self.weekdays:
+            return False
+        if self.max_miles is not None and (miles is None or miles > self.max_miles):
+            return False
+        return True
+
+    def indexed_dates(self):
+        """Every check-in date the watch is limited to, or None if it isn't limited to a finite set."""
+        if self.dates is not None:
+            return [date for date in self.dates
+                    if (self.date_from is None or date >= self.date_from) and (self.date_to is None or date <= self.date_to)]
+        if self.date_from is not None and self.date_to is not None:
+            first = datetime.date.fromisoformat(self.date_from)
+            last = datetime.date.fromisoformat(self.date_to)
+            return [(first + datetime.timedelta(days=offset)).isoformat() for offset in range((last - first).days + 1)]
+        return None
+
+    def describe(self):
+        parts = []
+        if self.facility_ids is not None:
+            parts.append(f"facilities {', '.join(self.facility_ids)}")
+        if self.dates is not None:
+            parts.append(f"check-in {', '.join(self.dates)}")
+        if self.date_from is not None or self.date_to is not None:
+            parts.append(f"check-in {self.date_from or '...'} to {self.date_to or '...'}")
+        if self.weekdays is not None:
+            parts.append(f"on {','.join(WEEKDAY_NAMES[day] for day in self.weekdays)}")
+        if self.max_miles is not None:
+            parts.append(f"within {self.max_miles:g} miles")
+        return f"{self.id} {self.label!r}: {'; '.join(parts) or 'anything'}"
+
+# Bands in increasing order, None (further than every bound) last
+_BANDS = list(DISTANCE_BANDS) + [None]
+
+class WatchIndex:
+    """Inverted indexes over a set of watches, each watch posted under one key."""
+
+    def __init__(self, watches):
+        self.watches = list(watches)
+        self.by_facility = {}
+        self.by_date = {}
+        self.by_band = {band: [] for band in _BANDS}
+        self.unrestricted = []
+        for watch in self.watches:
+            dates = watch.indexed_dates()
+            if watch.facility_ids is not None and (dates is None or len(watch.facility_ids) <= len(dates)):
+                for facility_id in watch.facility_ids:
+                    self.by_facility.setdefault(facility_id, []).append(watch)
+            elif dates is not None:
+                for date in dates:
+                    self.by_date.setdefault(date, []).append(watch)
+            elif watch.max_miles is not None:
+                self.by_band[distance_band(watch.max_miles)].append(watch)
+            else:
+                self.unrestricted.append(watch)
+
+    def candidates(self, facility_id, booking_date, miles):
+        """Watches that might match an entry: those posted under its facility, date or a wide enough band."""
+        candidates = self.by_facility.get(facility_id, []) + self.by_date.get(booking_date, []) + self.unrestricted
+        if miles is not None:
+            band = distance_band(miles)
+            for bound in _BANDS[_BANDS.index(band):]:
+                candidates.extend(self.by_band[bound])
+        return candidates
+
+    def match(self, entries, miles_lookup):
+        """{watch id: [(facility_id, site, booking_date), ...]} for entries of (facility_id, site, booking_date)."""
+        matched = {}
+        for facility_id, site, booking_date in entries:
+            miles = miles_lookup.get(facility_id)
+            for watch in self.candidates(facility_id, booking_date, miles):
+                if watch.matches(facility_id, booking_date, miles):
+                    matched.setdefault(watch.id, []).append((facility_id, site, booking_date))
+        return matched
+
+class WatchStore:
+    """Watches and the entries already queued for each, in SQLite."""
+
+    def __init__(self, path=DEFAULT_WATCHES_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS watches (
+                id TEXT PRIMARY KEY,
+                spec TEXT
+            );
+            CREATE TABLE IF NOT EXISTS notified (
+                watch_id TEXT,
+                facility_id TEXT,
+                site TEXT,
+                booking_date TEXT,
+                notified_at REAL,
+                PRIMARY KEY (watch_id, facility_id, site, booking_date)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS notified_entry ON notified (facility_id, booking_date, site);
+        """)
+        self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def add(self, *watches):
+        """Add (or replace) watches in one transaction; returns the first."""
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO watches VALUES (?, ?)",
+                                  [(watch.id, json.dumps(asdict(watch))) for watch in watches])
+            self.conn.commit()
+        return watches[0] if watches else None
+
+    def remove(self, watch_id):
+        with self.lock:
+            removed = self.conn.execute("DELETE FROM watches WHERE id = ?", (watch_id,)).rowcount
+            self.conn.execute("DELETE FROM notified WHERE watch_id = ?", (watch_id,))
+            self.conn.commit()
+        return removed > 0
+
+    def watches(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT spec FROM watches ORDER BY id").fetchall()
+        return [Watch(**json.loads(spec)) for spec, in rows]
+
+    def mark_notified(self, matched):
+        """Record matches as queued; returns only those not queued before, {watch id: [entries]}."""
+        fresh = {}
+        now = time.time()
+        with self.lock:
+            # One indexed lookup per distinct entry, rather than one per (watch, entry) match
+            queued = set()
+            for facility_id, site, booking_date in {entry for entries in matched.values() for entry in entries}:
+                queued.update((watch_id, facility_id, site, booking_date) for watch_id, in self.conn.execute(
+                    "SELECT watch_id FROM notified WHERE facility_id = ? AND booking_date = ? AND site = ?",
+                    (facility_id, booking_date, site)))
+            for watch_id, entries in matched.items():
+                for entry in entries:
+                    if (watch_id,) + entry not in queued:
+                        queued.add((watch_id,) + entry)
+                        fresh.setdefault(watch_id, []).append(entry)
+            self.conn.executemany("INSERT INTO notified VALUES (?, ?, ?, ?, ?)",
+                                  [(watch_id,) + entry + (now,) for watch_id, entries in fresh.items() for entry in entries])
+            self.conn.commit()
+        return fresh
+
+    def forget(self, entries, before_date=None):
+        """Entries that were booked (or dates before before_date) can be alerted again if they reopen."""
+        with self.lock:
+            self.conn.executemany("DELETE FROM notified WHERE facility_id = ? AND booking_date = ? AND site = ?",
+                                  [(facility_id, booking_date, site) for facility_id, site, booking_date in entries])
+            if before_date is not None:
+                self.conn.execute("DELETE FROM notified WHERE booking_date < ?", (before_date,))
+            self.conn.commit()
+
+def queue_matches(outbox_dir, watch, entries, catalog):
+    """Add matches to the watch's spool file, merged with (and deduplicated against) what is pending."""
+    os.makedirs(outbox_dir, exist_ok=True)
+    path = os.path.join(outbox_dir, f"{watch.id}.json")
+    pending = []
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                pending = json.load(f).get('matches', [])
+        except (OSError, ValueError):
+            pending = []
+    seen = {(match['facility_id'], match['campsite_site_name'], match['booking_date']) for match in pending}
+    for facility_id, site, booking_date in entries:
+        if (facility_id, site, booking_date) in seen:
+            continue
+        seen.add((facility_id, site, booking_date))
+        campsite = catalog.by_id.get(facility_id)
+        pending.append({
+            'facility_id': facility_id,
+            'facility_name': campsite.campground_name if campsite else None,
+            'recreation_area': campsite.park_name if campsite else None,
+            'campsite_site_name': site,
+            'booking_date': booking_date,
+            'booking_url': campsite.url if campsite else None,
+            'miles': campsite.miles if campsite else None
+        })
+    pending.sort(key=lambda match: (match['booking_date'], match['miles'] if match['miles'] is not None else 999,
+                                    match['facility_id'], match['campsite_site_name']))
+    write_json_atomic({'watch': asdict(watch), 'updated_at': time.time(), 'matches': pending}, path, separators=(',', ':'))
+    return path
+
+def deliver_watch_alerts(delta, path=DEFAULT_WATCHES_PATH, outbox_dir=DEFAULT_OUTBOX_DIR):
+    """
+    Match a run's delta (see results_delta.update_delta) against the watches at `path` and
+    queue new matches in outbox_dir. Does nothing without a watch store (or with a falsy path),
+    or without a delta: a failed run must not forget what was already queued, or the next run
+    would alert it again. A partial run's delta only removes entries it searched.
+    Returns {watch id: number of new matches}.
+    """
+    if delta is None or not path or not os.path.exists(path):
+        return {}
+    store = WatchStore(path)
+    try:
+        watches = store.watches()
+        if not watches:
+            return {}
+        started = time.perf_counter()
+        catalog = load_catalog()
+        today = datetime.date.today().isoformat()
+        store.forget(list(iter_delta_entries(delta.get('removed', {}))), before_date=today)
+        index = WatchIndex(watches)
+        added = [entry for entry in iter_delta_entries(delta.get('added', {})) if entry[2] >= today]
+        fresh = store.mark_notified(index.match(added, catalog.miles_lookup))
+        by_id = {watch.id: watch for watch in watches}
+        for watch_id, entries in fresh.items():
+            queue_matches(outbox_dir, by_id[watch_id], entries, catalog)
+        elapsed = time.perf_counter() - started
+        print(f"🔔 Watches: {sum(len(entries) for entries in fresh.values())} new matches for {len(fresh)} of "
+              f"{len(watches)} watches from {len(added)} new entries ({elapsed:.2f}s), queued in {outbox_dir}")
+        return {watch_id: len(entries) for watch_id, entries in fresh.items()}
+    finally:
+        store.close()
+
+def parse_weekdays(value):
+    """'Fri,Sat' -> [4, 5]"""
+    names = [name.strip()[:3].title() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in WEEKDAY_NAMES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown weekday(s): {', '.join(unknown)}")
+    return [WEEKDAY_NAMES.index(name) for name in names]
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Not a YYYY-MM-DD date: {value!r}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage availability watches and match them against results_delta.json')
+    parser.add_argument('--path', type=str, default=DEFAULT_WATCHES_PATH, help='SQLite watch store')
+    parser.add_argument('--outbox', type=str, default=DEFAULT_OUTBOX_DIR, help='Spool directory for matches')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help='Add a watch')
+    add.add_argument('--id', type=str, help='Watch id (default: generated)')
+    add.add_argument('--label', type=str, default='', help='Description, e.g. who to alert')
+    add.add_argument('--facility', action='append', help='Facility id (repeatable)')
+    add.add_argument('--date', type=parse_date, action='append', help='Check-in date (repeatable)')
+    add.add_argument('--from', dest='date_from', type=parse_date, help='First check-in date')
+    add.add_argument('--to', dest='date_to', type=parse_date, help='Last check-in date')
+    add.add_argument('--weekdays', type=parse_weekdays, help='Check-in weekdays, e.g. Fri,Sat')
+    add.add_argument('--max-miles', type=float, help='Maximum distance')
+    load = commands.add_parser('import', help='Add watches from a JSON list of watch objects')
+    load.add_argument('file', type=str)
+    remove = commands.add_parser('remove', help='Remove a watch')
+    remove.add_argument('id', type=str)
+    commands.add_parser('list', help='List watches')
+    match = commands.add_parser('match', help='Match a delta file against the watches')
+    match.add_argument('delta', nargs='?', default=DEFAULT_DELTA_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'match':
+        with open(args.delta) as f:
+            deliver_watch_alerts(json.load(f), args.path, args.outbox)
+        return
+
+    store = WatchStore(args.path)
+    if args.command == 'add':
+        watch = store.add(Watch(id=args.id or uuid.uuid4().hex[:12], label=args.label, facility_ids=args.facility,
+                                dates=args.date, date_from=args.date_from, date_to=args.date_to,
+                                weekdays=args.weekdays, max_miles=args.max_miles))
+        print(f"Added {watch.describe()}")
+    elif args.command == 'import':
+        with open(args.file) as f:
+            specs = json.load(f)
+        store.add(*[Watch(**dict(spec, id=spec.get('id') or uuid.uuid4().hex[:12])) for spec in specs])
+        print(f"Imported {len(specs)} watches")
+    elif args.command == 'remove':
+        print(f"Removed {args.id}" if store.remove(args.id) else f"No watch {args.id}")
+    elif args.command == 'list':
+        watches = store.watches()
+        for watch in watches:
+            print(watch.describe())
+        print(f"{len(watches)} watches")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Stay-precise search window planner.
+
+camply fetches availability one calendar month at a time for every month that contains a
+night being searched, then filters to those nights. So the cost of a search is
+(months touched) x (campgrounds), and two searches that touch the same month both pay for it.
+
+Instead of whole calendar months, the planner:
+  1. lists the candidate stays (check-in weekday pattern + number of nights),
+  2. coalesces overlapping/adjacent stays into spans, capped at the provider's max window size,
+  3. groups spans into search jobs so that each month is fetched by one job where possible
+     (a Fri 31st -> Sat 1st stay ties two months into the same job).
+Windows are (start, end) pairs with an exclusive end, like camply's SearchWindow.
+"""
+
+import datetime
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+# Longest single search window and most months a single search job may touch, per provider
+PROVIDER_WINDOW_LIMITS = {
+    'reserve_california': {'max_window_days': 31, 'max_months_per_job': 2},
+    'recreation_gov': {'max_window_days': 31, 'max_months_per_job': 2}
+}
+DEFAULT_WINDOW_LIMITS = {'max_window_days': 31, 'max_months_per_job': 2}
+
+ALL_WEEKDAYS = frozenset(range(7))
+FRIDAY = 4
+
+def checkin_weekdays(weekends_only):
+    """Check-in weekdays for the current search modes: Friday for weekend stays, any day otherwise."""
+    return frozenset({FRIDAY}) if weekends_only else ALL_WEEKDAYS
+
+def months_of_nights(start, end):
+    """First-of-month dates for every month with a night in [start, end)."""
+    months = set()
+    night = start
+    while night < end:
+        months.add(night.replace(day=1))
+        # Jump to the first night of the next month
+        night = (night.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return months
+
+@dataclass
+class PlannedJob:
+    """A group of search windows meant for one camply searcher."""
+    windows: List[Tuple[datetime.date, datetime.date]] = field(default_factory=list)
+    months: set = field(default_factory=set)
+
+    @property
+    def start(self):
+        return self.windows[0][0]
+
+    @property
+    def end(self):
+        return max(end for _, end in self.windows)
+
+def candidate_stays(start_date, end_date, nights=2, weekdays=ALL_WEEKDAYS):
+    """
+    All (check-in, check-out) stays with a check-in weekday in `weekdays`,
+    starting on or after start_date and checking out no later than end_date.
+    """
+    stays = []
+    checkin = start_date
+    while checkin + datetime.timedelta(days=nights) <= end_date:
+        if checkin.weekday() in weekdays:
+            stays.append((checkin, checkin + datetime.timedelta(days=nights)))
+        checkin += datetime.timedelta(days=1)
+    return stays
+
+def coalesce_stays(stays, max_window_days):
+    """
+    Merge overlapping or back-to-back stays into spans no longer than max_window_days.
+    A new span starts at the first stay checking in in a new month (so continuous runs are cut
+    at month boundaries, where camply's fetches are cut anyway) or when a stay would push a span
+    past the limit; spans may then overlap, but every stay stays inside one span.
+    """
+    spans = []
+    for checkin, checkout in stays:
+        if spans:
+            span_start, span_end = spans[-1]
+            if (checkin <= span_end and (checkin.year, checkin.month) == (span_start.year, span_start.month)
+                    and (checkout - span_start).days <= max_window_days):
+                spans[-1] = (span_start, max(span_end, checkout))
+                continue
+        spans.append((checkin, checkout))
+    return spans
+
+def group_spans(spans, max_months_per_job):
+    """
+    Group time-ordered spans into jobs: a span joins the current job when they share a month
+    (so that month is fetched once), unless the job would then touch more than max_months_per_job months.
+    """
+    jobs = []
+    for span in spans:
+        months = months_of_nights(*span)
+        if jobs:
+            job = jobs[-1]
+            if months & job.months and len(months | job.months) <= max_months_per_job:
+                job.windows.append(span)
+                job.months |= months
+                continue
+        jobs.append(PlannedJob(windows=[span], months=set(months)))
+    return jobs
+
+def plan_search_jobs(start_date, end_date, provider, nights=2, weekdays=ALL_WEEKDAYS):
+    """
+    Plan the search jobs covering every candidate stay between start_date and end_date.
+    """
+    return plan_stay_jobs(candidate_stays(start_date, end_date, nights, weekdays), provider)
+
+def plan_stay_jobs(stays, provider):
+    """
+    Plan the search jobs covering a list of (check-in, check-out) stays,
+    e.g. the union of several stay profiles' candidate stays.
+    """
+    limits = PROVIDER_WINDOW_LIMITS.get(provider, DEFAULT_WINDOW_LIMITS)
+    spans = coalesce_stays(sorted(set(stays)), limits['max_window_days'])
+    return group_spans(spans, limits['max_months_per_job'])
+
+def count_provider_calls(jobs):
+    """Provider calls per campground: every job fetches each month it touches once."""
+    return sum(len(job.months) for job in jobs)
+
+def count_monthly_calls(monthly_windows, weekends_only, today=None):
+    """
+    Provider calls per campground for windows from generate_monthly_search_windows
+    (camply only fetches months containing a searched night from today on).
+    """
+    today = today or datetime.date.today()
+    weekdays = {FRIDAY, FRIDAY + 1} if weekends_only else ALL_WEEKDAYS
+    calls = 0
+    for window_start, window_end in monthly_windows:
+        months = set()
+        night = max(window_start, today)
+        while night < window_end:
+            if night.weekday() in weekdays:
+                months.add(night.replace(day=1))
+            night += datetime.timedelta(days=1)
+        calls += len(months)
+    return calls
+
+def split_batches(start_date, end_date, split_date, provider, nights=2, weekdays=ALL_WEEKDAYS):
+    """
+    Plan [start_date, end_date) globally and split it into two batch date ranges near split_date.
+    The split is placed on a job boundary, preferring one where neither side fetches the other's
+    months, so the boundary month is not fetched by both batches.
+    Returns [(batch1_start, batch1_end), (batch2_start, batch2_end)].
+    """
+    jobs = plan_search_jobs(start_date, end_date, provider, nights, weekdays)
+    if len(jobs) < 2:
+        return [(start_date, end_date), (end_date, end_date)]
+
+    def cost(index):
+        shared = len(set().union(*(job.months for job in jobs[:index])) & set().union(*(job.months for job in jobs[index:])))
+        return (shared, abs((jobs[index].start - split_date).days))
+
+    index = min(range(1, len(jobs)), key=cost)
+    batch1_end = max(job.end for job in jobs[:index])
+    batch2_start = jobs[index].start
+    return [(start_date, batch1_end), (batch2_start, end_date)]